@@ -64,6 +64,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'devices.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +72,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'devices.middleware.DeviceBroadcastMiddleware',
 ]
 
 CORS_ALLOW_METHODS = (
@@ -99,15 +101,26 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 ASGI_APPLICATION = 'config.asgi.application'
+# Comma-separated Redis URLs; groups are spread over them by consistent hashing
+# (devices/channel_layers.py, `manage.py benchmark_channel_layer`)
+CHANNEL_REDIS_URLS = os.environ.get('CHANNEL_REDIS_URLS', 'redis://127.0.0.1:6379').split(',')
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'devices.channel_layers.ShardedRedisChannelLayer',
         'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+            "hosts": CHANNEL_REDIS_URLS,
         },
     },
 }
 
+# Cache (also backs the active-session registry in devices/registry.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+}
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -207,8 +220,124 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'maintain-device-log-partitions': {
+        'task': 'devices.tasks.maintain_device_log_partitions',
+        'schedule': timedelta(hours=6),
+    },
+    'device-heartbeat': {
+        'task': 'devices.tasks.device_heartbeat',
+        'schedule': timedelta(seconds=15),  # DEVICE_HEARTBEAT['INTERVAL']
+        # A run that could not start before the next one is due is skipped
+        'options': {'expires': 15},
+    },
+    'redeliver-device-commands': {
+        'task': 'devices.tasks.redeliver_device_commands',
+        'schedule': timedelta(seconds=10),  # DEVICE_CONTROL['ACK_TIMEOUT']
+        'options': {'expires': 10},
+    },
+    'rollup-telemetry': {
+        'task': 'devices.tasks.rollup_telemetry',
+        'schedule': timedelta(minutes=1),
+        'options': {'expires': 60},
+    },
+    'maintain-telemetry-partitions': {
+        'task': 'devices.tasks.maintain_telemetry_partitions',
+        'schedule': timedelta(hours=6),
+    },
+}
 
 
 # Device Backend API Settings
 DEVICE_BACKEND_URL = os.environ.get('DEVICE_BACKEND_URL', 'http://10.10.4.230:8000/')
-DEVICE_BACKEND_TOKEN = os.environ.get('DEVICE_BACKEND_TOKEN', '')
\ No newline at end of file
+DEVICE_BACKEND_TOKEN = os.environ.get('DEVICE_BACKEND_TOKEN', '')
+
+# Pooled HTTP client, retries and per-device circuit breaker (devices/services.py)
+DEVICE_BACKEND_HTTP = {
+    'CONNECT_TIMEOUT': float(os.environ.get('DEVICE_BACKEND_CONNECT_TIMEOUT', 2.0)),
+    'READ_TIMEOUT': float(os.environ.get('DEVICE_BACKEND_READ_TIMEOUT', 5.0)),
+    'TOTAL_TIMEOUT': float(os.environ.get('DEVICE_BACKEND_TOTAL_TIMEOUT', 5.0)),
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 20,
+    'POOL_BLOCK': False,
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.2,
+    'BACKOFF_JITTER': 0.2,
+    'CIRCUIT_FAILURE_THRESHOLD': 3,
+    'CIRCUIT_RESET_TIMEOUT': 30,
+}
+
+# Concurrent fleet status sweep (devices/health.py)
+DEVICE_HEALTH_SWEEP = {
+    'MAX_WORKERS': 20,
+}
+
+# Background liveness monitoring (devices/health.py, devices.tasks.device_heartbeat)
+DEVICE_HEARTBEAT = {
+    'INTERVAL': 15,
+    'SHARDS': 4,
+    'JITTER': 10,
+    'STALE_AFTER': 180,
+}
+
+# Bulk configuration push (devices/config_push.py)
+DEVICE_CONFIG_PUSH = {
+    'PARALLELISM': 10,
+    'MAX_PARALLELISM': 50,
+    'DELTA': False,  # set once the device backend accepts PATCH delta payloads
+}
+
+# Cached serialized device configuration (devices/config_cache.py)
+DEVICE_CONFIG_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Kiosk control channel (devices/control.py)
+DEVICE_CONTROL = {
+    'PING_INTERVAL': 30,
+    'ACK_TIMEOUT': 10,
+    'MAX_ATTEMPTS': 5,
+    'RETENTION': 60 * 60 * 24,
+}
+
+# Device status websockets (devices/consumers.py)
+DEVICE_WEBSOCKET = {
+    'MAX_SUBSCRIPTIONS': 50,
+    'MAX_PENDING': 100,  # messages waiting per socket (one per device after coalescing)
+    'MAX_LAG': 30,       # seconds the oldest waiting message may wait before the socket is closed
+}
+
+# Device telemetry ingest and rollups (devices/telemetry.py)
+DEVICE_TELEMETRY = {
+    'MAX_BATCH': 10000,
+    'MAX_AGE': 7 * 24 * 3600,
+    'LATE_WINDOW': 600,
+    'RAW_RETENTION_DAYS': 14,
+    'MINUTE_RETENTION_DAYS': 90,
+}
+
+# Per-endpoint query budgets (devices/query_budget.py)
+QUERY_BUDGET = {
+    'RAISE': False,
+    'HEADERS': DEBUG,
+    'DEFAULT': None,
+}
+
+# Buffered DeviceLog writer (devices/log_buffer.py)
+DEVICE_LOG_BUFFER = {
+    'SYNC': False,
+    'MAX_BATCH': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+}
+
+# DeviceLog partition retention (devices/partitions.py)
+DEVICE_LOG_RETENTION_MONTHS = 12
+DEVICE_LOG_ARCHIVE_EXPIRED = False
+
+# Live session metering (devices/metering.py, run with `manage.py run_session_meter`)
+SESSION_METER = {
+    'TICK_INTERVAL': 1.0,
+    'RESYNC_INTERVAL': 60,
+}
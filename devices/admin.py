@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Device, WashProgram, DeviceConfiguration, DeviceProgramSetting,
-    DeviceLog, DeviceSession
+    DeviceLog, DeviceLogDailyRollup, DeviceSession, ConfigPushJob, ConfigPushResult,
+    DeviceCommand, DeviceTelemetryRollup
 )
 
 class DeviceProgramSettingInline(admin.TabularInline):
@@ -23,7 +24,7 @@ class DeviceLogInline(admin.TabularInline):
 class DeviceSessionInline(admin.TabularInline):
     model = DeviceSession
     extra = 0
-    readonly_fields = ['started_at', 'ended_at', 'status', 'total_duration', 'program', 'amount_charged']
+    readonly_fields = ['started_at', 'ended_at', 'resumed_at', 'status', 'total_duration', 'program', 'amount_charged']
     max_num = 5
     can_delete = False
 
@@ -62,6 +63,12 @@ class DeviceLogAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
 
+@admin.register(DeviceLogDailyRollup)
+class DeviceLogDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['device', 'date', 'log_type', 'count']
+    list_filter = ['log_type', 'device']
+    date_hierarchy = 'date'
+
 @admin.register(DeviceSession)
 class DeviceSessionAdmin(admin.ModelAdmin):
     list_display = ['id', 'device', 'status', 'started_at', 'ended_at', 'total_duration', 'program', 'amount_charged']
@@ -69,3 +76,29 @@ class DeviceSessionAdmin(admin.ModelAdmin):
     search_fields = ['device__name', 'client_card']
     readonly_fields = ['started_at']
     date_hierarchy = 'started_at'
+
+class ConfigPushResultInline(admin.TabularInline):
+    model = ConfigPushResult
+    extra = 0
+    readonly_fields = ['device', 'status', 'message', 'duration_ms', 'finished_at']
+    can_delete = False
+
+@admin.register(ConfigPushJob)
+class ConfigPushJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'total', 'succeeded', 'failed', 'skipped', 'created_by', 'created_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+    inlines = [ConfigPushResultInline]
+
+@admin.register(DeviceCommand)
+class DeviceCommandAdmin(admin.ModelAdmin):
+    list_display = ['id', 'device', 'command', 'status', 'attempts', 'created_at', 'acked_at']
+    list_filter = ['command', 'status', 'created_at']
+    search_fields = ['device__name', 'device__device_id']
+    readonly_fields = ['created_at', 'sent_at', 'acked_at', 'attempts', 'result']
+
+@admin.register(DeviceTelemetryRollup)
+class DeviceTelemetryRollupAdmin(admin.ModelAdmin):
+    list_display = ['device', 'resolution', 'bucket', 'samples', 'engine_avg', 'pump_avg', 'pressure_avg']
+    list_filter = ['resolution', 'bucket']
+    search_fields = ['device__name', 'device__device_id']
@@ -0,0 +1,223 @@
+# devices/async_views.py
+"""
+Async versions of the DeviceViewSet command actions for the ASGI server.
+
+These are DRF APIViews with async handlers: requests go through the view's
+own initial() (content negotiation, authentication, permissions, throttling)
+and exception handling, exactly as in the sync viewset, and the handlers use
+the async ORM and cache and await the channel layer directly instead of
+going through async_to_sync. Blocking backend HTTP calls run in a separate
+executor so they don't hold the shared ORM thread.
+"""
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.permissions import IsOperator, IsViewer
+from devices import config_cache, log_buffer, session_engine
+from devices.configuration import DEFAULT_DEVICE_CONFIGURATION
+from devices.services import DeviceBackendService
+from .models import Device, DeviceConfiguration, WashProgram
+from .serializers import DeviceSessionSerializer
+from .utils import abroadcast_device_update, device_status_message
+
+
+def _run_blocking(func, *args, **kwargs):
+    """Run a blocking call (e.g. backend HTTP) off the shared sync thread."""
+    return sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+class AsyncDeviceCommandView(APIView):
+    """
+    Base class for a command on one device. dispatch() is APIView's, with the
+    handler awaited; initial() runs in the ORM thread because authentication
+    may hit the database (JWT user lookup).
+    """
+    permission_classes = [IsOperator]
+    http_method_names = ['post']
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def get_device(self, pk):
+        device = await Device.objects.filter(pk=pk).afirst()
+        if device is None:
+            raise Http404('No Device matches the given query.')
+        self.check_object_permissions(self.request, device)
+        return device
+
+    async def broadcast(self, device):
+        await abroadcast_device_update(device.id, device_status_message(device))
+
+
+class SessionCommandView(AsyncDeviceCommandView, ABC):
+    """Shared verification check for start/stop/pause/resume."""
+    command = None
+
+    async def post(self, request, pk):
+        device = await self.get_device(pk)
+        if device.registration_status != 'verified':
+            return Response({
+                "error": f"Cannot {self.command} session on unverified device.",
+                "registration_status": device.registration_status
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return await self.transition(request, device)
+
+    @abstractmethod
+    async def transition(self, request, device):
+        """Run the session transition on the verified `device`."""
+
+
+class AsyncStartView(SessionCommandView):
+    command = 'start'
+
+    async def transition(self, request, device):
+        program_id = request.data.get('program_id')
+        client_card = request.data.get('client_card')
+        if not program_id:
+            return Response({"error": "Program ID is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            program_id = int(program_id)
+        except (TypeError, ValueError):
+            return Response({"error": "Program ID must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The transition statement decides; a rejected one drops the registry entry
+        session = await session_engine.astart_session(device, program_id, client_card)
+        if session is None:
+            if not await WashProgram.objects.filter(pk=program_id).aexists():
+                raise Http404('No WashProgram matches the given query.')
+            return Response({"error": "Active session exists."}, status=status.HTTP_400_BAD_REQUEST)
+
+        await self.broadcast(device)
+        return Response(DeviceSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class AsyncStopView(SessionCommandView):
+    command = 'stop'
+
+    async def transition(self, request, device):
+        session = await session_engine.astop_session(device)
+        if session is None:
+            return Response({"error": "No active session."}, status=status.HTTP_404_NOT_FOUND)
+
+        await self.broadcast(device)
+        return Response(DeviceSessionSerializer(session).data)
+
+
+class AsyncPauseView(SessionCommandView):
+    command = 'pause'
+
+    async def transition(self, request, device):
+        session = await session_engine.apause_session(device)
+        if session is None:
+            return Response({"error": "No active session."}, status=status.HTTP_404_NOT_FOUND)
+
+        await self.broadcast(device)
+        return Response(DeviceSessionSerializer(session).data)
+
+
+class AsyncResumeView(SessionCommandView):
+    command = 'resume'
+
+    async def transition(self, request, device):
+        session = await session_engine.aresume_session(device)
+        if session is None:
+            return Response({"error": "No paused session."}, status=status.HTTP_404_NOT_FOUND)
+
+        await self.broadcast(device)
+        return Response(DeviceSessionSerializer(session).data)
+
+
+class AsyncVerifyView(AsyncDeviceCommandView):
+    """Manually trigger device verification"""
+
+    async def post(self, request, pk):
+        device = await self.get_device(pk)
+        await DeviceConfiguration.objects.aget_or_create(
+            device=device,
+            defaults=DEFAULT_DEVICE_CONFIGURATION
+        )
+        config_data = (await config_cache.aget(device.pk))['verification']
+
+        success, message = await _run_blocking(
+            DeviceBackendService().verify_device,
+            device.device_id,
+            device.ip_address,
+            device.port,
+            configuration=config_data
+        )
+
+        device.last_handshake_attempt = timezone.now()
+        device.registration_status = 'verified' if success else 'pending'
+        device.registration_message = message
+        await device.asave()
+
+        if success:
+            log_buffer.log(
+                device,
+                'info',
+                f"Device verified successfully with configuration: {message}"
+            )
+        else:
+            log_buffer.log(
+                device,
+                'warning',
+                f"Device verification failed: {message}"
+            )
+
+        await self.broadcast(device)
+
+        if success:
+            return Response({'status': 'verified', 'message': message})
+        return Response({'status': 'pending', 'message': message}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncStatusCheckView(AsyncDeviceCommandView):
+    """Check device status with the backend"""
+    permission_classes = [IsViewer]
+    http_method_names = ['get']
+
+    async def get(self, request, pk):
+        device = await self.get_device(pk)
+        online, message = await _run_blocking(
+            DeviceBackendService().check_device_status, device.device_id
+        )
+
+        if online and device.status != 'online':
+            device.status = 'online'
+            device.last_seen = timezone.now()
+            await device.asave()
+            await self.broadcast(device)
+        elif not online and device.status == 'online':
+            device.status = 'offline'
+            await device.asave()
+            await self.broadcast(device)
+
+        return Response({
+            'status': device.status,
+            'online': online,
+            'message': message,
+            'last_seen': device.last_seen
+        })
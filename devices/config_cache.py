@@ -0,0 +1,124 @@
+# devices/config_cache.py
+"""
+Cached serialized device configuration.
+
+A device's configuration is loaded once (the DeviceConfiguration and its
+program settings with their programs, in two queries) and cached as the
+representations the rest of the app needs:
+
+    'detail'        DeviceConfigurationSerializer data (device detail), without
+                    the acknowledgement fields (ACK_FIELDS)
+    'payload'       serialize_config(..., include_programs=True) (config pushes)
+    'hash'          config_hash of the payload
+    'verification'  serialize_verification_config (verification requests)
+
+Entries are dropped once the transaction commits whenever a DeviceConfiguration,
+DeviceProgramSetting or WashProgram is saved or deleted (devices/signals.py),
+and rebuilt on the next read. Writes that bypass model signals, such as
+queryset.update(), must call invalidate() themselves. Devices without a
+configuration are not cached. Acknowledgements (acked_hash, acked_at) change
+on every push and are written with update() and no invalidation, so they are
+not cached; /devices/configs/ serves them.
+
+Settings (all optional):
+
+    DEVICE_CONFIG_CACHE = {
+        'ALIAS': 'default',       # cache alias (Redis in production; a locmem alias
+                                  # is a per-process LRU, only coherent single-process)
+        'TIMEOUT': 60 * 60 * 24,  # safety net; entries are normally invalidated
+    }
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .configuration import config_hash, serialize_config, serialize_verification_config
+from .models import DeviceConfiguration, DeviceProgramSetting
+
+KEY_PREFIX = 'device_config:'
+ACK_FIELDS = ('acked_hash', 'acked_at')
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'DEVICE_CONFIG_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[_setting('ALIAS')]
+
+
+def _key(device_id):
+    return f'{KEY_PREFIX}{device_id}'
+
+
+def build_entry(config):
+    """
+    The cached representations of `config`, whose deviceprogramsetting_set
+    must be prefetched with `program` loaded.
+    """
+    from .serializers import DeviceConfigurationSerializer
+
+    program_settings = list(config.deviceprogramsetting_set.all())
+    payload = serialize_config(
+        config,
+        include_programs=True,
+        program_settings=[ps for ps in program_settings if ps.is_enabled],
+    )
+    detail = DeviceConfigurationSerializer(config).data
+    for name in ACK_FIELDS:
+        detail.pop(name)
+    return {
+        'detail': detail,
+        'payload': payload,
+        'hash': config_hash(payload),
+        'verification': serialize_verification_config(config, program_settings),
+    }
+
+
+def _load(device_id):
+    config = (
+        DeviceConfiguration.objects
+        .filter(device_id=device_id)
+        .prefetch_related(Prefetch(
+            'deviceprogramsetting_set',
+            queryset=DeviceProgramSetting.objects.select_related('program').order_by('id'),
+        ))
+        .first()
+    )
+    return build_entry(config) if config else None
+
+
+def get(device_id):
+    """The cached configuration entry for a device, or None if it has no configuration."""
+    cache = _cache()
+    entry = cache.get(_key(device_id))
+    if entry is None:
+        entry = _load(device_id)
+        if entry is not None:
+            cache.set(_key(device_id), entry, _setting('TIMEOUT'))
+    return entry
+
+
+async def aget(device_id):
+    """Async version of get."""
+    cache = _cache()
+    entry = await cache.aget(_key(device_id))
+    if entry is None:
+        entry = await sync_to_async(_load)(device_id)
+        if entry is not None:
+            await cache.aset(_key(device_id), entry, _setting('TIMEOUT'))
+    return entry
+
+
+def invalidate(*device_ids):
+    """Drop the entries for `device_ids` once the current transaction commits."""
+    keys = [_key(device_id) for device_id in device_ids if device_id is not None]
+    if keys:
+        transaction.on_commit(lambda: _cache().delete_many(keys))
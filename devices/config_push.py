@@ -0,0 +1,294 @@
+# devices/config_push.py
+"""
+Bulk configuration push.
+
+A ConfigPushJob snapshots the devices matching a filter as pending
+ConfigPushResult rows; the push_configuration Celery task then sends each
+device's serialize_config payload from a thread pool limited to the job's
+parallelism, records the outcome per device, and streams progress to the
+job's channel-layer group (ws/devices/config-push/<job id>/).
+
+Every push is planned against the hash of the configuration the device last
+acknowledged (DeviceConfiguration.acked_hash): an unchanged configuration is
+not sent at all, and with DELTA enabled a changed one is sent as just the
+changed keys on top of the acknowledged base. If the backend reports that the
+device holds a different base, the full payload is sent instead.
+
+A single-device push (push_device) goes over the device's control channel
+when it is connected (devices/control.py); the acknowledgement then records
+the hash. Bulk jobs always use the HTTP backend.
+
+Settings (all optional):
+
+    DEVICE_CONFIG_PUSH = {
+        'PARALLELISM': 10,      # default concurrent pushes per job
+        'MAX_PARALLELISM': 50,  # upper bound a caller may request
+        'DELTA': False,         # the backend accepts PATCH delta payloads
+    }
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Count, Prefetch
+from django.utils import timezone
+
+from . import config_cache, control, log_buffer
+from .configuration import config_delta, config_hash, serialize_config
+from .models import ConfigPushJob, ConfigPushResult, Device, DeviceConfiguration, DeviceProgramSetting
+from .services import DeviceBackendService
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PARALLELISM': 10,
+    'MAX_PARALLELISM': 50,
+    'DELTA': False,
+}
+
+# Accepted filter keys -> Device lookups
+FILTER_LOOKUPS = {
+    'ids': 'id__in',
+    'location': 'location',
+    'status': 'status',
+    'is_active': 'is_active',
+}
+
+
+def _setting(name):
+    return getattr(settings, 'DEVICE_CONFIG_PUSH', {}).get(name, DEFAULTS[name])
+
+
+def progress_group(job_id):
+    return f'config_push_{job_id}'
+
+
+def _check_filter(key, value):
+    if key == 'ids':
+        if not isinstance(value, list) or not all(type(item) is int for item in value):
+            raise ValueError("'ids' must be a list of integer device ids.")
+    elif key == 'is_active':
+        if not isinstance(value, bool):
+            raise ValueError("'is_active' must be true or false.")
+    elif key == 'status':
+        if value not in dict(Device.STATUS_CHOICES):
+            raise ValueError(f"'status' must be one of: {', '.join(dict(Device.STATUS_CHOICES))}.")
+    elif not isinstance(value, str):
+        raise ValueError(f"'{key}' must be a string.")
+
+
+def select_devices(filters):
+    """Verified devices matching `filters`. Raises ValueError for unknown keys or ill-typed values."""
+    unknown = set(filters) - set(FILTER_LOOKUPS)
+    if unknown:
+        raise ValueError(f"Unknown device filters: {', '.join(sorted(unknown))}")
+    for key, value in filters.items():
+        _check_filter(key, value)
+    lookups = {FILTER_LOOKUPS[key]: value for key, value in filters.items()}
+    return Device.objects.filter(registration_status='verified', **lookups)
+
+
+def clamp_parallelism(parallelism):
+    if parallelism is None:
+        return _setting('PARALLELISM')
+    return max(1, min(int(parallelism), _setting('MAX_PARALLELISM')))
+
+
+@dataclass
+class PushPlan:
+    """What to send for one device's configuration."""
+    payload: dict
+    digest: str
+    base_hash: str = ''
+    changes: dict = field(default_factory=dict)
+    removed: list = field(default_factory=list)
+
+    @property
+    def is_delta(self):
+        return bool(self.base_hash)
+
+
+def plan_push(config, payload, force=False):
+    """
+    Plan pushing `payload` to the device owning `config`. Returns None when
+    the device already acknowledged this exact configuration (unless `force`).
+    """
+    digest = config_hash(payload)
+    if force or not config.acked_hash:
+        return PushPlan(payload, digest)
+    if config.acked_hash == digest:
+        return None
+    if _setting('DELTA') and config.acked_payload is not None:
+        changes, removed = config_delta(config.acked_payload, payload)
+        return PushPlan(payload, digest, base_hash=config.acked_hash, changes=changes, removed=removed)
+    return PushPlan(payload, digest)
+
+
+def send_plan(service, device, plan):
+    """Send a planned push (HTTP only, safe to call from worker threads). Returns (ok, message)."""
+    if plan.is_delta:
+        ok, message, base_mismatch = service.patch_device_configuration(
+            device.device_id, plan.changes, plan.removed, plan.base_hash, plan.digest
+        )
+        if not base_mismatch:
+            return ok, message
+    return service.send_device_configuration(device.device_id, plan.payload, config_hash=plan.digest)
+
+
+def acknowledge(config, plan):
+    """Record `plan` as the configuration the device now holds."""
+    config.acked_hash = plan.digest
+    config.acked_payload = plan.payload
+    config.acked_at = timezone.now()
+    # update() rather than save(): no signal, so the config cache (which
+    # leaves these fields out) isn't dropped once per device of a push
+    DeviceConfiguration.objects.filter(pk=config.pk).update(
+        acked_hash=config.acked_hash, acked_payload=config.acked_payload, acked_at=config.acked_at,
+    )
+
+
+def push_device(device, force=False):
+    """
+    Push one device's current configuration. Returns (status, message) with
+    status 'succeeded', 'failed', 'skipped' or 'queued' (sent over the
+    control channel, acknowledged later).
+    """
+    config = getattr(device, 'configuration', None)
+    if config is None:
+        return 'skipped', "Device has no configuration"
+    plan = plan_push(config, config_cache.get(device.pk)['payload'], force)
+    if plan is None:
+        return 'skipped', "Configuration unchanged"
+    if control.is_connected(device.pk):
+        command = control.send_command(device.pk, 'config', {'configuration': plan.payload, 'hash': plan.digest})
+        return 'queued', str(command.id)
+    ok, message = send_plan(DeviceBackendService(), device, plan)
+    if ok:
+        acknowledge(config, plan)
+    return ('succeeded' if ok else 'failed'), message
+
+
+def create_job(filters, parallelism=None, force=False, user=None):
+    """Create a job with a pending result row for every matching device."""
+    devices = list(select_devices(filters).values_list('id', flat=True))
+    job = ConfigPushJob.objects.create(
+        filters=filters,
+        parallelism=clamp_parallelism(parallelism),
+        force=force,
+        total=len(devices),
+        created_by=user,
+    )
+    ConfigPushResult.objects.bulk_create(
+        [ConfigPushResult(job=job, device_id=device_id) for device_id in devices]
+    )
+    return job
+
+
+def progress(job):
+    """Current counts for a job, read from its result rows."""
+    counts = dict(job.results.values_list('status').annotate(count=Count('id')).order_by())
+    return {
+        'job': job.id,
+        'status': job.status,
+        'total': job.total,
+        'done': job.total - counts.get('pending', 0),
+        'succeeded': counts.get('succeeded', 0),
+        'failed': counts.get('failed', 0),
+        'skipped': counts.get('skipped', 0),
+    }
+
+
+def _publish(job_id, message):
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            progress_group(job_id), {'type': 'config_push_progress', 'message': message}
+        )
+    except Exception:
+        logger.exception("Failed to publish progress for config push %s", job_id)
+
+
+def _push(service, device, plan):
+    started = time.monotonic()
+    ok, message = send_plan(service, device, plan)
+    return ok, message, round((time.monotonic() - started) * 1000)
+
+
+def run_job(job_id):
+    """Push the configuration to every pending device of the job."""
+    job = ConfigPushJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    results = list(
+        job.results.filter(status='pending')
+        .select_related('device__configuration')
+        .prefetch_related(Prefetch(
+            'device__configuration__deviceprogramsetting_set',
+            queryset=DeviceProgramSetting.objects.filter(is_enabled=True).select_related('program'),
+            to_attr='enabled_program_settings',
+        ))
+    )
+    counts = {'succeeded': 0, 'failed': 0, 'skipped': 0}
+
+    def finish(result, status, message, duration_ms=None):
+        result.status = status
+        result.message = message
+        result.duration_ms = duration_ms
+        result.finished_at = timezone.now()
+        result.save(update_fields=['status', 'message', 'duration_ms', 'finished_at'])
+        counts[status] += 1
+        _publish(job.id, {
+            'job': job.id,
+            'status': 'running',
+            'total': job.total,
+            'done': job.total - len(results) + sum(counts.values()),
+            **counts,
+            'device': {'id': result.device_id, 'status': status, 'message': message},
+        })
+
+    try:
+        service = DeviceBackendService()
+        with ThreadPoolExecutor(max_workers=job.parallelism) as executor:
+            futures = {}
+            for result in results:
+                config = getattr(result.device, 'configuration', None)
+                if config is None:
+                    finish(result, 'skipped', "Device has no configuration")
+                    continue
+                payload = serialize_config(
+                    config, include_programs=True, program_settings=config.enabled_program_settings
+                )
+                plan = plan_push(config, payload, job.force)
+                if plan is None:
+                    finish(result, 'skipped', "Configuration unchanged")
+                    continue
+                futures[executor.submit(_push, service, result.device, plan)] = (result, config, plan)
+
+            for future in as_completed(futures):
+                result, config, plan = futures[future]
+                ok, message, duration_ms = future.result()
+                if ok:
+                    acknowledge(config, plan)
+                finish(result, 'succeeded' if ok else 'failed', message, duration_ms)
+                log_buffer.log(
+                    result.device,
+                    "info" if ok else "warning",
+                    f"Config update {'succeeded' if ok else 'failed'}: {message}"
+                )
+        job.status = 'completed'
+    except Exception as e:
+        logger.exception("Config push %s failed", job.id)
+        job.status = 'failed'
+        job.error_message = str(e)
+
+    summary = progress(job)
+    job.finished_at = timezone.now()
+    job.succeeded, job.failed, job.skipped = summary['succeeded'], summary['failed'], summary['skipped']
+    job.save(update_fields=['status', 'error_message', 'finished_at', 'succeeded', 'failed', 'skipped'])
+    _publish(job.id, summary)
+    return summary
@@ -1,5 +1,24 @@
 # devices/services/configuration.py
-def serialize_config(config, include_programs=False):
+import hashlib
+import json
+from decimal import Decimal
+
+# Defaults for a device that has no configuration yet
+DEFAULT_DEVICE_CONFIGURATION = {
+    'price_per_minute': Decimal('10.00'),
+    'default_timeout': 300,
+    'valve_reset_timeout': 60,
+    'engine_performance': 50,
+    'pump_performance': 50
+}
+
+
+def serialize_config(config, include_programs=False, program_settings=None):
+    """
+    Configuration payload pushed to a device. `program_settings` may pass the
+    config's enabled DeviceProgramSetting rows (with `program` loaded) when
+    they were prefetched; otherwise they are queried.
+    """
     data = {
         "price_per_minute": float(config.price_per_minute),
         "default_timeout": config.default_timeout,
@@ -10,12 +29,63 @@ def serialize_config(config, include_programs=False):
         "pump_performance": config.pump_performance,
     }
     if include_programs:
-        data["programs"] = [
-            {
-                "id": ps.program.id,
-                "name": ps.program.name,
-                "price_per_second": str(ps.program.price_per_second)
-            }
-            for ps in config.deviceprogramsetting_set.filter(is_enabled=True)
-        ]
+        data["programs"] = sorted(
+            (
+                {
+                    "id": ps.program.id,
+                    "name": ps.program.name,
+                    "price_per_second": str(ps.program.price_per_second)
+                }
+                for ps in (
+                    program_settings if program_settings is not None
+                    else config.deviceprogramsetting_set.filter(is_enabled=True).select_related('program')
+                )
+            ),
+            # Fixed order so equal configurations hash the same
+            key=lambda program: program["id"]
+        )
+    return data
+
+
+def config_hash(payload):
+    """Stable SHA-256 of a configuration payload; key order does not matter."""
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def config_delta(previous, current):
+    """
+    Top-level differences between two payloads: ({key: new value} for keys
+    added or changed, [keys removed]).
+    """
+    changed = {key: value for key, value in current.items() if previous.get(key, object()) != value}
+    removed = sorted(key for key in previous if key not in current)
+    return changed, removed
+
+
+def serialize_verification_config(config, program_settings):
+    """
+    Configuration payload sent along with a verification request.
+    `program_settings` are the config's DeviceProgramSetting rows with `program` loaded.
+    """
+    data = {
+        'price_per_minute': float(config.price_per_minute),
+        'default_timeout': config.default_timeout,
+        'bonus_duration_enabled': config.bonus_duration_enabled,
+        'bonus_duration_amount': config.bonus_duration_amount,
+        'valve_reset_timeout': config.valve_reset_timeout,
+        'engine_performance': config.engine_performance,
+        'pump_performance': config.pump_performance,
+    }
+    settings_data = [
+        {
+            'program_id': ps.program.id,
+            'program_name': ps.program.name,
+            'custom_price': float(ps.custom_price) if ps.custom_price else None,
+            'is_enabled': ps.is_enabled
+        }
+        for ps in program_settings
+    ]
+    if settings_data:
+        data['program_settings'] = settings_data
     return data
@@ -1,58 +1,399 @@
 # devices/consumers.py
 
+import asyncio
+import itertools
 import json
+import logging
+from urllib.parse import parse_qs
+
+import msgpack
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Device
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from . import config_push, control, registry, snapshot
+from .outbox import SLOW_CONSUMER_CLOSE_CODE, Outbox, merge_state
+from .models import ConfigPushJob, Device
+from .utils import FLEET_GROUP, FLEET_LISTENERS_TIMEOUT, amark_fleet_listener
 
+logger = logging.getLogger(__name__)
 
-class DeviceStatusConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.device_id = self.scope['url_route']['kwargs']['device_id']
-        self.device_group_name = f'device_{self.device_id}'
+WEBSOCKET_DEFAULTS = {
+    'MAX_SUBSCRIPTIONS': 50,
+    'MAX_PENDING': 100,
+    'MAX_LAG': 30,
+}
+
+
+def websocket_setting(name):
+    return getattr(settings, 'DEVICE_WEBSOCKET', {}).get(name, WEBSOCKET_DEFAULTS[name])
+
+
+def merge_changes(pending, newer):
+    """Merge two fleet deltas ({device id: changed fields})."""
+    merged = dict(pending)
+    for device_id, changed in newer.items():
+        merged[device_id] = {**merged.get(device_id, {}), **changed}
+    return merged
+
+
+class FramingMixin:
+    """
+    JSON text frames by default. Clients that offer the 'msgpack' subprotocol
+    (Sec-WebSocket-Protocol) or connect with ?format=msgpack get msgpack binary
+    frames instead, and may send their own messages as msgpack too.
+    """
+    MSGPACK_SUBPROTOCOL = 'msgpack'
+
+    async def accept_with_format(self):
+        subprotocols = self.scope.get('subprotocols') or []
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        if self.MSGPACK_SUBPROTOCOL in subprotocols:
+            self.binary = True
+            await self.accept(subprotocol=self.MSGPACK_SUBPROTOCOL)
+            return
+        self.binary = params.get('format', [''])[0] == 'msgpack'
+        # A client that offers subprotocols needs one picked
+        await self.accept(subprotocol='json' if 'json' in subprotocols else None)
 
-        # Join device group
-        await self.channel_layer.group_add(
-            self.device_group_name,
-            self.channel_name
+    async def send_payload(self, message):
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(message))
+        else:
+            await self.send(text_data=json.dumps(message))
+
+    def decode_payload(self, text_data=None, bytes_data=None):
+        """A received message (JSON text or msgpack binary), or None if it can't be decoded."""
+        try:
+            if bytes_data is not None:
+                return msgpack.unpackb(bytes_data, raw=False)
+            return json.loads(text_data)
+        except (TypeError, ValueError, msgpack.UnpackException):
+            return None
+
+
+class BufferedConsumerMixin:
+    """
+    Outgoing messages go through a bounded, coalescing Outbox (devices/outbox.py);
+    a socket that falls too far behind is closed with SLOW_CONSUMER_CLOSE_CODE.
+    """
+    def start_outbox(self, send):
+        user = self.scope.get('user')
+        self.outbox = Outbox(
+            send,
+            max_pending=websocket_setting('MAX_PENDING'),
+            max_lag=websocket_setting('MAX_LAG'),
+            label=f"{self.scope['path']} {getattr(user, 'username', '') or 'anonymous'}",
         )
+        self.outbox.start()
 
-        await self.accept()
+    def stop_outbox(self):
+        if getattr(self, 'outbox', None) is not None:
+            self.outbox.stop()
+
+    async def queue(self, key, item, merge=None):
+        if self.outbox.put(key, item, merge) or getattr(self, 'closing', False):
+            return
+        self.closing = True
+        logger.warning("Closing slow websocket (%s): %s", self.outbox.label, self.outbox.stats())
+        self.outbox.stop()
+        await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+
+class DeviceStatusConsumer(FramingMixin, BufferedConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Device updates and session ticks for any number of devices on one socket.
+
+    ws/devices/<id>/ starts subscribed to that device and sends its snapshot;
+    ws/devices/ starts with no subscriptions. Subscriptions change at runtime:
 
-        # Send initial device status
-        device_data = await self.get_device_data(self.device_id)
-        if device_data:
-            await self.send(text_data=json.dumps(device_data))
+        {"type": "subscribe", "device_id": 7}
+            -> {"type": "subscribed", "device_id": 7, "device": {...snapshot}}
+        {"type": "unsubscribe", "device_id": 7}
+            -> {"type": "unsubscribed", "device_id": 7}
+
+    Failures are answered with {"type": "error", "device_id": ..., "error": ...}
+    where error is invalid_device_id, not_found or subscription_limit (more than
+    MAX_SUBSCRIPTIONS devices). Updates identify their device by 'id', session
+    ticks by 'device_id'. A client that falls behind gets each device's newest
+    state rather than every update in between. Frames are JSON or msgpack
+    (FramingMixin).
+    """
+    async def connect(self):
+        self.subscriptions = set()
+        self.replies = itertools.count()
+        await self.accept_with_format()
+        self.start_outbox(self.send_payload)
+
+        device_id = self.scope['url_route']['kwargs'].get('device_id')
+        if device_id is not None:
+            # Send initial device status
+            device_data = await self.subscribe(int(device_id))
+            if device_data:
+                await self.reply(device_data, device_id=int(device_id))
 
     async def disconnect(self, close_code):
-        # Leave device group
-        await self.channel_layer.group_discard(
-            self.device_group_name,
-            self.channel_name
-        )
+        self.stop_outbox()
+        # Leave device groups
+        for device_id in self.subscriptions:
+            await self.channel_layer.group_discard(f'device_{device_id}', self.channel_name)
 
     # Receive message from WebSocket
-    async def receive(self, text_data):
-        # Handle commands from frontend if needed
-        pass
+    async def receive(self, text_data=None, bytes_data=None):
+        message = self.decode_payload(text_data, bytes_data)
+        if not isinstance(message, dict) or message.get('type') not in ('subscribe', 'unsubscribe'):
+            return
+
+        try:
+            device_id = int(message.get('device_id'))
+        except (TypeError, ValueError):
+            await self.send_error(message.get('device_id'), 'invalid_device_id')
+            return
+
+        if message['type'] == 'unsubscribe':
+            if device_id in self.subscriptions:
+                self.subscriptions.discard(device_id)
+                await self.channel_layer.group_discard(f'device_{device_id}', self.channel_name)
+            await self.reply({'type': 'unsubscribed', 'device_id': device_id})
+            return
+
+        if device_id not in self.subscriptions and len(self.subscriptions) >= websocket_setting('MAX_SUBSCRIPTIONS'):
+            await self.send_error(device_id, 'subscription_limit')
+            return
+        device_data = await self.subscribe(device_id)
+        if device_data is None:
+            await self.send_error(device_id, 'not_found')
+            return
+        await self.reply({'type': 'subscribed', 'device_id': device_id, 'device': device_data}, device_id=device_id)
+
+    async def subscribe(self, device_id):
+        """Join the device's group. Returns its snapshot, or None if there is no such device."""
+        # Joined before the snapshot is read, so no update can fall in between
+        await self.channel_layer.group_add(f'device_{device_id}', self.channel_name)
+        device_data = await self.get_device_data(device_id)
+        if device_data is None:
+            if device_id not in self.subscriptions:
+                await self.channel_layer.group_discard(f'device_{device_id}', self.channel_name)
+            return None
+        self.subscriptions.add(device_id)
+        return device_data
+
+    async def send_error(self, device_id, error):
+        await self.reply({'type': 'error', 'device_id': device_id, 'error': error})
+
+    async def reply(self, message, device_id=None):
+        if device_id is not None:
+            # The snapshot is at least as new as a still unsent update
+            self.outbox.discard(('update', device_id))
+        await self.queue(('reply', next(self.replies)), message)
 
     # Receive message from device group
     async def device_update(self, event):
         # Send message to WebSocket
         message = event.get('message', {})
-        await self.send(text_data=json.dumps(message))
+        await self.queue(('update', message.get('id')), message, merge=merge_state)
+
+    # Running duration/cost of the open session, from the session meter
+    async def session_tick(self, event):
+        message = event['message']
+        await self.queue(('tick', message.get('device_id')), {'type': 'session_tick', **message})
+
+    async def get_device_data(self, device_id):
+        # The latest broadcast state; the database is only read on a cache miss
+        device_data = await snapshot.aget(device_id)
+        if device_data is None:
+            return None
+        return {**device_data, 'active_session': await registry.aget_open_session(device_id)}
+
+class FleetStatusConsumer(FramingMixin, BufferedConsumerMixin, AsyncWebsocketConsumer):
+    """
+    One socket for the whole fleet (or a subset via ?ids=1,2,3 / ?location=...).
+
+    Sends a compact snapshot on connect:
+        {"type": "snapshot", "seq": 0, "fields": [...], "devices": [[...], ...]}
+    then only the fields that changed, per device:
+        {"type": "delta", "seq": n, "devices": {"<id>": {"status": "online"}}}
+    `seq` increases by one per message so clients can detect gaps and resync.
+    Deltas waiting for a slow client are merged into one. Frames are JSON or
+    msgpack (FramingMixin).
+    """
+    SNAPSHOT_FIELDS = ['id', 'name', 'status', 'is_active', 'registration_status', 'last_seen']
+
+    async def connect(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        devices = Device.objects.all()
+        if params.get('ids'):
+            ids = [int(i) for i in params['ids'][0].split(',') if i.strip().isdigit()]
+            devices = devices.filter(id__in=ids)
+        if params.get('location'):
+            devices = devices.filter(location=params['location'][0])
+
+        # Announced and joined before the snapshot is read, so no update can
+        # fall in between (updates already in the snapshot produce no delta)
+        await amark_fleet_listener()
+        self.listening = asyncio.ensure_future(self.keep_listening())
+        await self.channel_layer.group_add(FLEET_GROUP, self.channel_name)
+
+        self.seq = 0
+        self.state = {}
+        async for row in devices.order_by('id').values_list(*self.SNAPSHOT_FIELDS):
+            values = dict(zip(self.SNAPSHOT_FIELDS, row))
+            if values['last_seen']:
+                values['last_seen'] = values['last_seen'].isoformat()
+            self.state[values['id']] = values
+        # Without a filter, devices created later are picked up from their first update
+        self.filtered = bool(params.get('ids') or params.get('location'))
+
+        await self.accept_with_format()
+
+        await self.send_payload({
+            'type': 'snapshot',
+            'seq': self.seq,
+            'fields': self.SNAPSHOT_FIELDS,
+            'devices': [
+                [values[field] for field in self.SNAPSHOT_FIELDS]
+                for values in self.state.values()
+            ],
+        })
+        self.start_outbox(self.send_delta)
+
+    async def disconnect(self, close_code):
+        self.stop_outbox()
+        if getattr(self, 'listening', None) is not None:
+            self.listening.cancel()
+        await self.channel_layer.group_discard(FLEET_GROUP, self.channel_name)
+
+    async def keep_listening(self):
+        while True:
+            await asyncio.sleep(FLEET_LISTENERS_TIMEOUT / 3)
+            await amark_fleet_listener()
+
+    async def fleet_update(self, event):
+        changes = {}
+        for device_id, message in event.get('updates', []):
+            known = self.state.get(device_id)
+            if known is None:
+                if self.filtered:
+                    continue
+                known = self.state[device_id] = {'id': device_id}
+            changed = {
+                key: value for key, value in message.items()
+                if key != 'id' and known.get(key) != value
+            }
+            if changed:
+                known.update(changed)
+                changes[str(device_id)] = changed
+
+        if changes:
+            await self.queue('delta', changes, merge=merge_changes)
+
+    async def send_delta(self, changes):
+        # Numbered when sent, so merged deltas leave no gap
+        self.seq += 1
+        await self.send_payload({
+            'type': 'delta',
+            'seq': self.seq,
+            'devices': changes,
+        })
+
+
+class ConfigPushProgressConsumer(AsyncWebsocketConsumer):
+    """
+    Progress of a bulk configuration push: the current counts on connect,
+    then one message per finished device and a final summary.
+    """
+    async def connect(self):
+        self.job_id = int(self.scope['url_route']['kwargs']['job_id'])
+        self.group_name = config_push.progress_group(self.job_id)
+        snapshot = await self.get_progress(self.job_id)
+        if snapshot is None:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps(snapshot))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def config_push_progress(self, event):
+        await self.send(text_data=json.dumps(event['message']))
 
     @database_sync_to_async
-    def get_device_data(self, device_id):
+    def get_progress(self, job_id):
+        job = ConfigPushJob.objects.filter(pk=job_id).first()
+        return config_push.progress(job) if job else None
+
+
+class DeviceControlConsumer(AsyncWebsocketConsumer):
+    """
+    The kiosk's own connection: ws/devices/control/?device_id=<device_id>&token=<token>.
+    Commands are delivered over it and acknowledged by id (protocol in devices/control.py).
+    """
+    async def connect(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        device_id = params.get('device_id', [''])[0]
+        token = params.get('token', [''])[0]
+        self.device = await self.get_device(device_id, token)
+        if self.device is None:
+            await self.close(code=4003)
+            return
+
+        self.group_name = control.control_group(self.device.pk)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await database_sync_to_async(control.mark_connected)(self.device.pk, self.channel_name)
+
+        # Everything queued while the kiosk was away, oldest first
+        for command in await database_sync_to_async(control.pending_commands)(self.device.pk):
+            await self.send_command(control.command_message(command))
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'device', None) is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await database_sync_to_async(control.mark_disconnected)(self.device.pk, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None:
+            # The protocol is JSON text frames only; binary frames are ignored
+            return
         try:
-            device = Device.objects.get(id=device_id)
-            return {
-                'id': device.id,
-                'name': device.name,
-                'status': device.status,
-                'is_active': device.is_active,
-                'last_seen': device.last_seen.isoformat() if device.last_seen else None,
-                # Add other fields as needed
-            }
-        except Device.DoesNotExist:
-            return None
\ No newline at end of file
+            message = json.loads(text_data)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+
+        if message.get('type') == 'ping':
+            await database_sync_to_async(control.mark_connected)(self.device.pk, self.channel_name)
+            await self.send(text_data=json.dumps({'type': 'pong'}))
+        elif message.get('type') == 'ack' and message.get('id'):
+            try:
+                await database_sync_to_async(control.record_ack)(
+                    self.device.pk, message['id'], bool(message.get('ok', True)), message.get('result')
+                )
+            except ValidationError:
+                # Not a command id
+                pass
+
+    async def control_command(self, event):
+        await self.send_command(event['command'])
+
+    async def control_revoke(self, event):
+        # The token this connection authenticated with was rotated
+        await self.close(code=4003)
+
+    async def send_command(self, message):
+        await self.send(text_data=json.dumps(message))
+        await database_sync_to_async(control.mark_sent)(message['id'])
+
+    @database_sync_to_async
+    def get_device(self, device_id, token):
+        device = Device.objects.filter(
+            device_id=device_id, registration_status='verified'
+        ).only('id', 'device_id', 'control_secret').first()
+        if device is None or not control.check_token(device, token):
+            return None
+        return device
@@ -0,0 +1,277 @@
+# devices/control.py
+"""
+Device-initiated control channel.
+
+Kiosks keep a websocket open to ws/devices/control/?device_id=<id>&token=<token>
+(DeviceControlConsumer) and receive commands over it instead of inbound HTTP.
+Delivery is at-least-once:
+
+    server -> kiosk  {"type": "command", "id": "<uuid>", "command": "start", "payload": {...}}
+    kiosk -> server  {"type": "ack", "id": "<uuid>", "ok": true, "result": {...}}
+    kiosk -> server  {"type": "ping"}                  server -> kiosk  {"type": "pong"}
+
+Every command is stored as a DeviceCommand. Commands for a device that is not
+connected stay queued and are sent, oldest first, when it connects; commands
+sent but not acknowledged within ACK_TIMEOUT are redelivered by the
+redeliver_device_commands task, up to MAX_ATTEMPTS. Commands past their TTL
+expire instead of being delivered late. Kiosks must ignore ids they have
+already handled. The same task deletes settled and expired commands once they
+are RETENTION seconds old.
+
+Session transitions only queue a command for kiosks that use the control
+channel, i.e. were connected within the command's TTL; anything queued for
+other kiosks would just expire unread.
+
+The token a kiosk authenticates with (also used for telemetry ingest) is an
+HMAC of its device_id and its stored Device.control_secret. rotate_token()
+replaces the secret, which revokes the old token and closes the kiosk's open
+control connection. Devices created before the secret existed have an empty
+one, and keep their device_id-only token until it is first rotated.
+
+Settings (all optional):
+
+    DEVICE_CONTROL = {
+        'PING_INTERVAL': 30,   # seconds between kiosk pings; presence expires after two missed
+        'ACK_TIMEOUT': 10,     # seconds before an unacknowledged command is redelivered
+        'MAX_ATTEMPTS': 5,
+        'COMMAND_TTL': {...},  # seconds a command stays deliverable, per command
+        'RETENTION': 86400,    # seconds settled and expired commands are kept
+    }
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import Device, DeviceCommand, DeviceConfiguration, new_control_secret
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_PREFIX = 'device_control:'
+RECENT_PREFIX = 'device_control_recent:'
+SESSION_COMMANDS = ('start', 'stop', 'pause', 'resume')
+SETTLED_STATUSES = ('acked', 'rejected', 'failed', 'expired')
+TOKEN_SALT = 'devices.control.token'
+
+DEFAULTS = {
+    'PING_INTERVAL': 30,
+    'ACK_TIMEOUT': 10,
+    'MAX_ATTEMPTS': 5,
+    'COMMAND_TTL': {
+        # Session commands are pointless once the customer has walked away
+        'start': 60,
+        'stop': 60,
+        'pause': 60,
+        'resume': 60,
+        'config': 60 * 60 * 24,
+        'performance': 60 * 60 * 24,
+    },
+    'RETENTION': 60 * 60 * 24,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'DEVICE_CONTROL', {}).get(name, DEFAULTS[name])
+
+
+def control_group(device_pk):
+    return f'device_control_{device_pk}'
+
+
+def control_token(device):
+    """The token `device` (with device_id and control_secret loaded) authenticates with."""
+    value = f'{device.device_id}:{device.control_secret}' if device.control_secret else device.device_id
+    return salted_hmac(TOKEN_SALT, value).hexdigest()
+
+
+def check_token(device, token):
+    return bool(token) and constant_time_compare(control_token(device), token)
+
+
+def rotate_token(device):
+    """Give `device` a new secret, revoking its current token. Returns the new token."""
+    device.control_secret = new_control_secret()
+    # update() rather than save(): the secret is not part of any cached state
+    Device.objects.filter(pk=device.pk).update(control_secret=device.control_secret)
+    device_pk = device.pk
+    transaction.on_commit(lambda: _revoke(device_pk))
+    return control_token(device)
+
+
+def _revoke(device_pk):
+    """Close the control connection authenticated with the old token, if any."""
+    try:
+        async_to_sync(get_channel_layer().group_send)(control_group(device_pk), {'type': 'control_revoke'})
+    except Exception:
+        logger.exception("Failed to close the control connection of device %s", device_pk)
+
+
+# Presence: the cache holds the channel of each connected kiosk, refreshed on ping
+
+def mark_connected(device_pk, channel_name):
+    presence = _setting('PING_INTERVAL') * 2
+    cache.set(f'{PRESENCE_PREFIX}{device_pk}', channel_name, presence)
+    # Outlives a disconnect by as long as a session command stays deliverable
+    session_ttl = max(_setting('COMMAND_TTL')[command] for command in SESSION_COMMANDS)
+    cache.set(f'{RECENT_PREFIX}{device_pk}', True, presence + session_ttl)
+
+
+def mark_disconnected(device_pk, channel_name):
+    key = f'{PRESENCE_PREFIX}{device_pk}'
+    if cache.get(key) == channel_name:
+        cache.delete(key)
+
+
+def is_connected(device_pk):
+    return cache.get(f'{PRESENCE_PREFIX}{device_pk}') is not None
+
+
+def uses_control_channel(device_pk):
+    """Whether the device's kiosk was connected recently enough to receive a session command."""
+    return cache.get(f'{RECENT_PREFIX}{device_pk}') is not None
+
+
+def command_message(command):
+    return {
+        'type': 'command',
+        'id': str(command.id),
+        'command': command.command,
+        'payload': command.payload,
+    }
+
+
+def _deliver(commands):
+    """Hand commands to their devices' control connections (if any)."""
+    channel_layer = get_channel_layer()
+    for command in commands:
+        if not is_connected(command.device_id):
+            continue
+        try:
+            async_to_sync(channel_layer.group_send)(
+                control_group(command.device_id),
+                {'type': 'control_command', 'command': command_message(command)},
+            )
+        except Exception:
+            # Stays queued/sent; delivered on reconnect or by redelivery
+            logger.exception("Failed to deliver command %s", command.id)
+
+
+def send_command(device_pk, command, payload=None, ttl=None):
+    """
+    Queue a command for a device and deliver it right away if the device is
+    connected (after the current transaction commits). Returns the DeviceCommand.
+    """
+    if ttl is None:
+        ttl = _setting('COMMAND_TTL')[command]
+    now = timezone.now()
+    device_command = DeviceCommand.objects.create(
+        device_id=device_pk,
+        command=command,
+        payload=payload or {},
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl),
+    )
+    transaction.on_commit(lambda: _deliver([device_command]))
+    return device_command
+
+
+def pending_commands(device_pk):
+    """Commands to (re)send to a device that just connected, oldest first."""
+    return list(
+        DeviceCommand.objects.filter(
+            device_id=device_pk,
+            status__in=('queued', 'sent'),
+            expires_at__gt=timezone.now(),
+        ).order_by('created_at')
+    )
+
+
+def mark_sent(command_id):
+    DeviceCommand.objects.filter(pk=command_id, status__in=('queued', 'sent')).update(
+        status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1
+    )
+
+
+def record_ack(device_pk, command_id, ok, result=None):
+    """
+    Apply a kiosk's acknowledgement. Returns False if the id is unknown for
+    this device (e.g. a duplicate ack for an already settled command).
+    """
+    with transaction.atomic():
+        command = (
+            DeviceCommand.objects.select_for_update()
+            .filter(pk=command_id, device_id=device_pk, status__in=('queued', 'sent'))
+            .first()
+        )
+        if command is None:
+            return False
+        command.status = 'acked' if ok else 'rejected'
+        command.acked_at = timezone.now()
+        command.result = result
+        command.save(update_fields=['status', 'acked_at', 'result'])
+
+        if ok and command.command == 'config' and command.payload.get('hash'):
+            # The device now holds this configuration (see config_push.plan_push)
+            DeviceConfiguration.objects.filter(device_id=device_pk).update(
+                acked_hash=command.payload['hash'],
+                acked_payload=command.payload['configuration'],
+                acked_at=command.acked_at,
+            )
+    return True
+
+
+def redeliver():
+    """
+    Expire stale commands, fail those out of attempts, resend the ones whose
+    ack is overdue and purge old settled ones. Returns counts.
+    """
+    now = timezone.now()
+    expired = DeviceCommand.objects.filter(
+        status__in=('queued', 'sent'), expires_at__lte=now
+    ).update(status='expired')
+    failed = DeviceCommand.objects.filter(
+        status='sent', attempts__gte=_setting('MAX_ATTEMPTS'),
+        sent_at__lt=now - timedelta(seconds=_setting('ACK_TIMEOUT')),
+    ).update(status='failed')
+    overdue = list(
+        DeviceCommand.objects.filter(
+            status='sent', sent_at__lt=now - timedelta(seconds=_setting('ACK_TIMEOUT'))
+        ).order_by('created_at')
+    )
+    _deliver(overdue)
+    purged = purge(now)
+    return {'expired': expired, 'failed': failed, 'redelivered': len(overdue), 'purged': purged}
+
+
+def purge(now=None):
+    """Delete settled and expired commands older than RETENTION. Returns how many."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=_setting('RETENTION'))
+    deleted, _by_model = DeviceCommand.objects.filter(
+        Q(status__in=SETTLED_STATUSES) | Q(expires_at__lte=cutoff), created_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def notify_transition(session, command):
+    """Queue the kiosk command for a transition made by the session engine, if the kiosk would get it."""
+    if not uses_control_channel(session.device_id):
+        return
+    payload = {'session_id': session.id}
+    if command == 'start':
+        payload.update({
+            'program_id': session.program_id,
+            'client_card': session.client_card,
+        })
+    elif command == 'stop':
+        payload.update({
+            'total_duration': session.total_duration,
+            'amount_charged': str(session.amount_charged) if session.amount_charged is not None else None,
+        })
+    send_command(session.device_id, command, payload)
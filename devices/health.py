@@ -0,0 +1,240 @@
+# devices/health.py
+"""
+Fleet-wide health sweep and periodic heartbeat.
+
+Every active device is checked with DeviceBackendService.check_device_status
+from a bounded thread pool (the HTTP client is blocking and pooled, so
+threads share its keep-alive connections). Each check's time and latency,
+and last_seen for devices found online, are written back with one
+bulk_update, which leaves updated_at alone. Status is written only for
+devices whose status the check changed, and only if the row still has the
+updated_at the sweep loaded: a start/stop that landed while the checks ran
+(up to JITTER seconds) wins, and the sweep leaves that device alone. Only
+that write bumps updated_at, so a steady fleet doesn't race session
+transitions. Devices whose status changed are broadcast together in one
+batch.
+
+The heartbeat (devices.tasks.device_heartbeat, run by Celery beat every
+INTERVAL seconds) checks one shard of the fleet per run, rotating through
+the shards, with the checks spread over JITTER seconds. A failed heartbeat
+check does not take a device offline by itself; devices that have not been
+seen for STALE_AFTER seconds are timed out instead, unless a session is open
+on them (the kiosk is in use, whatever the backend checks say).
+
+Settings (all optional):
+
+    DEVICE_HEALTH_SWEEP = {
+        'MAX_WORKERS': 20,   # in-flight status checks (default: the HTTP pool size)
+    }
+    DEVICE_HEARTBEAT = {
+        'INTERVAL': 15,      # seconds between heartbeat runs
+        'SHARDS': 4,         # a device is checked every INTERVAL * SHARDS seconds
+        'JITTER': 10,        # seconds over which a run's checks are spread
+        'STALE_AFTER': 180,  # seconds without being seen before a device goes offline
+    }
+"""
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from . import snapshot
+from .models import Device, DeviceSession
+from .registry import OPEN_STATUSES
+from .services import DeviceBackendService, http_setting
+from .utils import broadcast_batch, broadcast_device_update, device_status_message
+
+logger = logging.getLogger(__name__)
+
+SWEEP_FIELDS = ['id', 'device_id', 'name', 'status', 'is_active', 'registration_status',
+                'last_seen', 'updated_at', 'last_check_at', 'last_check_latency']
+
+HEARTBEAT_DEFAULTS = {
+    'INTERVAL': 15,
+    'SHARDS': 4,
+    'JITTER': 10,
+    'STALE_AFTER': 180,
+}
+
+
+def _max_workers():
+    # Default to the per-host pool size: every check goes to the same backend
+    # host, so more threads than pooled connections would just open throwaway ones
+    return getattr(settings, 'DEVICE_HEALTH_SWEEP', {}).get('MAX_WORKERS') or http_setting('POOL_MAXSIZE')
+
+
+def heartbeat_setting(name):
+    return getattr(settings, 'DEVICE_HEARTBEAT', {}).get(name, HEARTBEAT_DEFAULTS[name])
+
+
+def apply_status(device, online, now, offline_on_failure=True):
+    """
+    Apply a check result to `device` (same rules as the status_check action).
+    Returns True if the device's status changed.
+    """
+    if online:
+        changed = device.status != 'online'
+        device.status = 'online'
+        device.last_seen = now
+        return changed
+    if offline_on_failure and device.status == 'online':
+        device.status = 'offline'
+        return True
+    return False
+
+
+# Writes status only where updated_at is still the value the caller loaded
+# (every status write bumps it, session transitions included).
+STATUS_SQL = """
+UPDATE devices_device AS device
+SET status = probe.status,
+    updated_at = %s
+FROM (VALUES {rows}) AS probe (id, status, loaded_at)
+WHERE device.id = probe.id AND device.updated_at = probe.loaded_at
+RETURNING device.id
+"""
+
+
+def _write_status(devices, now, batch_size=500):
+    """
+    Write the status of `devices`, skipping rows changed since they were
+    loaded. Returns the devices written.
+    """
+    written = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(devices), batch_size):
+            batch = devices[start:start + batch_size]
+            rows = ', '.join(['(%s::integer, %s, %s::timestamptz)'] * len(batch))
+            params = [now]
+            for device in batch:
+                params += [device.id, device.status, device.updated_at]
+            cursor.execute(STATUS_SQL.format(rows=rows), params)
+            written.update(device_id for (device_id,) in cursor.fetchall())
+    devices = [device for device in devices if device.id in written]
+    for device in devices:
+        device.updated_at = now
+    return devices
+
+
+def _write_checks(devices, online_ids):
+    """Write the check results, and last_seen for the `online_ids` devices."""
+    fields = ['last_check_at', 'last_check_latency']
+    online = [device for device in devices if device.id in online_ids]
+    others = [device for device in devices if device.id not in online_ids]
+    # Two field sets, so a device not seen keeps the last_seen in the row
+    if online:
+        Device.objects.bulk_update(online, fields + ['last_seen'], batch_size=500)
+    if others:
+        Device.objects.bulk_update(others, fields, batch_size=500)
+
+
+def _save(changed, now):
+    """
+    Persist and broadcast the new status of the `changed` devices. Returns
+    the devices written.
+    """
+    with broadcast_batch():
+        with transaction.atomic():
+            written = _write_status(changed, now) if changed else []
+            # The raw update sends no signals
+            snapshot.refresh(written)
+            for device in written:
+                broadcast_device_update(device.id, device_status_message(device))
+    return written
+
+
+def sweep(devices=None, max_workers=None, spread=0, offline_on_failure=True):
+    """
+    Check `devices` (default: all active devices) concurrently and persist the
+    results. With `spread`, check start times are scattered over that many
+    seconds instead of all starting at once. Returns a summary dict.
+    """
+    if devices is None:
+        devices = Device.objects.filter(is_active=True)
+    devices = list(devices.only(*SWEEP_FIELDS))
+    started = time.monotonic()
+    offsets = sorted(random.uniform(0, spread) for _ in devices) if spread else [0] * len(devices)
+    service = DeviceBackendService()
+
+    def check(device, offset):
+        delay = started + offset - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        check_started = time.monotonic()
+        online, _message = service.check_device_status(device.device_id)
+        return online, round((time.monotonic() - check_started) * 1000)
+
+    with ThreadPoolExecutor(max_workers=max_workers or _max_workers()) as executor:
+        results = list(executor.map(check, devices, offsets))
+
+    now = timezone.now()
+    changed, online_ids = [], set()
+    for device, (online, latency) in zip(devices, results):
+        device.last_check_at = now
+        device.last_check_latency = latency
+        if apply_status(device, online, now, offline_on_failure):
+            changed.append(device)
+        if online:
+            online_ids.add(device.id)
+
+    _write_checks(devices, online_ids)
+    written = _save(changed, now)
+
+    online_count = sum(1 for online, _latency in results if online)
+    summary = {
+        'checked': len(devices),
+        'online': online_count,
+        'offline': len(devices) - online_count,
+        'changed': len(written),
+        'skipped': len(changed) - len(written),
+        'duration': round(time.monotonic() - started, 3),
+    }
+    logger.info("Fleet health sweep: %s", summary)
+    return summary
+
+
+def expire_stale(stale_after=None):
+    """
+    Take online devices not seen for `stale_after` seconds offline, except
+    those with an open session. Returns how many.
+    """
+    if stale_after is None:
+        stale_after = heartbeat_setting('STALE_AFTER')
+    now = timezone.now()
+    open_session = DeviceSession.objects.filter(device=OuterRef('pk'), status__in=OPEN_STATUSES)
+    stale = list(
+        Device.objects
+        .filter(status='online')
+        .filter(Q(last_seen__lt=now - timedelta(seconds=stale_after)) | Q(last_seen__isnull=True))
+        .exclude(Exists(open_session))
+        .only(*SWEEP_FIELDS)
+    )
+    for device in stale:
+        device.status = 'offline'
+    return len(_save(stale, now))
+
+
+def heartbeat(now=None):
+    """
+    Check this run's shard of the active fleet, then time out stale devices.
+    The shard follows from the run time, so consecutive runs cover the fleet.
+    """
+    shards = heartbeat_setting('SHARDS')
+    interval = heartbeat_setting('INTERVAL')
+    shard = int((time.time() if now is None else now) // interval) % shards
+    devices = (
+        Device.objects.filter(is_active=True)
+        .alias(shard=Mod('id', shards))
+        .filter(shard=shard)
+    )
+    summary = sweep(devices, spread=heartbeat_setting('JITTER'), offline_on_failure=False)
+    summary['shard'] = shard
+    summary['timed_out'] = expire_stale()
+    return summary
@@ -0,0 +1,168 @@
+# devices/layer_benchmark.py
+"""
+group_send fan-out benchmark for Redis channel layers (manage.py benchmark_channel_layer).
+
+Several layer instances stand in for server processes. Each has its own
+process prefix, so their channels spread over the shards as a fleet of
+daphne workers' would. Every channel joins one benchmark group. One more
+instance then sends `messages` group_sends round-robin over the groups,
+`concurrency` at a time. The benchmark reports the group_send call latency
+and the delivery latency of every message, from send to receive, plus
+throughput.
+
+RedisServers starts throwaway redis-server processes to run against. All
+keys use their own prefix and are flushed afterwards.
+"""
+import asyncio
+import shutil
+import subprocess
+import tempfile
+import time
+
+import redis
+
+from .simulator import percentile
+
+PREFIX = 'layerbench'
+
+
+class RedisServers:
+    """`count` local redis-server processes on consecutive ports, without persistence."""
+
+    def __init__(self, count, base_port=6390, executable='redis-server'):
+        self.ports = [base_port + n for n in range(count)]
+        self.executable = executable
+        self.processes = []
+        self.directory = None
+
+    @property
+    def urls(self):
+        return [f'redis://127.0.0.1:{port}' for port in self.ports]
+
+    def start(self, timeout=10):
+        if shutil.which(self.executable) is None:
+            raise FileNotFoundError(f"{self.executable} not found")
+        self.directory = tempfile.mkdtemp(prefix='layerbench-')
+        for port in self.ports:
+            self.processes.append(subprocess.Popen(
+                [self.executable, '--port', str(port), '--bind', '127.0.0.1', '--save', '',
+                 '--appendonly', 'no', '--dir', self.directory],
+                stdout=subprocess.DEVNULL,
+            ))
+        deadline = time.monotonic() + timeout
+        for port in self.ports:
+            client = redis.Redis(port=port)
+            while True:
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    if time.monotonic() > deadline:
+                        self.stop()
+                        raise
+                    time.sleep(0.05)
+            client.close()
+        return self
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=10)
+        self.processes = []
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def shard_spread(layer, names):
+    """How many of `names` each shard of `layer` holds."""
+    counts = [0] * layer.ring_size
+    for name in names:
+        counts[layer.consistent_hash(name)] += 1
+    return counts
+
+
+def moved_share(old_layer, new_layer, names):
+    """Share of `names` placed on a different host by `new_layer` than by `old_layer`."""
+    def host(layer, name):
+        return repr(layer.hosts[layer.consistent_hash(name)])
+    moved = sum(1 for name in names if host(old_layer, name) != host(new_layer, name))
+    return moved / len(names) if names else 0.0
+
+
+async def fan_out(make_layer, groups=100, members=10, messages=10000, concurrency=100,
+                  workers=8, payload_size=200, timeout=60):
+    """
+    Run one benchmark. `make_layer()` returns a new channel layer instance.
+    Returns a summary dict with latencies in ms.
+    """
+    receivers = [make_layer() for _ in range(workers)]
+    sender = make_layer()
+    group_names = [f'{PREFIX}_{n}' for n in range(groups)]
+
+    channels = []
+    for n in range(groups * members):
+        layer = receivers[n % workers]
+        channel = await layer.new_channel()
+        await layer.group_add(group_names[n % groups], channel)
+        channels.append((layer, channel))
+
+    expected = messages * members
+    delivery = []
+    done = asyncio.Event()
+
+    async def receive(layer, channel):
+        while True:
+            message = await layer.receive(channel)
+            delivery.append(time.time() - message['sent'])
+            if len(delivery) >= expected:
+                done.set()
+
+    receiving = [asyncio.ensure_future(receive(layer, channel)) for layer, channel in channels]
+
+    payload = 'x' * payload_size
+    semaphore = asyncio.Semaphore(concurrency)
+    send_latency = []
+
+    async def send(n):
+        async with semaphore:
+            started = time.perf_counter()
+            await sender.group_send(group_names[n % groups], {
+                'type': 'bench.message',
+                'sent': time.time(),
+                'payload': payload,
+            })
+            send_latency.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(n) for n in range(messages)))
+    send_elapsed = time.perf_counter() - started
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    for task in receiving:
+        task.cancel()
+    await asyncio.gather(*receiving, return_exceptions=True)
+    await sender.flush()
+    for layer in receivers:
+        await layer.close_pools()
+
+    send_latency.sort()
+    delivery.sort()
+    return {
+        'shards': sender.ring_size,
+        'sends': messages,
+        'send_rate': round(messages / send_elapsed, 1),
+        'send_p50': round(percentile(send_latency, 0.50) * 1000, 2),
+        'send_p99': round(percentile(send_latency, 0.99) * 1000, 2),
+        'delivered': len(delivery),
+        'lost': expected - len(delivery),
+        'delivery_rate': round(len(delivery) / elapsed, 1),
+        'p50': round(percentile(delivery, 0.50) * 1000, 2) if delivery else None,
+        'p90': round(percentile(delivery, 0.90) * 1000, 2) if delivery else None,
+        'p99': round(percentile(delivery, 0.99) * 1000, 2) if delivery else None,
+        'max': round(delivery[-1] * 1000, 2) if delivery else None,
+    }
@@ -0,0 +1,168 @@
+# devices/log_buffer.py
+"""
+Buffered writer for DeviceLog.
+
+Request handlers hand log entries to the buffer and return immediately; a
+background thread writes them with bulk_create when the batch size is reached
+or the flush interval elapses. The queue is bounded: when it is full new
+entries are dropped and counted rather than blocking the request.
+
+In SYNC mode entries are written as they are logged, except from a running
+event loop (the async views), where the ORM can't run: the write is then
+handed to a thread with sync_to_async. A forked child starts with an empty
+queue and a fresh lock; the parent's entries are the parent's to write.
+
+Settings (all optional):
+
+    DEVICE_LOG_BUFFER = {
+        'SYNC': False,          # write each entry immediately (tests)
+        'MAX_BATCH': 500,       # flush as soon as this many entries are queued
+        'FLUSH_INTERVAL': 1.0,  # seconds between time-based flushes
+        'MAX_QUEUE': 10000,     # entries held before new ones are dropped
+    }
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import DeviceLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SYNC': False,
+    'MAX_BATCH': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'DEVICE_LOG_BUFFER', {}).get(name, DEFAULTS[name])
+
+
+class DeviceLogBuffer:
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        # SYNC-mode writes scheduled from an event loop, kept until done
+        self._tasks = set()
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    def log(self, device, log_type, message):
+        """Queue a log entry. `device` may be a Device or a device pk."""
+        entry = DeviceLog(
+            device_id=getattr(device, 'pk', device),
+            log_type=log_type,
+            message=message,
+            created_at=timezone.now(),
+        )
+        if _setting('SYNC'):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._write([entry])
+            else:
+                task = loop.create_task(sync_to_async(self._write)([entry]))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return
+
+        with self._lock:
+            if len(self._queue) >= _setting('MAX_QUEUE'):
+                self.dropped += 1
+                return
+            self._queue.append(entry)
+            depth = len(self._queue)
+
+        self._ensure_worker()
+        if depth >= _setting('MAX_BATCH'):
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything queued so far."""
+        with self._lock:
+            entries = list(self._queue)
+            self._queue.clear()
+        batch_size = _setting('MAX_BATCH')
+        for start in range(0, len(entries), batch_size):
+            self._write(entries[start:start + batch_size])
+
+    def stop(self):
+        """Stop the background thread and write whatever is still queued."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._queue),
+            'max_queue': _setting('MAX_QUEUE'),
+            'dropped': self.dropped,
+            'flushed': self.flushed,
+            'failed': self.failed,
+        }
+
+    def _write(self, entries):
+        try:
+            DeviceLog.objects.bulk_create(entries)
+            self.flushed += len(entries)
+        except Exception:
+            self.failed += len(entries)
+            logger.exception("Failed to write %d device log entries", len(entries))
+
+    def _ensure_worker(self):
+        # (Re)start after fork: threads don't survive into child processes
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='device-log-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(_setting('FLUSH_INTERVAL'))
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+
+device_log_buffer = DeviceLogBuffer()
+
+
+def log(device, log_type, message):
+    """Queue a DeviceLog entry without blocking on the database."""
+    device_log_buffer.log(device, log_type, message)
+
+
+atexit.register(device_log_buffer.stop)
+os.register_at_fork(after_in_child=device_log_buffer._reset)
+
+
+@worker_process_shutdown.connect
+def _flush_on_worker_shutdown(**kwargs):
+    device_log_buffer.stop()
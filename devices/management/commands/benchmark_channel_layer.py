@@ -0,0 +1,93 @@
+import asyncio
+
+from channels_redis.core import RedisChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.channel_layers import ShardedRedisChannelLayer
+from devices.layer_benchmark import PREFIX, RedisServers, fan_out, moved_share, shard_spread
+
+LAYERS = {
+    'sharded': ShardedRedisChannelLayer,
+    'modulo': RedisChannelLayer,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure channel layer group_send fan-out throughput and latency over one or more "
+        "Redis servers, started locally with --spawn or given with --redis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spawn', type=int, default=0,
+                            help="Start this many local redis-server processes to run against.")
+        parser.add_argument('--base-port', type=int, default=6390, help="First port for --spawn.")
+        parser.add_argument('--redis-server', default='redis-server', help="redis-server executable for --spawn.")
+        parser.add_argument('--redis', action='append', default=[],
+                            help="Redis URL to run against (repeat for several shards).")
+        parser.add_argument('--layers', default='sharded,modulo',
+                            help=f"Comma-separated layers to compare: {', '.join(LAYERS)}.")
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--members', type=int, default=10, help="Channels per group.")
+        parser.add_argument('--messages', type=int, default=10000, help="group_send calls.")
+        parser.add_argument('--concurrency', type=int, default=100, help="group_send calls in flight.")
+        parser.add_argument('--workers', type=int, default=8, help="Simulated server processes.")
+        parser.add_argument('--payload', type=int, default=200, help="Payload bytes per message.")
+        parser.add_argument('--capacity', type=int, default=1000, help="Channel capacity.")
+        parser.add_argument('--timeout', type=float, default=60, help="Seconds to wait for deliveries.")
+
+    def handle(self, *args, **options):
+        layers = [name.strip() for name in options['layers'].split(',') if name.strip()]
+        unknown = set(layers) - set(LAYERS)
+        if unknown:
+            raise CommandError(f"Unknown layers: {', '.join(sorted(unknown))}")
+        if bool(options['spawn']) == bool(options['redis']):
+            raise CommandError("Pass either --spawn N or one or more --redis URLs.")
+
+        servers = None
+        urls = options['redis']
+        if options['spawn']:
+            servers = RedisServers(options['spawn'], options['base_port'], options['redis_server'])
+            try:
+                servers.start()
+            except (OSError, ConnectionError) as e:
+                raise CommandError(f"Could not start redis-server: {e}")
+            urls = servers.urls
+
+        try:
+            self.report_placement(urls, options['groups'])
+            columns = ['layer', 'shards', 'sends', 'send_rate', 'send_p50', 'send_p99', 'delivered',
+                       'lost', 'delivery_rate', 'p50', 'p90', 'p99', 'max']
+            self.stdout.write("\n(latencies in ms, rates per second)")
+            self.stdout.write(''.join(f'{column:>14}' for column in columns))
+            for name in layers:
+                def make_layer(layer_class=LAYERS[name]):
+                    return layer_class(hosts=urls, prefix=PREFIX, capacity=options['capacity'])
+
+                row = asyncio.run(fan_out(
+                    make_layer,
+                    groups=options['groups'],
+                    members=options['members'],
+                    messages=options['messages'],
+                    concurrency=options['concurrency'],
+                    workers=options['workers'],
+                    payload_size=options['payload'],
+                    timeout=options['timeout'],
+                ))
+                row['layer'] = name
+                self.stdout.write(''.join(f'{row[column]!s:>14}' for column in columns))
+        finally:
+            if servers is not None:
+                servers.stop()
+
+    def report_placement(self, urls, groups):
+        """Groups per shard, and the share that moves when one more shard is added."""
+        names = [f'device_{n}' for n in range(max(groups, 10000))]
+        grown = urls + ['redis://127.0.0.1:1']
+        for name, layer_class in LAYERS.items():
+            layer = layer_class(hosts=urls)
+            moved = moved_share(layer, layer_class(hosts=grown), names)
+            self.stdout.write(
+                f"{name}: {len(names)} groups per shard {shard_spread(layer, names)}, "
+                f"{moved:.0%} move when a shard is added"
+            )
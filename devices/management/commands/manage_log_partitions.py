@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from devices import partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming DeviceLog partitions, refresh daily rollups and drop or archive expired partitions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help="Number of future monthly partitions to keep ready.")
+        parser.add_argument('--retention-months', type=int, default=None,
+                            help="Months of raw logs to keep (default: DEVICE_LOG_RETENTION_MONTHS).")
+        parser.add_argument('--archive', action='store_true', default=None,
+                            help="Detach and keep expired partitions instead of dropping them.")
+
+    def handle(self, *args, **options):
+        result = partitions.maintain(
+            months_ahead=options['months_ahead'],
+            retention_months=options['retention_months'],
+            archive=options['archive'],
+        )
+        for name in result['created']:
+            self.stdout.write(f"Created {name}")
+        for name in result['expired']:
+            self.stdout.write(f"Expired {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(result['created'])} partitions created, {len(result['expired'])} expired."
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from devices import registry
+
+
+class Command(BaseCommand):
+    help = "Rebuild the active-session registry from the database, or check it for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report registry entries that disagree with the database.",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = registry.find_inconsistencies()
+            for device_id, cached, actual in mismatches:
+                self.stdout.write(f"Device {device_id}: registry={cached} database={actual}")
+            if mismatches:
+                self.stdout.write(self.style.WARNING(f"{len(mismatches)} inconsistent registry entries."))
+            else:
+                self.stdout.write(self.style.SUCCESS("Registry is consistent with the database."))
+            return
+
+        count = registry.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt session registry for {count} devices."))
@@ -0,0 +1,16 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from devices import metering
+
+
+class Command(BaseCommand):
+    help = "Run the session meter: push running duration/cost ticks for open sessions over the channel layer."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Session meter listening on '{metering.METER_CHANNEL}'")
+        try:
+            asyncio.run(metering.run_meter())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from devices.models import Device, DeviceConfiguration, WashProgram
+from devices.simulator import FleetLoad, StubBackend
+
+DEVICE_PREFIX = 'sim-'
+PHASES = ('verify', 'status', 'sessions')
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a stand-in device backend and drive a simulated fleet against the API, "
+        "reporting throughput and latency percentiles. Start the server under test with "
+        "DEVICE_BACKEND_URL pointing at the stand-in backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=1000, help="Simulated devices.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Devices in flight at once.")
+        parser.add_argument('--cycles', type=int, default=1, help="Session cycles per device.")
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help="Mean seconds between a device's session commands.")
+        parser.add_argument('--phases', default=','.join(PHASES),
+                            help=f"Comma-separated phases to run, in order: {', '.join(PHASES)}.")
+        parser.add_argument('--watchers', type=int, default=0,
+                            help="Devices whose websocket stream is opened and timed.")
+        parser.add_argument('--api-url', default='http://127.0.0.1:8000', help="Base URL of the server under test.")
+        parser.add_argument('--ws-url', default=None, help="Websocket base URL (default: the API URL).")
+        parser.add_argument('--user', default=None,
+                            help="Username the load runs as (default: the first admin).")
+        parser.add_argument('--backend-host', default='127.0.0.1')
+        parser.add_argument('--backend-port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=20.0, help="Mean backend latency in ms.")
+        parser.add_argument('--jitter', type=float, default=10.0, help="Backend latency standard deviation in ms.")
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help="Share (0-1) of backend requests answered with 503.")
+        parser.add_argument('--offline-rate', type=float, default=0.0,
+                            help="Share (0-1) of status checks reporting the device offline.")
+        parser.add_argument('--backend-only', action='store_true',
+                            help="Only run the stand-in backend until interrupted.")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="Delete the simulated devices afterwards.")
+
+    def handle(self, *args, **options):
+        phases = [phase.strip() for phase in options['phases'].split(',') if phase.strip()]
+        unknown = set(phases) - set(PHASES)
+        if unknown:
+            raise CommandError(f"Unknown phases: {', '.join(sorted(unknown))}")
+
+        backend = StubBackend(
+            host=options['backend_host'],
+            port=options['backend_port'],
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'] / 1000,
+            failure_rate=options['failure_rate'],
+            offline_rate=options['offline_rate'],
+        )
+        self.stdout.write(f"Stand-in device backend on {backend.url} (set DEVICE_BACKEND_URL={backend.url})")
+        if options['backend_only']:
+            try:
+                backend.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        backend.start()
+        devices = self.prepare_devices(options['devices'])
+        program = WashProgram.objects.order_by('id').first()
+        if program is None:
+            program = WashProgram.objects.create(name='Simulator', price_per_second=Decimal('0.10'))
+        load = FleetLoad(
+            options['api_url'],
+            self.access_token(options['user']),
+            devices,
+            program.id,
+            concurrency=options['concurrency'],
+            think_time=options['think_time'],
+        )
+
+        close_watchers = None
+        if options['watchers']:
+            ws_url = options['ws_url'] or options['api_url'].replace('http', 'ws', 1)
+            close_watchers = load.watch(options['watchers'], ws_url)
+
+        load.recorder.start()
+        try:
+            for phase in phases:
+                self.stdout.write(f"Running {phase} for {len(devices)} devices...")
+                if phase == 'verify':
+                    load.run_phase(load.verify)
+                elif phase == 'status':
+                    load.run_phase(load.status_check)
+                else:
+                    load.run_phase(load.session_cycle, cycles=options['cycles'])
+        finally:
+            load.recorder.stop()
+            if close_watchers:
+                close_watchers()
+            backend.stop()
+            if options['cleanup']:
+                Device.objects.filter(device_id__startswith=DEVICE_PREFIX).delete()
+
+        self.report(load.recorder.summary(), backend.requests)
+
+    def prepare_devices(self, count):
+        """Create (or reuse) `count` verified simulated devices. Returns [(pk, device_id)]."""
+        device_ids = [f'{DEVICE_PREFIX}{n:05d}' for n in range(count)]
+        Device.objects.bulk_create(
+            [
+                Device(name=f'Simulated {device_id}', device_id=device_id, ip_address='127.0.0.1',
+                       location='Simulator', registration_status='verified')
+                for device_id in device_ids
+            ],
+            ignore_conflicts=True,
+        )
+        devices = list(
+            Device.objects.filter(device_id__in=device_ids).order_by('device_id').values_list('id', 'device_id')
+        )
+        configured = set(
+            DeviceConfiguration.objects.filter(device_id__in=[pk for pk, _ in devices]).values_list('device_id', flat=True)
+        )
+        DeviceConfiguration.objects.bulk_create([
+            DeviceConfiguration(device_id=pk, price_per_minute=10)
+            for pk, _device_id in devices if pk not in configured
+        ])
+        return devices
+
+    def access_token(self, username):
+        User = get_user_model()
+        users = User.objects.filter(username=username) if username else User.objects.filter(role='admin')
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError("No user to run the load as; pass --user.")
+        return str(RefreshToken.for_user(user).access_token)
+
+    def report(self, summary, backend_requests):
+        columns = ['operation', 'count', 'errors', 'rps', 'mean', 'p50', 'p90', 'p99', 'max']
+        self.stdout.write(f"\nElapsed {summary['elapsed']}s (latencies in ms)")
+        self.stdout.write(''.join(f'{column:>14}' for column in columns))
+        for row in summary['operations']:
+            self.stdout.write(''.join(f'{row[column]!s:>14}' for column in columns))
+        if backend_requests:
+            served = ', '.join(f'{name}={count}' for name, count in sorted(backend_requests.items()))
+            self.stdout.write(f"Backend requests: {served}")
@@ -0,0 +1,236 @@
+# devices/metering.py
+"""
+Live metering of open sessions.
+
+Billing is per whole second of active time:
+
+    amount_charged = price_per_second * billed seconds, rounded to cents
+
+A session accrues time only while active. ``total_duration`` holds the seconds
+billed so far and ``resumed_at`` the start of the running stretch (NULL while
+paused). The session engine persists these on pause and stop, the only times
+``amount_charged`` is written. Between transitions the meter process
+(``manage.py run_session_meter``) keeps every open session in memory and
+pushes a ``session_tick`` to the device's websocket group once per interval,
+without touching the database.
+
+The meter learns about transitions through the METER_CHANNEL channel and
+re-reads the open sessions from the database periodically, so a missed
+message or a restart only delays ticks.
+
+Settings (all optional):
+
+    SESSION_METER = {
+        'TICK_INTERVAL': 1.0,    # seconds between ticks
+        'RESYNC_INTERVAL': 60,   # seconds between reloads from the database
+    }
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DeviceSession
+
+logger = logging.getLogger(__name__)
+
+METER_CHANNEL = 'session-meter'
+CENT = Decimal('0.01')
+# Seconds between "meter channel full" warnings
+FULL_WARNING_INTERVAL = 300
+
+_last_full_warning = None
+
+DEFAULTS = {
+    'TICK_INTERVAL': 1.0,
+    'RESYNC_INTERVAL': 60,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'SESSION_METER', {}).get(name, DEFAULTS[name])
+
+
+def charge(price_per_second, seconds):
+    """The amount charged for `seconds` of active time."""
+    if price_per_second is None:
+        return None
+    return (Decimal(price_per_second) * seconds).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def charge_sql(price, seconds):
+    """
+    SQL for `charge`, used by the session engine's statements. Postgres'
+    round() rounds half away from zero, which is ROUND_HALF_UP for prices.
+    """
+    return f'round(({price}) * ({seconds}), 2)'
+
+
+def elapsed_seconds(total_duration, resumed_at, now):
+    """Billed seconds at `now`: the stored total plus the running stretch, if any."""
+    if resumed_at is None:
+        return total_duration
+    return total_duration + max(0, math.floor((now - resumed_at).total_seconds()))
+
+
+@dataclass
+class MeteredSession:
+    session_id: int
+    device_id: int
+    status: str
+    total_duration: int
+    resumed_at: datetime = None
+    price_per_second: Decimal = None
+
+    def reading(self, now):
+        seconds = elapsed_seconds(self.total_duration, self.resumed_at, now)
+        amount = charge(self.price_per_second, seconds)
+        return {
+            'session_id': self.session_id,
+            'device_id': self.device_id,
+            'status': self.status,
+            'duration': seconds,
+            'amount_charged': str(amount) if amount is not None else None,
+        }
+
+
+def transition_message(session, price_per_second):
+    """The message the engine sends to the meter after a transition."""
+    return {
+        'type': 'session.transition',
+        'session_id': session.id,
+        'device_id': session.device_id,
+        'status': session.status,
+        'total_duration': session.total_duration,
+        'resumed_at': session.resumed_at.isoformat() if session.resumed_at else None,
+        'price_per_second': str(price_per_second) if price_per_second is not None else None,
+    }
+
+
+def notify(session, price_per_second):
+    """Tell the meter about a committed transition."""
+    message = transition_message(session, price_per_second)
+    transaction.on_commit(lambda: _send(message))
+
+
+def _send(message):
+    global _last_full_warning
+    try:
+        async_to_sync(get_channel_layer().send)(METER_CHANNEL, message)
+    except ChannelFull:
+        # No meter is draining the channel (or it is behind). Transitions are
+        # already committed and the meter resyncs when it runs, so warn only
+        # now and then instead of on every transition.
+        now = time.monotonic()
+        if _last_full_warning is None or now - _last_full_warning >= FULL_WARNING_INTERVAL:
+            _last_full_warning = now
+            logger.warning(
+                "Session meter channel is full; is `manage.py run_session_meter` running? "
+                "Dropping transition messages (warning at most every %ss)", FULL_WARNING_INTERVAL,
+            )
+    except Exception:
+        # Ticks are best effort; the meter resyncs from the database
+        logger.exception("Failed to notify the session meter")
+
+
+class SessionMeter:
+    """In-memory running duration and cost for every open session."""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def apply(self, message):
+        """Apply a transition message. Returns the affected MeteredSession."""
+        entry = MeteredSession(
+            session_id=message['session_id'],
+            device_id=message['device_id'],
+            status=message['status'],
+            total_duration=message['total_duration'],
+            resumed_at=datetime.fromisoformat(message['resumed_at']) if message['resumed_at'] else None,
+            price_per_second=Decimal(message['price_per_second']) if message['price_per_second'] else None,
+        )
+        if entry.status in ('active', 'paused'):
+            self.sessions[entry.device_id] = entry
+        else:
+            self.sessions.pop(entry.device_id, None)
+        return entry
+
+    def load(self, sessions):
+        """Replace the state with the given open DeviceSessions (program selected)."""
+        self.sessions = {
+            session.device_id: MeteredSession(
+                session_id=session.id,
+                device_id=session.device_id,
+                status=session.status,
+                total_duration=session.total_duration,
+                resumed_at=session.resumed_at,
+                price_per_second=session.program.price_per_second if session.program else None,
+            )
+            for session in sessions
+        }
+
+    def active(self):
+        return [entry for entry in self.sessions.values() if entry.status == 'active']
+
+
+def _tick_event(entry, now):
+    return {'type': 'session_tick', 'message': entry.reading(now)}
+
+
+async def _resync(meter):
+    sessions = [
+        session async for session in
+        DeviceSession.objects.filter(status__in=('active', 'paused')).select_related('program')
+    ]
+    meter.load(sessions)
+
+
+async def _receive(meter, channel_layer):
+    while True:
+        message = await channel_layer.receive(METER_CHANNEL)
+        if message.get('type') != 'session.transition':
+            continue
+        entry = meter.apply(message)
+        # Send the new state right away (also the final reading after stop)
+        await channel_layer.group_send(f'device_{entry.device_id}', _tick_event(entry, timezone.now()))
+
+
+async def run_meter(meter=None):
+    """Run the meter until cancelled."""
+    meter = meter or SessionMeter()
+    channel_layer = get_channel_layer()
+    tick_interval = _setting('TICK_INTERVAL')
+    resync_interval = _setting('RESYNC_INTERVAL')
+
+    await _resync(meter)
+    receiver = asyncio.create_task(_receive(meter, channel_layer))
+    loop = asyncio.get_running_loop()
+    next_resync = loop.time() + resync_interval
+    try:
+        while True:
+            await asyncio.sleep(tick_interval)
+            if receiver.done():
+                # Surface receive errors instead of silently ticking stale state
+                receiver.result()
+            now = timezone.now()
+            active = meter.active()
+            if active:
+                await asyncio.gather(*(
+                    channel_layer.group_send(f'device_{entry.device_id}', _tick_event(entry, now))
+                    for entry in active
+                ))
+            if loop.time() >= next_resync:
+                await _resync(meter)
+                next_resync = loop.time() + resync_interval
+    finally:
+        receiver.cancel()
@@ -0,0 +1,76 @@
+# devices/middleware.py
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import query_budget
+from .utils import abroadcast_batch, broadcast_batch
+
+
+class DeviceBroadcastMiddleware:
+    """
+    Collect the device broadcasts made while handling a request and send them
+    as one coalesced batch when the response is ready.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with broadcast_batch():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        async with abroadcast_batch():
+            return await self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    """
+    Count each request's queries and query time into request.query_usage and
+    hold them against the view's query budget (devices/query_budget.py).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(query_budget.install, dispatch_uid='devices.query_budget')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Connections opened before the receiver was connected
+        for connection in connections.all(initialized_only=True):
+            query_budget.install(connection)
+        request.query_usage, token = query_budget.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            query_budget.finish(token)
+        query_budget.check(request, response, request.query_usage)
+        return response
+
+    async def __acall__(self, request):
+        request.query_usage, token = query_budget.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_budget.finish(token)
+        query_budget.check(request, response, request.query_usage)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        usage = request.query_usage
+        usage.endpoint, usage.budget = query_budget.resolve(view_func, request.method.lower())
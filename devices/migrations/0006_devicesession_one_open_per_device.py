@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0005_device_last_handshake_attempt_and_more'),
+    ]
+
+    operations = [
+        # Cancel duplicate open sessions, keeping the most recent one per device,
+        # so the partial unique index can be built.
+        migrations.RunSQL(
+            sql="""
+                UPDATE devices_devicesession
+                SET status = 'cancelled', ended_at = now()
+                WHERE status IN ('active', 'paused')
+                  AND id NOT IN (
+                      SELECT DISTINCT ON (device_id) id
+                      FROM devices_devicesession
+                      WHERE status IN ('active', 'paused')
+                      ORDER BY device_id, started_at DESC, id DESC
+                  )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='devicesession',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['active', 'paused'])), fields=('device',), name='devicesession_one_open_per_device'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 06:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0006_devicesession_one_open_per_device'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devicelog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
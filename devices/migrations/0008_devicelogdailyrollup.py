@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 06:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_devicelog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceLogDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('log_type', models.CharField(choices=[('info', 'Information'), ('warning', 'Warning'), ('error', 'Error'), ('command', 'Command'), ('status_change', 'Status Change')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_rollups', to='devices.device')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('device', 'date', 'log_type'), name='devicelogrollup_unique_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Converts devices_devicelog into a table range-partitioned by month on created_at.
+#
+# Postgres requires the partition key in the primary key, so the table's PK
+# becomes (id, created_at); ids still come from a single sequence and stay
+# unique, which is all Django relies on. Existing rows are copied into monthly
+# partitions; rows outside any monthly partition land in the default one.
+# Further partitions are created by `manage.py manage_log_partitions`.
+
+from django.db import migrations
+
+
+FORWARD_SQL = """
+ALTER TABLE devices_devicelog RENAME TO devices_devicelog_legacy;
+ALTER TABLE devices_devicelog_legacy RENAME CONSTRAINT devices_devicelog_pkey TO devices_devicelog_legacy_pkey;
+
+CREATE SEQUENCE devices_devicelog_partitioned_id_seq;
+
+CREATE TABLE devices_devicelog (
+    id bigint NOT NULL DEFAULT nextval('devices_devicelog_partitioned_id_seq'),
+    log_type varchar(20) NOT NULL,
+    message text NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    device_id bigint NOT NULL,
+    CONSTRAINT devices_devicelog_pkey PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE devices_devicelog_partitioned_id_seq OWNED BY devices_devicelog.id;
+
+CREATE TABLE devices_devicelog_default PARTITION OF devices_devicelog DEFAULT;
+
+DO $$
+DECLARE
+    month_start date := date_trunc('month', COALESCE(
+        (SELECT min(created_at) FROM devices_devicelog_legacy), now()
+    ) AT TIME ZONE 'UTC')::date;
+    last_month date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF devices_devicelog FOR VALUES FROM (%L) TO (%L)',
+            'devices_devicelog_p' || to_char(month_start, 'YYYY_MM'),
+            month_start::timestamp AT TIME ZONE 'UTC',
+            (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+INSERT INTO devices_devicelog (id, log_type, message, created_at, device_id)
+SELECT id, log_type, message, created_at, device_id FROM devices_devicelog_legacy;
+
+SELECT setval(
+    'devices_devicelog_partitioned_id_seq',
+    COALESCE((SELECT max(id) FROM devices_devicelog), 0) + 1,
+    false
+);
+
+DROP TABLE devices_devicelog_legacy;
+
+CREATE INDEX devices_devicelog_device_id_idx ON devices_devicelog (device_id);
+
+ALTER TABLE devices_devicelog
+    ADD CONSTRAINT devices_devicelog_device_id_fk_devices_device_id
+    FOREIGN KEY (device_id) REFERENCES devices_device (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+REVERSE_SQL = """
+ALTER TABLE devices_devicelog RENAME TO devices_devicelog_partitioned;
+ALTER TABLE devices_devicelog_partitioned RENAME CONSTRAINT devices_devicelog_pkey TO devices_devicelog_partitioned_pkey;
+DROP INDEX devices_devicelog_device_id_idx;
+
+CREATE TABLE devices_devicelog (
+    id bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY CONSTRAINT devices_devicelog_pkey PRIMARY KEY,
+    log_type varchar(20) NOT NULL,
+    message text NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    device_id bigint NOT NULL
+);
+
+INSERT INTO devices_devicelog (id, log_type, message, created_at, device_id)
+SELECT id, log_type, message, created_at, device_id FROM devices_devicelog_partitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('devices_devicelog', 'id'),
+    COALESCE((SELECT max(id) FROM devices_devicelog), 0) + 1,
+    false
+);
+
+DROP TABLE devices_devicelog_partitioned CASCADE;
+
+CREATE INDEX devices_devicelog_device_id_idx ON devices_devicelog (device_id);
+
+ALTER TABLE devices_devicelog
+    ADD CONSTRAINT devices_devicelog_device_id_fk_devices_device_id
+    FOREIGN KEY (device_id) REFERENCES devices_device (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_devicelogdailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
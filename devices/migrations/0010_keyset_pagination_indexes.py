@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 06:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+from devices import partitions
+
+LOG_INDEX = 'devicelog_device_created_idx'
+
+
+def create_log_index(apps, schema_editor):
+    partitions.create_index(schema_editor, LOG_INDEX, '(device_id, created_at DESC, id DESC)')
+
+
+def drop_log_index(apps, schema_editor):
+    partitions.drop_index(schema_editor, LOG_INDEX)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction; neither index
+    # blocks log or session writes while it builds.
+    atomic = False
+
+    dependencies = [
+        ('devices', '0009_partition_devicelog'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_log_index, drop_log_index)],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='devicelog',
+                    index=models.Index(fields=['device', '-created_at', '-id'], name=LOG_INDEX),
+                ),
+            ],
+        ),
+        # The composite index leads with device_id, so the plain FK index is redundant
+        migrations.RunSQL(
+            sql='DROP INDEX IF EXISTS devices_devicelog_device_id_idx',
+            reverse_sql='CREATE INDEX devices_devicelog_device_id_idx ON devices_devicelog (device_id)',
+        ),
+        AddIndexConcurrently(
+            model_name='devicesession',
+            index=models.Index(fields=['device', 'status', '-started_at', '-id'], name='devsession_status_started_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 06:07
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction; building the
+    # indexes this way doesn't block session writes on a live table.
+    atomic = False
+
+    dependencies = [
+        ('devices', '0010_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='devicesession',
+            index=models.Index(fields=['device', '-started_at', '-id'], name='devsession_device_started_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='devicesession',
+            index=models.Index(fields=['-started_at', '-id'], name='devsession_started_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='devicesession',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['started_at'], name='devsession_completed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='devicesession',
+            index=models.Index(condition=models.Q(('client_card__isnull', False), models.Q(('client_card', ''), _negated=True)), fields=['client_card', 'started_at'], name='devsession_client_card_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0011_session_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicesession',
+            name='resumed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Start of the running active stretch; empty while paused', null=True),
+        ),
+        # Sessions running before metering: their active stretch began at started_at
+        migrations.RunSQL(
+            sql="UPDATE devices_devicesession SET resumed_at = started_at WHERE status = 'active'",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Sessions paused before metering: the old pause never wrote
+        # total_duration, so bill everything since started_at, as the old
+        # wall-clock stop would have. Resume and stop then add to this total.
+        migrations.RunSQL(
+            sql="""
+            UPDATE devices_devicesession AS s
+            SET total_duration = floor(extract(epoch FROM now() - s.started_at))::integer,
+                amount_charged = COALESCE((
+                    SELECT round(p.price_per_second * floor(extract(epoch FROM now() - s.started_at)), 2)
+                    FROM devices_washprogram p
+                    WHERE p.id = s.program_id
+                ), s.amount_charged)
+            WHERE s.status = 'paused' AND s.total_duration = 0
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0012_devicesession_resumed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='last_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='last_check_latency',
+            field=models.PositiveIntegerField(blank=True, help_text='Backend status check round trip in milliseconds', null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0014_configpushjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configpushjob',
+            name='force',
+            field=models.BooleanField(default=False, help_text='Push even to devices already up to date'),
+        ),
+        migrations.AddField(
+            model_name='deviceconfiguration',
+            name='acked_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='deviceconfiguration',
+            name='acked_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='deviceconfiguration',
+            name='acked_payload',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-17 06:21
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0015_config_ack_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceCommand',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('command', models.CharField(choices=[('start', 'Start session'), ('stop', 'Stop session'), ('pause', 'Pause session'), ('resume', 'Resume session'), ('config', 'Apply configuration'), ('performance', 'Apply performance settings')], max_length=20)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('acked', 'Acknowledged'), ('rejected', 'Rejected'), ('failed', 'Failed'), ('expired', 'Expired')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('expires_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('acked_at', models.DateTimeField(blank=True, null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commands', to='devices.device')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['device', 'status', 'created_at'], name='devcommand_pending_idx')],
+            },
+        ),
+    ]
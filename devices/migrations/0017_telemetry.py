@@ -0,0 +1,97 @@
+# Generated by Django 5.2 on 2026-10-17 06:22
+#
+# devices_devicetelemetry is range-partitioned by day on recorded_at, with
+# (device_id, recorded_at) as its primary key (Postgres requires the partition
+# key in it). Deleting a device cascades in the database. The BRIN index
+# serves the rollup's time-range scans at a fraction of a btree's size.
+# Further partitions are created by devices.telemetry.ensure_partitions.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+FORWARD_SQL = """
+CREATE TABLE devices_devicetelemetry (
+    device_id bigint NOT NULL
+        REFERENCES devices_device (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    recorded_at timestamp with time zone NOT NULL,
+    engine_performance smallint NOT NULL,
+    pump_performance smallint NOT NULL,
+    pressure double precision NULL,
+    CONSTRAINT devices_devicetelemetry_pkey PRIMARY KEY (device_id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE devices_devicetelemetry_default PARTITION OF devices_devicetelemetry DEFAULT;
+
+CREATE INDEX devices_devicetelemetry_recorded_brin ON devices_devicetelemetry USING brin (recorded_at);
+
+DO $$
+DECLARE
+    day date := (now() AT TIME ZONE 'UTC')::date;
+BEGIN
+    FOR offset_days IN 0..3 LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF devices_devicetelemetry FOR VALUES FROM (%L) TO (%L)',
+            'devices_devicetelemetry_p' || to_char(day + offset_days, 'YYYY_MM_DD'),
+            (day + offset_days)::timestamp AT TIME ZONE 'UTC',
+            (day + offset_days + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+"""
+
+REVERSE_SQL = "DROP TABLE devices_devicetelemetry CASCADE;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0016_devicecommand'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='DeviceTelemetry',
+                    fields=[
+                        ('pk', models.CompositePrimaryKey('device_id', 'recorded_at', blank=True, editable=False, primary_key=True, serialize=False)),
+                        ('recorded_at', models.DateTimeField()),
+                        ('engine_performance', models.SmallIntegerField()),
+                        ('pump_performance', models.SmallIntegerField()),
+                        ('pressure', models.FloatField(blank=True, null=True)),
+                        ('device', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='devices.device')),
+                    ],
+                    options={
+                        'db_table': 'devices_devicetelemetry',
+                    },
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeviceTelemetryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', '1 minute'), ('hour', '1 hour')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('engine_avg', models.FloatField()),
+                ('engine_min', models.SmallIntegerField()),
+                ('engine_max', models.SmallIntegerField()),
+                ('pump_avg', models.FloatField()),
+                ('pump_min', models.SmallIntegerField()),
+                ('pump_max', models.SmallIntegerField()),
+                ('pressure_avg', models.FloatField(blank=True, null=True)),
+                ('pressure_max', models.FloatField(blank=True, null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telemetry_rollups', to='devices.device')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='telemetryrollup_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('device', 'resolution', 'bucket'), name='telemetryrollup_unique_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 06:52
+
+import devices.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0017_telemetry'),
+    ]
+
+    operations = [
+        # Existing devices get an empty secret, which keeps their current
+        # device_id-only token valid until it is rotated (devices/control.py).
+        # New devices get a random secret each.
+        migrations.AddField(
+            model_name='device',
+            name='control_secret',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='device',
+            name='control_secret',
+            field=models.CharField(blank=True, default=devices.models.new_control_secret, editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='devicecommand',
+            index=models.Index(fields=['created_at'], name='devcommand_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Index for the unfiltered, fleet-wide DeviceLog listing, which pages by
+# (created_at, id) descending. Built per partition without blocking log
+# writes (devices/partitions.py create_index).
+
+from django.db import migrations, models
+
+from devices import partitions
+
+INDEX = 'devicelog_created_idx'
+
+
+def create_index(apps, schema_editor):
+    partitions.create_index(schema_editor, INDEX, '(created_at DESC, id DESC)')
+
+
+def drop_index(apps, schema_editor):
+    partitions.drop_index(schema_editor, INDEX)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('devices', '0018_device_control_secret'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_index, drop_index)],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='devicelog',
+                    index=models.Index(fields=['-created_at', '-id'], name=INDEX),
+                ),
+            ],
+        ),
+    ]
@@ -1,7 +1,16 @@
+import secrets
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 
+
+def new_control_secret():
+    return secrets.token_hex(32)
+
+
 class Device(models.Model):
     STATUS_CHOICES = (
         ('online', 'Online'),
@@ -26,10 +35,15 @@ class Device(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     last_seen = models.DateTimeField(null=True, blank=True)
+    last_check_at = models.DateTimeField(null=True, blank=True)
+    last_check_latency = models.PositiveIntegerField(null=True, blank=True,
+                                                     help_text="Backend status check round trip in milliseconds")
 
     registration_status = models.CharField(max_length=20, choices=REGISTRATION_STATUS_CHOICES, default='pending')
     registration_message = models.TextField(blank=True)
     last_handshake_attempt = models.DateTimeField(null=True, blank=True)
+    # Secret behind the kiosk's control/telemetry token (devices/control.py)
+    control_secret = models.CharField(max_length=64, blank=True, editable=False, default=new_control_secret)
 
     def __str__(self):
         return f"{self.name} ({self.device_id})"
@@ -88,6 +102,11 @@ class DeviceConfiguration(models.Model):
     # Add these fields to DeviceConfiguration model
     engine_performance = models.IntegerField(default=50, validators=[MinValueValidator(0), MaxValueValidator(100)])
     pump_performance = models.IntegerField(default=50, validators=[MinValueValidator(0), MaxValueValidator(100)])
+
+    # Last configuration the device acknowledged (see devices/config_push.py)
+    acked_hash = models.CharField(max_length=64, blank=True, editable=False)
+    acked_payload = models.JSONField(null=True, blank=True, editable=False)
+    acked_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     def __str__(self):
         if self.is_template:
@@ -124,14 +143,37 @@ class DeviceLog(models.Model):
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='logs')
     log_type = models.CharField(max_length=20, choices=LOG_TYPES)
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is queued, not when the log buffer writes it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination per device: (created_at, id) descending
+            models.Index(fields=['device', '-created_at', '-id'], name='devicelog_device_created_idx'),
+            # Keyset pagination over the whole fleet
+            models.Index(fields=['-created_at', '-id'], name='devicelog_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_log_type_display()}: {self.device.name} - {self.created_at}"
 
+class DeviceLogDailyRollup(models.Model):
+    """Per-device, per-day log counts by type; kept after raw log partitions expire."""
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='log_rollups')
+    date = models.DateField()
+    log_type = models.CharField(max_length=20, choices=DeviceLog.LOG_TYPES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'date', 'log_type'], name='devicelogrollup_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.device.name} {self.date} {self.log_type}: {self.count}"
+
 class DeviceSession(models.Model):
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -146,6 +188,8 @@ class DeviceSession(models.Model):
     ended_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     total_duration = models.PositiveIntegerField(default=0, help_text="Total duration in seconds")
+    resumed_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                      help_text="Start of the running active stretch; empty while paused")
     program = models.ForeignKey(WashProgram, on_delete=models.SET_NULL, null=True, related_name='sessions')
     client_card = models.CharField(max_length=50, blank=True, null=True)
     amount_charged = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -153,6 +197,196 @@ class DeviceSession(models.Model):
     
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            # Keyset pagination per device and status: (started_at, id) descending
+            models.Index(fields=['device', 'status', '-started_at', '-id'], name='devsession_status_started_idx'),
+            # Per-device history without a status filter
+            models.Index(fields=['device', '-started_at', '-id'], name='devsession_device_started_idx'),
+            # Fleet-wide listing and started_at range reports
+            models.Index(fields=['-started_at', '-id'], name='devsession_started_idx'),
+            # Revenue/payment reports only read completed sessions
+            models.Index(
+                fields=['started_at'],
+                condition=models.Q(status='completed'),
+                name='devsession_completed_idx',
+            ),
+            # Client activity reports: sessions paid with a card
+            models.Index(
+                fields=['client_card', 'started_at'],
+                condition=models.Q(client_card__isnull=False) & ~models.Q(client_card=''),
+                name='devsession_client_card_idx',
+            ),
+        ]
+        constraints = [
+            # At most one open (active or paused) session per device
+            models.UniqueConstraint(
+                fields=['device'],
+                condition=models.Q(status__in=['active', 'paused']),
+                name='devicesession_one_open_per_device',
+            ),
+        ]
     
     def __str__(self):
         return f"Session {self.id} - {self.device.name} - {self.started_at}"
+
+
+class ConfigPushJob(models.Model):
+    """A bulk configuration push to a set of devices (see devices/config_push.py)."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    filters = models.JSONField(default=dict, help_text="Device filter the job was created with")
+    parallelism = models.PositiveIntegerField(default=10)
+    force = models.BooleanField(default=False, help_text="Push even to devices already up to date")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_by = models.ForeignKey('accounts.CustomUser', on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Config push {self.id} ({self.status})"
+
+
+class ConfigPushResult(models.Model):
+    """Outcome of a ConfigPushJob for one device."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    )
+
+    job = models.ForeignKey(ConfigPushJob, on_delete=models.CASCADE, related_name='results')
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='config_push_results')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    message = models.TextField(blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'device'], name='configpushresult_unique_device'),
+        ]
+
+    def __str__(self):
+        return f"Config push {self.job_id} - {self.device_id}: {self.status}"
+
+
+class DeviceCommand(models.Model):
+    """
+    A command for a kiosk, delivered over its control websocket
+    (see devices/control.py). Kept until acknowledged, failed or expired.
+    """
+    COMMAND_CHOICES = (
+        ('start', 'Start session'),
+        ('stop', 'Stop session'),
+        ('pause', 'Pause session'),
+        ('resume', 'Resume session'),
+        ('config', 'Apply configuration'),
+        ('performance', 'Apply performance settings'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('acked', 'Acknowledged'),
+        ('rejected', 'Rejected'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='commands')
+    command = models.CharField(max_length=20, choices=COMMAND_CHOICES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    expires_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+    acked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Pending commands per device, oldest first (delivery on reconnect)
+            models.Index(fields=['device', 'status', 'created_at'], name='devcommand_pending_idx'),
+            # Retention purge (control.purge)
+            models.Index(fields=['created_at'], name='devcommand_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.command} for {self.device_id} ({self.status})"
+
+
+class DeviceTelemetry(models.Model):
+    """
+    A raw engine/pump sample reported by a device (see devices/telemetry.py).
+
+    The table is range-partitioned by day on recorded_at and has no surrogate
+    id: a device reports at most one sample per timestamp, so re-sent batches
+    are dropped as duplicates. Rows are removed with their partition; the
+    database, not Django, cascades device deletes.
+    """
+    pk = models.CompositePrimaryKey('device_id', 'recorded_at')
+    device = models.ForeignKey(Device, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    recorded_at = models.DateTimeField()
+    # Actual engine/pump output in percent, cf. DeviceConfiguration.*_performance
+    engine_performance = models.SmallIntegerField()
+    pump_performance = models.SmallIntegerField()
+    # Water pressure in bar, if the bay has a sensor
+    pressure = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'devices_devicetelemetry'
+
+    def __str__(self):
+        return f"{self.device_id} @ {self.recorded_at}"
+
+
+class DeviceTelemetryRollup(models.Model):
+    """Per-device telemetry aggregated per minute or per hour; kept after raw partitions expire."""
+    RESOLUTION_CHOICES = (
+        ('minute', '1 minute'),
+        ('hour', '1 hour'),
+    )
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='telemetry_rollups')
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()
+    samples = models.PositiveIntegerField()
+    engine_avg = models.FloatField()
+    engine_min = models.SmallIntegerField()
+    engine_max = models.SmallIntegerField()
+    pump_avg = models.FloatField()
+    pump_min = models.SmallIntegerField()
+    pump_max = models.SmallIntegerField()
+    pressure_avg = models.FloatField(null=True, blank=True)
+    pressure_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'resolution', 'bucket'], name='telemetryrollup_unique_bucket'),
+        ]
+        indexes = [
+            # Fleet-wide bucket ranges (hourly rollup from minute rows, retention)
+            models.Index(fields=['resolution', 'bucket'], name='telemetryrollup_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} {self.resolution} {self.bucket}: {self.samples} samples"
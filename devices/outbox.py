@@ -0,0 +1,141 @@
+# devices/outbox.py
+"""
+Bounded, coalescing outbound buffers for device websockets.
+
+A consumer that awaited send() for every channel-layer message stopped
+reading its channel while a slow client caught up, so messages piled up in
+the channel layer (Redis memory) until its capacity dropped them at random.
+Device consumers instead queue outgoing messages in an Outbox, keyed by what
+they describe, and a writer task sends them in order. The consumer keeps
+draining its channel at full speed whatever the client does.
+
+While a message waits, a newer one with the same key takes its place (a
+device's update is merged into the pending one, so the client gets the newest
+state), keeping its position in the queue. At most `max_pending` keys wait at
+once. put() reports a connection as too slow once that bound is hit or the
+oldest waiting message is older than `max_lag` seconds, and the consumer then
+closes the socket with SLOW_CONSUMER_CLOSE_CODE.
+
+Lag is measured from queueing to the end of send(). That covers the server's
+own backpressure where it has some (uvicorn waits for the socket to drain;
+daphne buffers writes in memory and returns at once).
+
+connection_stats() reports every open connection of this process.
+"""
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_CLOSE_CODE = 4408
+
+# Open outboxes of this process, for connection_stats()
+_outboxes = weakref.WeakSet()
+_ids = itertools.count(1)
+
+
+def merge_state(pending, newer):
+    """Merge for partial device states: newer fields win."""
+    return {**pending, **newer}
+
+
+class Outbox:
+    """Pending messages of one connection, sent in order by `send`."""
+
+    def __init__(self, send, max_pending=100, max_lag=30.0, label=None):
+        self.send = send
+        self.max_pending = max_pending
+        self.max_lag = max_lag
+        self.label = label
+        self.id = next(_ids)
+        # key -> [item, monotonic time it was queued]; dicts keep insertion order
+        self._pending = {}
+        self._ready = asyncio.Event()
+        self._task = None
+        self.connected_at = timezone.now()
+        self.sent = 0
+        self.coalesced = 0
+        self.peak_pending = 0
+        self.last_lag = 0.0
+        self.peak_lag = 0.0
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+        _outboxes.add(self)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._pending.clear()
+        _outboxes.discard(self)
+
+    def lag(self, now=None):
+        """Seconds the oldest waiting message has been waiting."""
+        if not self._pending:
+            return 0.0
+        _item, queued = next(iter(self._pending.values()))
+        return (now or time.monotonic()) - queued
+
+    def put(self, key, item, merge=None):
+        """
+        Queue `item`. A pending item with the same key is replaced, or combined
+        as merge(pending, item). Returns False if the connection is too far
+        behind (the item is then dropped).
+        """
+        now = time.monotonic()
+        entry = self._pending.get(key)
+        if entry is not None:
+            entry[0] = merge(entry[0], item) if merge else item
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            return False
+        else:
+            self._pending[key] = [item, now]
+            self.peak_pending = max(self.peak_pending, len(self._pending))
+        self._ready.set()
+        return self.lag(now) <= self.max_lag
+
+    def discard(self, key):
+        """Drop the item pending under `key`, if any."""
+        self._pending.pop(key, None)
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._pending:
+                key = next(iter(self._pending))
+                item, queued = self._pending.pop(key)
+                try:
+                    await self.send(item)
+                except Exception:
+                    logger.exception("Websocket send failed (%s)", self.label)
+                    return
+                self.sent += 1
+                self.last_lag = time.monotonic() - queued
+                self.peak_lag = max(self.peak_lag, self.last_lag)
+
+    def stats(self):
+        return {
+            'id': self.id,
+            'connection': self.label,
+            'connected_at': self.connected_at.isoformat(),
+            'pending': len(self._pending),
+            'max_pending': self.max_pending,
+            'peak_pending': self.peak_pending,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'lag': round(self.lag(), 3),
+            'last_lag': round(self.last_lag, 3),
+            'peak_lag': round(self.peak_lag, 3),
+        }
+
+
+def connection_stats():
+    """stats() of every open connection in this process, laggiest first."""
+    return sorted((outbox.stats() for outbox in list(_outboxes)), key=lambda row: -row['lag'])
@@ -0,0 +1,37 @@
+# devices/parsers.py
+"""Request parsers for device telemetry batches (see devices/telemetry.py)."""
+from itertools import islice
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import telemetry
+
+
+class _SampleStreamParser(BaseParser):
+    """Parses a batch into a list of sample dicts, reading at most MAX_BATCH + 1."""
+    def read(self, stream):
+        raise NotImplementedError
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        try:
+            # One past the limit, so the ingest can tell the batch is too large
+            return list(islice(self.read(stream), telemetry.telemetry_setting('MAX_BATCH') + 1))
+        except ValueError as e:
+            raise ParseError(f"Malformed telemetry batch: {e}")
+
+
+class NDJSONParser(_SampleStreamParser):
+    media_type = 'application/x-ndjson'
+
+    def read(self, stream):
+        return telemetry.parse_ndjson(stream)
+
+
+class MessagePackParser(_SampleStreamParser):
+    media_type = 'application/msgpack'
+
+    def read(self, stream):
+        return telemetry.parse_msgpack(stream)
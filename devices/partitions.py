@@ -0,0 +1,201 @@
+# devices/partitions.py
+"""
+Maintenance for the month-partitioned devices_devicelog table.
+
+- ensure_partitions() creates the partitions for the coming months.
+- rollup_logs() (re)computes DeviceLogDailyRollup rows for a date range.
+- expire_partitions() rolls up, then drops (or detaches and keeps, when
+  archiving) partitions older than the retention period. Dropping a
+  partition is a catalog operation instead of a huge DELETE.
+- create_index() / drop_index() add or remove an index on the partitioned
+  table without blocking log writes (used by migrations).
+"""
+import logging
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'devices_devicelog'
+DEFAULT_PARTITION = 'devices_devicelog_default'
+PARTITION_PREFIX = 'devices_devicelog_p'
+ARCHIVE_PREFIX = 'devices_devicelog_archive_'
+
+
+def _utc_today():
+    # Partition bounds and rollup days are UTC, whatever the server's local time
+    return timezone.now().astimezone(dt_timezone.utc).date()
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y_%m}'
+
+
+def list_partitions():
+    """Return {month (date): table name} for the monthly partitions that exist."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname LIKE %s
+            """,
+            [PARENT_TABLE, f'{PARTITION_PREFIX}%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        year, month = name[len(PARTITION_PREFIX):].split('_')
+        partitions[date(int(year), int(month), 1)] = name
+    return partitions
+
+
+def _all_partitions(cursor):
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [PARENT_TABLE],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_index(schema_editor, name, columns):
+    """
+    Create index `name` on `columns` (SQL, e.g. '(created_at DESC, id DESC)')
+    of the partitioned table. CREATE INDEX CONCURRENTLY isn't supported on a
+    partitioned table, and a plain CREATE INDEX on it blocks writes to every
+    partition while it builds. Instead the index is created on the parent
+    alone (ON ONLY, invalid and empty), built concurrently on each partition
+    and attached; the parent index becomes valid once all are. Partitions
+    created later get it when they are attached. Must run outside a
+    transaction (a migration with atomic = False).
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_class WHERE relname = %s', [name])
+        if cursor.fetchone():
+            return
+        partitions = _all_partitions(cursor)
+        cursor.execute(f'CREATE INDEX {name} ON ONLY {PARENT_TABLE} {columns}')
+        suffix = name.removeprefix('devicelog_')
+        for partition in partitions:
+            partition_index = f'{partition}_{suffix}'
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} {columns}')
+            cursor.execute(f'ALTER INDEX {name} ATTACH PARTITION {partition_index}')
+
+
+def drop_index(schema_editor, name):
+    """Drop an index made by create_index(), with its partition indexes."""
+    schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """
+    Create monthly partitions from the current month up to `months_ahead`
+    months ahead. Rows that already landed in the default partition for a new
+    month are moved into it. Returns the names of the partitions created.
+    """
+    current = _month_start(today or _utc_today())
+    existing = list_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(current, offset)
+        if month in existing:
+            continue
+        name = partition_name(month)
+        start, end = _bound(month), _bound(_add_months(month, 1))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+            cursor.execute(
+                f'WITH moved AS ('
+                f'  DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s RETURNING *'
+                f') INSERT INTO {name} SELECT * FROM moved',
+                [start, end],
+            )
+            cursor.execute(
+                f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+        created.append(name)
+        logger.info("Created device log partition %s", name)
+    return created
+
+
+def rollup_logs(start_date, end_date):
+    """Recompute daily rollups for start_date <= day < end_date. Returns rows written."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO devices_devicelogdailyrollup (device_id, date, log_type, count)
+            SELECT device_id, (created_at AT TIME ZONE 'UTC')::date, log_type, count(*)
+            FROM devices_devicelog
+            WHERE created_at >= %s AND created_at < %s
+            GROUP BY 1, 2, 3
+            ON CONFLICT (device_id, date, log_type) DO UPDATE SET count = EXCLUDED.count
+            """,
+            [_bound(start_date), _bound(end_date)],
+        )
+        return cursor.rowcount
+
+
+def expire_partitions(retention_months=None, archive=None, today=None):
+    """
+    Roll up and remove monthly partitions that ended before the retention
+    window. With `archive`, partitions are detached and renamed instead of
+    dropped. Returns the names of the partitions removed.
+    """
+    if retention_months is None:
+        retention_months = getattr(settings, 'DEVICE_LOG_RETENTION_MONTHS', 12)
+    if archive is None:
+        archive = getattr(settings, 'DEVICE_LOG_ARCHIVE_EXPIRED', False)
+
+    cutoff = _add_months(_month_start(today or _utc_today()), -retention_months)
+    expired = []
+    for month, name in sorted(list_partitions().items()):
+        if month >= cutoff:
+            continue
+        with transaction.atomic():
+            rollup_logs(month, _add_months(month, 1))
+            with connection.cursor() as cursor:
+                if archive:
+                    cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+                    cursor.execute(f'ALTER TABLE {name} RENAME TO {ARCHIVE_PREFIX}{month:%Y_%m}')
+                else:
+                    cursor.execute(f'DROP TABLE {name}')
+        expired.append(name)
+        logger.info("%s device log partition %s", "Archived" if archive else "Dropped", name)
+    return expired
+
+
+def maintain(months_ahead=3, retention_months=None, archive=None):
+    """Create upcoming partitions, roll up yesterday, expire old partitions."""
+    created = ensure_partitions(months_ahead)
+    yesterday = _utc_today() - timedelta(days=1)
+    rollup_logs(yesterday, yesterday + timedelta(days=1))
+    expired = expire_partitions(retention_months, archive)
+    return {'created': created, 'expired': expired}
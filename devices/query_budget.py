@@ -0,0 +1,146 @@
+# devices/query_budget.py
+"""
+Per-endpoint query budgets.
+
+Views declare the most database queries one request may run. Generic viewset
+actions are listed in a `query_budgets` class attribute; custom actions and
+view methods use the decorator:
+
+    class DeviceViewSet(viewsets.ModelViewSet):
+        query_budgets = {'list': 3, 'retrieve': 4}
+
+        @query_budget(4)
+        @action(detail=True, methods=['get'])
+        def logs(self, request, pk=None): ...
+
+QueryBudgetMiddleware counts the queries of every request, on every database
+alias, together with the time spent in them, and keeps the result on
+`request.query_usage`. Requests over budget are logged, or fail with
+QueryBudgetExceeded when 'RAISE' is set, so an N+1 cannot slip through a test
+run. The query budget tests in devices/tests.py and loyalty/tests.py (built
+on devices.testing.QueryBudgetTestCase) request the budgeted endpoints
+against seeded rows with 'RAISE' on.
+
+Settings (all optional):
+
+    QUERY_BUDGET = {
+        'RAISE': False,    # raise QueryBudgetExceeded instead of logging a warning
+        'HEADERS': False,  # add X-Query-Count / X-Query-Time (ms) response headers
+        'DEFAULT': None,   # budget for views that declare none (None: unlimited)
+    }
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'RAISE': False,
+    'HEADERS': False,
+    'DEFAULT': None,
+}
+
+# The QueryUsage of the request being handled in this context. Context
+# variables follow the request into sync_to_async threads, so async views
+# are counted too.
+_current = ContextVar('query_usage', default=None)
+
+
+def query_budget_setting(name):
+    return getattr(settings, 'QUERY_BUDGET', {}).get(name, DEFAULTS[name])
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Declare the most queries a request to the decorated view or action may run."""
+    def decorator(func):
+        func.query_budget = max_queries
+        return func
+    return decorator
+
+
+class QueryUsage:
+    """Query count and time (seconds) of one request."""
+
+    def __init__(self, endpoint=None, budget=None):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.queries = 0
+        self.duration = 0.0
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def __str__(self):
+        budget = '-' if self.budget is None else self.budget
+        return f'{self.endpoint}: {self.queries}/{budget} queries in {self.duration * 1000:.1f} ms'
+
+
+def _record(execute, sql, params, many, context):
+    usage = _current.get()
+    if usage is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        usage.queries += 1
+        usage.duration += time.perf_counter() - started
+
+
+def install(connection, **kwargs):
+    """
+    Add the counting wrapper to `connection` (also a connection_created receiver).
+    It goes first so connection.execute_wrapper() blocks still pop their own.
+    """
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record)
+
+
+def start():
+    """Count this context's queries into a new QueryUsage. Returns (usage, token)."""
+    usage = QueryUsage()
+    return usage, _current.set(usage)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def resolve(view_func, method):
+    """(endpoint name, budget) for a request of `method` routed to `view_func`."""
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        name = f'{view_func.__module__}.{view_func.__qualname__}'
+        budget = getattr(view_func, 'query_budget', None)
+    else:
+        # DRF viewsets map methods to actions; other class-based views dispatch on the method
+        actions = getattr(view_func, 'actions', None) or {}
+        handler_name = actions.get(method, method)
+        name = f'{view_class.__name__}.{handler_name}'
+        budget = getattr(getattr(view_class, handler_name, None), 'query_budget', None)
+        if budget is None:
+            budget = getattr(view_class, 'query_budgets', {}).get(handler_name)
+    if budget is None:
+        budget = query_budget_setting('DEFAULT')
+    return name, budget
+
+
+def check(request, response, usage):
+    """Log (or raise for) `usage` and add the response headers."""
+    if query_budget_setting('HEADERS'):
+        response['X-Query-Count'] = str(usage.queries)
+        response['X-Query-Time'] = f'{usage.duration * 1000:.1f}'
+    if not usage.over_budget:
+        logger.debug("%s %s %s", request.method, request.path, usage)
+        return
+    if query_budget_setting('RAISE'):
+        raise QueryBudgetExceeded(f"{request.method} {request.path} {usage}")
+    logger.warning("Query budget exceeded: %s %s %s", request.method, request.path, usage)
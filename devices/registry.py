@@ -0,0 +1,138 @@
+# devices/registry.py
+"""
+Active-session registry: device id -> current open DeviceSession summary.
+
+Entries live in the Django cache (Redis in production) and are written by the
+session engine on every transition, so hot read paths (device detail, kiosk
+polls, websocket snapshots) don't have to query the sessions table.
+A cached empty dict means "known to have no open session"; a missing key means
+"unknown" and is filled from the database on first read.
+
+Entries are written after commit, so concurrent transitions can land them out
+of order. The registry is therefore only a hint: session commands never
+reject on it (the transition statement decides), and a rejected transition
+drops the device's entry so the next read reloads it.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Device, DeviceSession
+
+KEY_PREFIX = 'device_session:'
+ENTRY_TIMEOUT = 60 * 60 * 24  # safety net; entries are normally replaced on every transition
+OPEN_STATUSES = ('active', 'paused')
+
+
+def _key(device_id):
+    return f'{KEY_PREFIX}{device_id}'
+
+
+def _entry(session):
+    return {
+        'id': session.id,
+        'status': session.status,
+        'started_at': session.started_at.isoformat(),
+    }
+
+
+def _load(device_id):
+    session = (
+        DeviceSession.objects
+        .filter(device_id=device_id, status__in=OPEN_STATUSES)
+        .only('id', 'status', 'started_at')
+        .first()
+    )
+    return _entry(session) if session else {}
+
+
+def get_open_session(device_id):
+    """Return {'id', 'status', 'started_at'} for the device's open session, or None."""
+    entry = cache.get(_key(device_id))
+    if entry is None:
+        entry = _load(device_id)
+        cache.set(_key(device_id), entry, ENTRY_TIMEOUT)
+    return entry or None
+
+
+async def aget_open_session(device_id):
+    """Async version of get_open_session."""
+    entry = await cache.aget(_key(device_id))
+    if entry is None:
+        session = await (
+            DeviceSession.objects
+            .filter(device_id=device_id, status__in=OPEN_STATUSES)
+            .only('id', 'status', 'started_at')
+            .afirst()
+        )
+        entry = _entry(session) if session else {}
+        await cache.aset(_key(device_id), entry, ENTRY_TIMEOUT)
+    return entry or None
+
+
+def get_active_session_id(device_id):
+    """Return the id of the device's active (not paused) session, or None."""
+    entry = get_open_session(device_id)
+    if entry and entry['status'] == 'active':
+        return entry['id']
+    return None
+
+
+async def aget_active_session_id(device_id):
+    """Async version of get_active_session_id."""
+    entry = await aget_open_session(device_id)
+    if entry and entry['status'] == 'active':
+        return entry['id']
+    return None
+
+
+def record(session):
+    """Store the session as the device's open session once the transaction commits."""
+    if session.status in OPEN_STATUSES:
+        entry = _entry(session)
+    else:
+        entry = {}
+    transaction.on_commit(lambda: cache.set(_key(session.device_id), entry, ENTRY_TIMEOUT))
+
+
+def invalidate(device_id):
+    """Forget what we know about the device; the next read reloads from the database."""
+    transaction.on_commit(lambda: cache.delete(_key(device_id)))
+
+
+def rebuild():
+    """Repopulate the registry for every device from the database. Returns the number of devices."""
+    entries = {_key(device_id): {} for device_id in Device.objects.values_list('id', flat=True)}
+    open_sessions = DeviceSession.objects.filter(status__in=OPEN_STATUSES).only(
+        'id', 'device_id', 'status', 'started_at'
+    )
+    for session in open_sessions:
+        entries[_key(session.device_id)] = _entry(session)
+    cache.set_many(entries, ENTRY_TIMEOUT)
+    return len(entries)
+
+
+def find_inconsistencies():
+    """
+    Compare cached entries against the database.
+    Returns a list of (device_id, cached_entry, actual_entry) for every mismatch;
+    devices with no cached entry are skipped since they are loaded on demand.
+    """
+    device_ids = list(Device.objects.values_list('id', flat=True))
+    cached = cache.get_many([_key(device_id) for device_id in device_ids])
+
+    actual = {}
+    open_sessions = DeviceSession.objects.filter(status__in=OPEN_STATUSES).only(
+        'id', 'device_id', 'status', 'started_at'
+    )
+    for session in open_sessions:
+        actual[session.device_id] = _entry(session)
+
+    mismatches = []
+    for device_id in device_ids:
+        key = _key(device_id)
+        if key not in cached:
+            continue
+        expected = actual.get(device_id, {})
+        if cached[key] != expected:
+            mismatches.append((device_id, cached[key], expected))
+    return mismatches
@@ -4,5 +4,9 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
+    re_path(r'ws/devices/fleet/$', consumers.FleetStatusConsumer.as_asgi()),
+    re_path(r'ws/devices/control/$', consumers.DeviceControlConsumer.as_asgi()),
+    re_path(r'ws/devices/config-push/(?P<job_id>\d+)/$', consumers.ConfigPushProgressConsumer.as_asgi()),
     re_path(r'ws/devices/(?P<device_id>\d+)/$', consumers.DeviceStatusConsumer.as_asgi()),
+    re_path(r'ws/devices/$', consumers.DeviceStatusConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,12 +1,17 @@
 from rest_framework import serializers
-from .models import Device, WashProgram, DeviceConfiguration, DeviceProgramSetting, DeviceLog, DeviceSession
+from . import config_cache, config_push, registry
+from .models import (
+    Device, WashProgram, DeviceConfiguration, DeviceProgramSetting, DeviceLog, DeviceSession,
+    ConfigPushJob, ConfigPushResult, DeviceTelemetryRollup
+)
 
 class DeviceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Device
         fields = ['id', 'name', 'device_id', 'status', 'ip_address', 'port', 
-                 'location', 'created_at', 'updated_at', 'is_active', 'last_seen']
-        read_only_fields = ['created_at', 'updated_at', 'last_seen']
+                 'location', 'created_at', 'updated_at', 'is_active', 'last_seen',
+                 'last_check_at', 'last_check_latency']
+        read_only_fields = ['created_at', 'updated_at', 'last_seen', 'last_check_at', 'last_check_latency']
 
 class WashProgramSerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,8 +34,9 @@ class DeviceConfigurationSerializer(serializers.ModelSerializer):
         fields = ['id', 'device', 'price_per_minute', 'default_timeout', 
                  'bonus_duration_enabled', 'bonus_duration_amount', 
                  'valve_reset_timeout', 'is_template', 'template_name',
-                 'program_settings', 'created_at', 'updated_at', 'engine_performance','pump_performance']
-        read_only_fields = ['created_at', 'updated_at']
+                 'program_settings', 'created_at', 'updated_at', 'engine_performance','pump_performance',
+                 'acked_hash', 'acked_at']
+        read_only_fields = ['created_at', 'updated_at', 'acked_hash', 'acked_at']
 
 class DeviceConfigTemplateSerializer(serializers.ModelSerializer):
     program_settings = DeviceProgramSettingSerializer(source='deviceprogramsetting_set', many=True, read_only=True)
@@ -71,18 +77,62 @@ class DeviceSessionSerializer(serializers.ModelSerializer):
         return round(obj.total_duration / 60, 2) if obj.total_duration else 0
 
 class DeviceDetailSerializer(serializers.ModelSerializer):
-    configuration = DeviceConfigurationSerializer(read_only=True)
+    configuration = serializers.SerializerMethodField()
     active_session = serializers.SerializerMethodField()
     
     class Meta:
         model = Device
         fields = ['id', 'name', 'device_id', 'status', 'ip_address', 'port', 
                  'location', 'created_at', 'updated_at', 'is_active', 
-                 'last_seen', 'configuration', 'active_session']
-        read_only_fields = ['created_at', 'updated_at', 'last_seen']
+                 'last_seen', 'last_check_at', 'last_check_latency', 'configuration', 'active_session']
+        read_only_fields = ['created_at', 'updated_at', 'last_seen', 'last_check_at', 'last_check_latency']
     
+    def get_configuration(self, obj):
+        # DeviceConfigurationSerializer data, from the config cache
+        entry = config_cache.get(obj.id)
+        return entry['detail'] if entry else None
+
     def get_active_session(self, obj):
-        active_sessions = obj.sessions.filter(status='active').first()
-        if active_sessions:
-            return DeviceSessionSerializer(active_sessions).data
-        return None 
\ No newline at end of file
+        session_id = registry.get_active_session_id(obj.id)
+        if session_id is None:
+            return None
+        session = DeviceSession.objects.select_related('device', 'program').filter(pk=session_id).first()
+        if session:
+            return DeviceSessionSerializer(session).data
+        return None
+
+
+class ConfigPushResultSerializer(serializers.ModelSerializer):
+    device_name = serializers.CharField(source='device.name', read_only=True)
+
+    class Meta:
+        model = ConfigPushResult
+        fields = ['id', 'device', 'device_name', 'status', 'message', 'duration_ms', 'finished_at']
+
+
+class ConfigPushJobSerializer(serializers.ModelSerializer):
+    created_by = serializers.PrimaryKeyRelatedField(read_only=True)
+    parallelism = serializers.IntegerField(min_value=1, required=False)
+
+    class Meta:
+        model = ConfigPushJob
+        fields = ['id', 'filters', 'parallelism', 'force', 'status', 'total', 'succeeded', 'failed', 'skipped',
+                  'error_message', 'created_by', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['status', 'total', 'succeeded', 'failed', 'skipped', 'error_message',
+                            'created_at', 'started_at', 'finished_at']
+
+    def validate_filters(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected an object of device filters.")
+        try:
+            config_push.select_devices(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+
+class DeviceTelemetryRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeviceTelemetryRollup
+        fields = ['bucket', 'samples', 'engine_avg', 'engine_min', 'engine_max',
+                  'pump_avg', 'pump_min', 'pump_max', 'pressure_avg', 'pressure_max']
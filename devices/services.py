@@ -1,6 +1,146 @@
+import os
+import threading
+import time
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+from urllib3.util import Timeout
+from urllib3.util.retry import Retry
+
+# HTTP client settings, overridable with settings.DEVICE_BACKEND_HTTP
+HTTP_DEFAULTS = {
+    'CONNECT_TIMEOUT': 2.0,
+    'READ_TIMEOUT': 5.0,
+    'TOTAL_TIMEOUT': 5.0,        # cap on connect + read of one attempt
+    'POOL_CONNECTIONS': 10,      # hosts with a cached connection pool
+    'POOL_MAXSIZE': 20,          # kept-alive connections per host
+    'POOL_BLOCK': False,         # wait for a free connection instead of opening an extra one
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.2,
+    'BACKOFF_JITTER': 0.2,
+    'CIRCUIT_FAILURE_THRESHOLD': 3,
+    'CIRCUIT_RESET_TIMEOUT': 30,
+}
+
+# Responses that mean the backend could not reach the device
+UNREACHABLE_STATUSES = (502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def http_setting(name):
+    return getattr(settings, 'DEVICE_BACKEND_HTTP', {}).get(name, HTTP_DEFAULTS[name])
+
+
+class FastFailureRetry(Retry):
+    """
+    Retries only failures that come back fast: refused or reset connections
+    (for every method, since nothing was sent) and 502/503/504 answers to
+    GETs. A connect timeout has already used up its wait and is not retried;
+    neither are read errors (read=False), so one call waits for at most one
+    TOTAL_TIMEOUT plus the short backoffs between fast failures.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if isinstance(error, ConnectTimeoutError) and not isinstance(error, NewConnectionError):
+            raise MaxRetryError(_pool, url, error) from error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _build_session():
+    retries = FastFailureRetry(
+        total=http_setting('RETRIES'),
+        connect=http_setting('RETRIES'),
+        read=False,
+        status=http_setting('RETRIES'),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        status_forcelist=UNREACHABLE_STATUSES,
+        backoff_factor=http_setting('BACKOFF_FACTOR'),
+        backoff_jitter=http_setting('BACKOFF_JITTER'),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=http_setting('POOL_CONNECTIONS'),
+        pool_maxsize=http_setting('POOL_MAXSIZE'),
+        pool_block=http_setting('POOL_BLOCK'),
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_http_session():
+    """The process-wide pooled session (rebuilt after fork, since sockets can't be shared)."""
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _build_session()
+            _session_pid = os.getpid()
+    return _session
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-device failure counter kept in the cache, so all workers share it.
+
+    After CIRCUIT_FAILURE_THRESHOLD consecutive failures the circuit opens and
+    calls fail immediately for CIRCUIT_RESET_TIMEOUT seconds. After that a
+    single trial call is let through: success closes the circuit, failure
+    opens it again.
+    """
+    KEY_PREFIX = 'device_circuit:'
+
+    def __init__(self, device_id):
+        self.key = f'{self.KEY_PREFIX}{device_id}'
+        self.threshold = http_setting('CIRCUIT_FAILURE_THRESHOLD')
+        self.reset_timeout = http_setting('CIRCUIT_RESET_TIMEOUT')
+        self.failures = 0
+
+    def before_call(self):
+        values = cache.get_many([self.key, f'{self.key}:open_until'])
+        failures = self.failures = values.get(self.key, 0)
+        if failures < self.threshold:
+            return
+        remaining = values.get(f'{self.key}:open_until', 0) - time.time()
+        # Only one caller gets the half-open trial
+        if remaining > 0 or not cache.add(f'{self.key}:trial', 1, self.reset_timeout):
+            raise CircuitOpenError(
+                f"Device unreachable, not retrying for {max(1, round(remaining))}s"
+            )
+
+    def record_success(self):
+        if not self.failures:
+            return
+        cache.delete_many([self.key, f'{self.key}:open_until', f'{self.key}:trial'])
+
+    def record_failure(self):
+        # add() + incr() so concurrent workers never lose a count
+        timeout = self.reset_timeout * 10
+        cache.add(self.key, 0, timeout)
+        try:
+            failures = cache.incr(self.key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.add(self.key, 1, timeout)
+            failures = 1
+        cache.set(f'{self.key}:open_until', time.time() + self.reset_timeout, timeout)
+        if failures >= self.threshold:
+            cache.delete(f'{self.key}:trial')
+
 
 class DeviceBackendService:
     """Service for communicating with the device backend"""
@@ -13,6 +153,29 @@ class DeviceBackendService:
             'http://10.10.4.230:8000/central/register'
         )
         self.api_token = getattr(settings, 'DEVICE_BACKEND_TOKEN', '')
+        self.timeout = Timeout(
+            connect=http_setting('CONNECT_TIMEOUT'),
+            read=http_setting('READ_TIMEOUT'),
+            total=http_setting('TOTAL_TIMEOUT'),
+        )
+
+    def _request(self, method, url, device_id, **kwargs):
+        """
+        Send a request through the pooled session, guarded by the device's
+        circuit breaker. Raises CircuitOpenError or requests exceptions.
+        """
+        breaker = CircuitBreaker(device_id)
+        breaker.before_call()
+        try:
+            response = get_http_session().request(method, url, timeout=self.timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            breaker.record_failure()
+            raise
+        if response.status_code in UNREACHABLE_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
 
     def _get_headers(self):
         return {
@@ -35,11 +198,12 @@ class DeviceBackendService:
             if configuration:
                 data['configuration'] = configuration
 
-            response = requests.post(
+            response = self._request(
+                'POST',
                 f'{self.api_base_url}/api/devices/verify/',
+                device_id,
                 headers=self._get_headers(),
                 json=data,
-                timeout=5
             )
             if response.status_code == 200:
                 payload = response.json()
@@ -48,18 +212,21 @@ class DeviceBackendService:
         except Exception as e:
             return False, f"Communication error: {str(e)}"
 
-    def send_device_configuration(self, device_id, configuration, token=None):
+    def send_device_configuration(self, device_id, configuration, token=None, config_hash=None):
         """Send device configuration to the backend"""
         try:
             headers = self._get_headers()
             if token:
                 headers['Device-Token'] = token
+            if config_hash:
+                headers['Config-Hash'] = config_hash
 
-            response = requests.post(
+            response = self._request(
+                'POST',
                 f'{self.api_base_url}/api/devices/{device_id}/configuration/',
+                device_id,
                 headers=headers,
                 json=configuration,
-                timeout=5
             )
             if response.status_code in (200, 201):
                 payload = response.json()
@@ -68,13 +235,43 @@ class DeviceBackendService:
         except Exception as e:
             return False, f"Communication error: {str(e)}"
 
+    def patch_device_configuration(self, device_id, changes, removed, base_hash, config_hash, token=None):
+        """
+        Send only the changed configuration keys, applied by the backend on top
+        of the configuration with hash `base_hash`.
+        Returns (success, message, base_mismatch); base_mismatch means the
+        device holds a different configuration and needs a full push.
+        """
+        try:
+            headers = self._get_headers()
+            headers['Config-Hash'] = config_hash
+            if token:
+                headers['Device-Token'] = token
+
+            response = self._request(
+                'PATCH',
+                f'{self.api_base_url}/api/devices/{device_id}/configuration/',
+                device_id,
+                headers=headers,
+                json={'base_hash': base_hash, 'changes': changes, 'removed': removed},
+            )
+            if response.status_code in (200, 201):
+                payload = response.json()
+                return True, payload.get('message', 'Configuration updated successfully'), False
+            if response.status_code in (409, 412):
+                return False, "Device configuration differs from the acknowledged one", True
+            return False, f"Backend returned error: {response.status_code} - {response.text}", False
+        except Exception as e:
+            return False, f"Communication error: {str(e)}", False
+
     def check_device_status(self, device_id):
         """Check the current status of a device with the backend"""
         try:
-            response = requests.get(
+            response = self._request(
+                'GET',
                 f'{self.api_base_url}/api/devices/{device_id}/status/',
+                device_id,
                 headers=self._get_headers(),
-                timeout=5
             )
             if response.status_code == 200:
                 payload = response.json()
@@ -86,10 +283,11 @@ class DeviceBackendService:
     def get_device_token(self, device_id):
         """Retrieve authentication token for a device from the backend"""
         try:
-            response = requests.get(
+            response = self._request(
+                'GET',
                 f'{self.api_base_url}/api/devices/{device_id}/token/',
+                device_id,
                 headers=self._get_headers(),
-                timeout=5
             )
             if response.status_code == 200:
                 payload = response.json()
@@ -109,11 +307,12 @@ class DeviceBackendService:
             "X-Kiosk-Token": self.api_token
         }
         try:
-            resp = requests.post(
+            resp = self._request(
+                'POST',
                 url,
+                device_id,
                 headers=headers,
                 json={"status_report": status_report},
-                timeout=5
             )
             if resp.status_code == 200:
                 return True, resp.json()
@@ -0,0 +1,227 @@
+# devices/session_engine.py
+"""
+Session state machine for start/stop/pause/resume.
+
+Each transition is a single statement: a data-modifying CTE that changes the
+session row, updates the device, and writes the command log in one round trip.
+The partial unique constraint ``devicesession_one_open_per_device`` guarantees
+at most one active-or-paused session per device, so there is never a
+"multiple active sessions" case to resolve. Every transition also refreshes
+the active-session registry, notifies the session meter and, for kiosks on
+the control channel, queues the matching command (devices/control.py).
+
+Time is billed only while a session is active: pause and stop add the running
+stretch (since ``resumed_at``) to ``total_duration`` and re-price the session
+with the meter's charge formula.
+"""
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from . import control, metering, registry
+from .models import DeviceSession, WashProgram
+
+
+START_SQL = """
+WITH program AS (
+    SELECT id, name, price_per_second
+    FROM devices_washprogram
+    WHERE id = %(program_id)s
+), session AS (
+    INSERT INTO devices_devicesession
+        (device_id, program_id, client_card, status, started_at, resumed_at, ended_at,
+         total_duration, amount_charged, bonus_time_used)
+    SELECT %(device_id)s, program.id, %(client_card)s, 'active', now(), now(), NULL, 0, 0, 0
+    FROM program
+    ON CONFLICT (device_id) WHERE status IN ('active', 'paused') DO NOTHING
+    RETURNING *
+), device AS (
+    UPDATE devices_device
+    SET status = 'online', last_seen = now(), updated_at = now()
+    WHERE id IN (SELECT device_id FROM session)
+    RETURNING status, last_seen, updated_at
+), log AS (
+    INSERT INTO devices_devicelog (device_id, log_type, message, created_at)
+    SELECT session.device_id, 'command', 'Started session: ' || program.name, now()
+    FROM session, program
+)
+SELECT session.*,
+       program.name AS program__name,
+       program.price_per_second AS program__price_per_second,
+       device.status AS device__status,
+       device.last_seen AS device__last_seen,
+       device.updated_at AS device__updated_at
+FROM session, program, device
+"""
+
+# Closes the running stretch of the device's active session: adds it to
+# total_duration and sets amount_charged from the new total.
+METER_CTE = """
+metered AS (
+    SELECT s.id,
+           s.total_duration
+               + floor(extract(epoch FROM now() - COALESCE(s.resumed_at, s.started_at)))::integer AS seconds,
+           p.price_per_second
+    FROM devices_devicesession s
+    LEFT JOIN devices_washprogram p ON p.id = s.program_id
+    WHERE s.device_id = %(device_id)s AND s.status = 'active'
+), session AS (
+    UPDATE devices_devicesession AS s
+    SET status = %(to_status)s,
+        ended_at = {ended_at},
+        total_duration = metered.seconds,
+        amount_charged = COALESCE({charge}, s.amount_charged),
+        resumed_at = NULL
+    FROM metered
+    WHERE s.id = metered.id AND s.status = 'active'
+    RETURNING s.*
+)"""
+
+STOP_SQL = """
+WITH {meter}, device AS (
+    UPDATE devices_device
+    SET status = 'offline', updated_at = now()
+    WHERE id IN (SELECT device_id FROM session)
+    RETURNING status, last_seen, updated_at
+), log AS (
+    INSERT INTO devices_devicelog (device_id, log_type, message, created_at)
+    SELECT device_id, 'command', 'Stopped session: ' || total_duration || 's', now()
+    FROM session
+)
+SELECT session.*,
+       program.name AS program__name,
+       program.price_per_second AS program__price_per_second,
+       device.status AS device__status,
+       device.last_seen AS device__last_seen,
+       device.updated_at AS device__updated_at
+FROM session
+LEFT JOIN devices_washprogram program ON program.id = session.program_id
+CROSS JOIN device
+""".format(meter=METER_CTE.format(
+    ended_at='now()',
+    charge=metering.charge_sql('metered.price_per_second', 'metered.seconds'),
+))
+
+# Pause bills the stretch so far and leaves the device online
+PAUSE_SQL = """
+WITH {meter}, device AS (
+    UPDATE devices_device
+    SET status = 'online', updated_at = now()
+    WHERE id IN (SELECT device_id FROM session)
+    RETURNING status, last_seen, updated_at
+), log AS (
+    INSERT INTO devices_devicelog (device_id, log_type, message, created_at)
+    SELECT device_id, 'command', 'Paused session', now()
+    FROM session
+)
+SELECT session.*,
+       program.name AS program__name,
+       program.price_per_second AS program__price_per_second,
+       device.status AS device__status,
+       device.last_seen AS device__last_seen,
+       device.updated_at AS device__updated_at
+FROM session
+LEFT JOIN devices_washprogram program ON program.id = session.program_id
+CROSS JOIN device
+""".format(meter=METER_CTE.format(
+    ended_at='NULL',
+    charge=metering.charge_sql('metered.price_per_second', 'metered.seconds'),
+))
+
+# Resume starts a new active stretch; nothing is billed
+RESUME_SQL = """
+WITH session AS (
+    UPDATE devices_devicesession
+    SET status = 'active', resumed_at = now()
+    WHERE device_id = %(device_id)s AND status = 'paused'
+    RETURNING *
+), device AS (
+    UPDATE devices_device
+    SET status = 'online', updated_at = now()
+    WHERE id IN (SELECT device_id FROM session)
+    RETURNING status, last_seen, updated_at
+), log AS (
+    INSERT INTO devices_devicelog (device_id, log_type, message, created_at)
+    SELECT device_id, 'command', 'Resumed session', now()
+    FROM session
+)
+SELECT session.*,
+       program.name AS program__name,
+       program.price_per_second AS program__price_per_second,
+       device.status AS device__status,
+       device.last_seen AS device__last_seen,
+       device.updated_at AS device__updated_at
+FROM session
+LEFT JOIN devices_washprogram program ON program.id = session.program_id
+CROSS JOIN device
+"""
+
+
+def _transition(device, sql, params, command):
+    """
+    Run a transition statement and return the resulting DeviceSession,
+    or None if the precondition did not hold (no matching session / conflict).
+    The passed device instance is refreshed from the RETURNING row.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if row is None:
+            # The registry may have steered us here with a stale entry
+            registry.invalidate(device.pk)
+            return None
+        columns = [col[0] for col in cursor.description]
+
+    values = dict(zip(columns, row))
+    session_fields = [f.attname for f in DeviceSession._meta.concrete_fields]
+    session = DeviceSession.from_db(
+        connection.alias, session_fields, [values[name] for name in session_fields]
+    )
+
+    device.status = values['device__status']
+    device.last_seen = values['device__last_seen']
+    device.updated_at = values['device__updated_at']
+    session.device = device
+
+    if session.program_id is not None:
+        session.program = WashProgram.from_db(
+            connection.alias,
+            ['id', 'name', 'price_per_second'],
+            [session.program_id, values['program__name'], values['program__price_per_second']],
+        )
+
+    registry.record(session)
+    metering.notify(session, values['program__price_per_second'])
+    control.notify_transition(session, command)
+    return session
+
+
+def start_session(device, program_id, client_card=None):
+    """Open a new active session. Returns None if the program is missing or a session is already open."""
+    return _transition(device, START_SQL, {
+        'device_id': device.pk,
+        'program_id': program_id,
+        'client_card': client_card,
+    }, 'start')
+
+
+def stop_session(device):
+    """Complete the active session and charge it. Returns None if there is no active session."""
+    return _transition(device, STOP_SQL, {'device_id': device.pk, 'to_status': 'completed'}, 'stop')
+
+
+def pause_session(device):
+    """Pause the active session, billing the time so far. Returns None if there is no active session."""
+    return _transition(device, PAUSE_SQL, {'device_id': device.pk, 'to_status': 'paused'}, 'pause')
+
+
+def resume_session(device):
+    """Resume the paused session. Returns None if there is no paused session."""
+    return _transition(device, RESUME_SQL, {'device_id': device.pk}, 'resume')
+
+
+# Async entry points for the ASGI command views. The transition is a single
+# raw statement, so it runs on the ORM's thread like any other async ORM call.
+astart_session = sync_to_async(start_session)
+astop_session = sync_to_async(stop_session)
+apause_session = sync_to_async(pause_session)
+aresume_session = sync_to_async(resume_session)
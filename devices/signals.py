@@ -0,0 +1,44 @@
+# devices/signals.py
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import config_cache, registry, snapshot
+from .models import Device, DeviceConfiguration, DeviceProgramSetting, DeviceSession, WashProgram
+
+
+@receiver(post_save, sender=DeviceSession)
+@receiver(post_delete, sender=DeviceSession)
+def invalidate_session_registry(sender, instance, **kwargs):
+    """Sessions changed outside the session engine (admin, shell) drop their registry entry."""
+    registry.invalidate(instance.device_id)
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device_snapshot(sender, instance, **kwargs):
+    """Broadcasts after the save write the entry again; saves that aren't broadcast reload it."""
+    snapshot.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=DeviceConfiguration)
+@receiver(post_delete, sender=DeviceConfiguration)
+def invalidate_configuration(sender, instance, **kwargs):
+    config_cache.invalidate(instance.device_id)
+
+
+@receiver(post_save, sender=DeviceProgramSetting)
+@receiver(post_delete, sender=DeviceProgramSetting)
+def invalidate_program_setting(sender, instance, **kwargs):
+    config_cache.invalidate(*DeviceConfiguration.objects.filter(
+        pk=instance.device_config_id
+    ).values_list('device_id', flat=True))
+
+
+@receiver(post_save, sender=WashProgram)
+@receiver(post_delete, sender=WashProgram)
+def invalidate_program(sender, instance, **kwargs):
+    """Program names and prices are part of every configuration that uses the program."""
+    config_cache.invalidate(*DeviceProgramSetting.objects.filter(
+        program_id=instance.pk
+    ).values_list('device_config__device_id', flat=True))
@@ -0,0 +1,350 @@
+# devices/simulator.py
+"""
+Local fleet simulator for end-to-end load tests (manage.py simulate_fleet).
+
+StubBackend stands in for the device backend: a threaded HTTP server that
+answers the endpoints DeviceBackendService calls (verify, status, token,
+configuration, register) after a configurable latency, failing a configurable
+share of requests with 503. Point the server under test at it with
+DEVICE_BACKEND_URL.
+
+FleetLoad drives simulated devices against the API over HTTP: verification,
+status checks and start/pause/resume/stop session cycles, each device's steps
+in order, many devices at once. Optional watchers hold ws/devices/<id>/
+sockets open and time how long each command's device_update broadcast takes
+to arrive. Every call is timed; LatencyRecorder turns the samples into
+throughput and percentiles.
+
+Only the standard library and requests are used, so this runs wherever the
+project does.
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+import statistics
+import struct
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Stand-in device backend
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = [
+        ('POST', re.compile(r'^/api/devices/verify/$'), 'verify'),
+        ('GET', re.compile(r'^/api/devices/[^/]+/status/$'), 'status'),
+        ('GET', re.compile(r'^/api/devices/[^/]+/token/$'), 'token'),
+        ('POST', re.compile(r'^/api/devices/[^/]+/configuration/$'), 'configuration'),
+        ('PATCH', re.compile(r'^/api/devices/[^/]+/configuration/$'), 'configuration_patch'),
+        ('POST', re.compile(r'^/+central/register$'), 'register'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        endpoint = next(
+            (name for method, pattern, name in self.ROUTES
+             if method == self.command and pattern.match(self.path)),
+            None,
+        )
+        backend = self.server.backend
+        backend.count(endpoint or 'unknown')
+        delay = backend.delay()
+        if delay:
+            time.sleep(delay)
+
+        if endpoint is None:
+            self._reply(404, {'message': 'Not found'})
+        elif random.random() < backend.failure_rate:
+            backend.count('failed')
+            self._reply(503, {'message': 'Simulated failure'})
+        elif endpoint == 'status':
+            online = random.random() >= backend.offline_rate
+            self._reply(200, {'online': online, 'status': 'online' if online else 'offline'})
+        elif endpoint == 'token':
+            self._reply(200, {'token': base64.urlsafe_b64encode(os.urandom(24)).decode()})
+        elif endpoint == 'register':
+            self._reply(200, {'registered': True})
+        else:
+            self._reply(200, {'message': 'ok'})
+
+    do_GET = do_POST = do_PATCH = _handle
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubBackend:
+    """The stand-in backend. latency/jitter in seconds, rates in 0..1."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.02, jitter=0.01,
+                 failure_rate=0.0, offline_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.offline_rate = offline_rate
+        self.requests = defaultdict(int)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.backend = self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def delay(self):
+        return max(0.0, random.gauss(self.latency, self.jitter)) if self.latency else 0.0
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Measurements
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """Thread-safe latency samples (seconds) and error counts per operation."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, operation, seconds, ok=True):
+        with self._lock:
+            self.samples[operation].append(seconds)
+            if not ok:
+                self.errors[operation] += 1
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def stop(self):
+        self.finished = time.monotonic()
+
+    def summary(self):
+        """One row per operation: count, errors, throughput and latency percentiles in ms."""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        rows = []
+        for operation in sorted(self.samples):
+            values = sorted(self.samples[operation])
+            rows.append({
+                'operation': operation,
+                'count': len(values),
+                'errors': self.errors[operation],
+                'rps': round(len(values) / elapsed, 1) if elapsed else None,
+                'mean': round(statistics.fmean(values) * 1000, 1),
+                'p50': round(percentile(values, 0.50) * 1000, 1),
+                'p90': round(percentile(values, 0.90) * 1000, 1),
+                'p99': round(percentile(values, 0.99) * 1000, 1),
+                'max': round(values[-1] * 1000, 1),
+            })
+        return {'elapsed': round(elapsed, 2), 'operations': rows}
+
+
+# Minimal websocket client (RFC 6455): text frames in, close out
+
+async def _ws_connect(url):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    key = base64.b64encode(os.urandom(16)).decode()
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUpgrade: websocket\r\n'
+        f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n'
+        f'Origin: http://{parts.netloc}\r\n\r\n'.encode()
+    )
+    await writer.drain()
+    headers = await reader.readuntil(b'\r\n\r\n')
+    if b' 101 ' not in headers.split(b'\r\n', 1)[0]:
+        writer.close()
+        raise ConnectionError(f"Websocket handshake failed for {url}")
+    return reader, writer
+
+
+async def _ws_read(reader):
+    """The next text message, or None when the server closes the socket."""
+    while True:
+        head = await reader.readexactly(2)
+        opcode, length = head[0] & 0x0F, head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        payload = await reader.readexactly(length)
+        if opcode == 0x8:
+            return None
+        if opcode == 0x1:
+            return payload.decode()
+
+
+def _ws_close_frame():
+    # Client frames must be masked; an all-zero mask leaves the payload as is
+    return bytes([0x88, 0x82, 0, 0, 0, 0]) + struct.pack('!H', 1000)
+
+
+# Load generation
+
+class FleetLoad:
+    """
+    Drives `devices` (list of (pk, device_id)) against the API at `api_url`
+    with `concurrency` devices in flight at a time.
+    """
+
+    def __init__(self, api_url, token, devices, program_id, concurrency=50, think_time=0.0):
+        self.api_url = api_url.rstrip('/')
+        self.devices = devices
+        self.program_id = program_id
+        self.concurrency = concurrency
+        self.think_time = think_time
+        self.recorder = LatencyRecorder()
+        self.last_command = {}
+        self._local = threading.local()
+        self._headers = {'Authorization': f'Bearer {token}'}
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            session.headers.update(self._headers)
+        return session
+
+    def call(self, operation, method, path, pk=None, expected=(200, 201), **kwargs):
+        started = time.monotonic()
+        if pk is not None:
+            self.last_command[pk] = started
+        try:
+            response = self._session().request(method, f'{self.api_url}{path}', timeout=30, **kwargs)
+            ok = response.status_code in expected
+        except requests.RequestException:
+            ok = False
+        self.recorder.record(operation, time.monotonic() - started, ok)
+        return ok
+
+    def _think(self):
+        if self.think_time:
+            time.sleep(random.uniform(0, self.think_time * 2))
+
+    def verify(self, device):
+        pk, _device_id = device
+        self.call('verify', 'POST', f'/devices/{pk}/verify/', pk=pk)
+
+    def status_check(self, device):
+        pk, _device_id = device
+        self.call('status_check', 'GET', f'/devices/{pk}/status_check/', pk=pk)
+
+    def session_cycle(self, device, cycles=1):
+        pk, device_id = device
+        for _ in range(cycles):
+            if not self.call('start', 'POST', f'/devices/{pk}/start/', pk=pk,
+                             json={'program_id': self.program_id, 'client_card': f'card-{device_id}'}):
+                continue
+            self._think()
+            self.call('pause', 'POST', f'/devices/{pk}/pause/', pk=pk)
+            self._think()
+            self.call('resume', 'POST', f'/devices/{pk}/resume/', pk=pk)
+            self._think()
+            self.call('stop', 'POST', f'/devices/{pk}/stop/', pk=pk)
+
+    def run_phase(self, func, **kwargs):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(lambda device: func(device, **kwargs), self.devices))
+
+    def watch(self, watchers, ws_url):
+        """
+        Open ws/devices/<pk>/ for the first `watchers` devices in a background
+        thread. Returns a function that closes them.
+        """
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        pending = [min(watchers, len(self.devices))]
+        tasks = []
+
+        def connected():
+            pending[0] -= 1
+            if pending[0] <= 0:
+                ready.set()
+
+        async def watch_one(pk):
+            try:
+                reader, writer = await _ws_connect(f'{ws_url.rstrip("/")}/ws/devices/{pk}/')
+                # The consumer's initial device snapshot
+                await asyncio.wait_for(_ws_read(reader), 10)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                self.recorder.record('ws_connect', 0.0, ok=False)
+                connected()
+                return
+            connected()
+            try:
+                while (text := await _ws_read(reader)) is not None:
+                    received = time.monotonic()
+                    sent = self.last_command.get(pk)
+                    # device_update broadcasts; session ticks carry a 'type'
+                    if sent is not None and 'type' not in json.loads(text):
+                        self.recorder.record('ws_broadcast', received - sent)
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                writer.write(_ws_close_frame())
+                writer.close()
+
+        async def main():
+            if not pending[0]:
+                ready.set()
+            tasks.extend(asyncio.create_task(watch_one(pk)) for pk, _device_id in self.devices[:watchers])
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        thread = threading.Thread(target=lambda: loop.run_until_complete(main()), daemon=True)
+        thread.start()
+        ready.wait()
+
+        def close():
+            loop.call_soon_threadsafe(lambda: [task.cancel() for task in tasks])
+            thread.join(timeout=5)
+
+        return close
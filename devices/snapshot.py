@@ -0,0 +1,84 @@
+# devices/snapshot.py
+"""
+Latest broadcast state per device, for websocket snapshots.
+
+DeviceStatusConsumer sends a device's current state when a socket connects.
+Rather than query the devices table on every connect (a tablet reconnect storm
+after a Wi-Fi blip is one query per socket), the state is kept in the Django
+cache (Redis in production) and written by the broadcast path: every batch of
+device updates sent by devices.utils is merged into the devices' entries.
+
+A complete update (device_status_message) creates the entry; partial updates
+only change an entry that already exists. A missing entry is loaded with the
+async ORM and cached. Device saves and deletes drop the entry once the
+transaction commits (devices/signals.py), and writes that bypass signals
+(the health sweep's status update) call refresh() themselves.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Device
+
+KEY_PREFIX = 'device_snapshot:'
+ENTRY_TIMEOUT = 60 * 60 * 24  # safety net; entries are normally replaced by broadcasts
+FIELDS = ('id', 'name', 'status', 'is_active', 'last_seen')
+
+
+def _key(device_id):
+    return f'{KEY_PREFIX}{device_id}'
+
+
+def _entry(device):
+    return {
+        'id': device.id,
+        'name': device.name,
+        'status': device.status,
+        'is_active': device.is_active,
+        'last_seen': device.last_seen.isoformat() if device.last_seen else None,
+    }
+
+
+def _merge(entry, message):
+    """`entry` updated with `message`, or None if a partial message has nothing to update."""
+    if entry is None and not all(field in message for field in FIELDS):
+        return None
+    merged = dict(entry or {})
+    merged.update((field, message[field]) for field in FIELDS if field in message)
+    return merged
+
+
+async def arecord(updates):
+    """Merge broadcast `updates` ({device_id: message}) into the devices' entries."""
+    keys = {device_id: _key(device_id) for device_id in updates}
+    current = await cache.aget_many(keys.values())
+    entries = {}
+    for device_id, message in updates.items():
+        entry = _merge(current.get(keys[device_id]), message)
+        if entry is not None:
+            entries[keys[device_id]] = entry
+    if entries:
+        await cache.aset_many(entries, ENTRY_TIMEOUT)
+
+
+async def aget(device_id):
+    """The device's latest state, or None if there is no such device."""
+    entry = await cache.aget(_key(device_id))
+    if entry is None:
+        device = await Device.objects.filter(pk=device_id).only(*FIELDS).afirst()
+        if device is None:
+            return None
+        entry = _entry(device)
+        await cache.aset(_key(device_id), entry, ENTRY_TIMEOUT)
+    return entry
+
+
+def refresh(devices):
+    """Replace the entries of `devices` (with FIELDS loaded) once the transaction commits."""
+    entries = {_key(device.id): _entry(device) for device in devices}
+    if entries:
+        transaction.on_commit(lambda: cache.set_many(entries, ENTRY_TIMEOUT))
+
+
+def invalidate(device_id):
+    """Drop the device's entry once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_key(device_id)))
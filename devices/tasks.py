@@ -0,0 +1,54 @@
+import logging
+from celery import shared_task
+from django.utils.dateparse import parse_datetime
+
+from . import config_push, control, health, partitions, telemetry
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def maintain_device_log_partitions():
+    """Create upcoming DeviceLog partitions, refresh rollups and expire old partitions"""
+    result = partitions.maintain()
+    logger.info(f"Device log partitions created: {result['created']}, expired: {result['expired']}")
+    return result
+
+
+@shared_task
+def sweep_device_health():
+    """Check every active device with the backend and persist/broadcast the changes"""
+    return health.sweep()
+
+
+@shared_task
+def device_heartbeat():
+    """Check one shard of the fleet and time out devices that stopped responding"""
+    return health.heartbeat()
+
+
+@shared_task
+def push_configuration(job_id):
+    """Push device configurations for a ConfigPushJob"""
+    return config_push.run_job(job_id)
+
+
+@shared_task
+def redeliver_device_commands():
+    """Resend unacknowledged control-channel commands and expire stale ones"""
+    return control.redeliver()
+
+
+@shared_task
+def rollup_telemetry(start=None, end=None):
+    """Aggregate telemetry into minute/hour rollups (default: the recent LATE_WINDOW)"""
+    return telemetry.rollup(
+        parse_datetime(start) if start else None,
+        parse_datetime(end) if end else None,
+    )
+
+
+@shared_task
+def maintain_telemetry_partitions():
+    """Create upcoming telemetry partitions and expire old raw data and minute rollups"""
+    return telemetry.maintain()
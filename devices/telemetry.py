@@ -0,0 +1,316 @@
+# devices/telemetry.py
+"""
+Engine/pump telemetry ingest and downsampling.
+
+Devices post batches of samples to /devices/telemetry/ as NDJSON (one JSON
+object per line) or msgpack (a stream of maps, or one array of maps):
+
+    {"ts": 1760680000.25, "engine": 62, "pump": 48, "pressure": 81.5}
+
+`ts` is a Unix timestamp or an ISO 8601 string; `pressure` is optional. A
+batch is validated in one pass and written with a single multi-row INSERT
+into the day-partitioned devices_devicetelemetry table. Samples already
+stored (same device and timestamp) are ignored, so devices can safely resend
+a batch whose response they did not get.
+
+rollup() aggregates raw samples into per-minute DeviceTelemetryRollup rows and
+those into hourly rows. The rollup_telemetry task runs it every minute over
+the last LATE_WINDOW seconds; a batch reaching further back schedules a rollup
+of its own time range. Raw partitions are dropped after RAW_RETENTION_DAYS,
+minute rollups deleted after MINUTE_RETENTION_DAYS; hourly rollups are kept.
+
+Settings (all optional):
+
+    DEVICE_TELEMETRY = {
+        'MAX_BATCH': 10000,             # samples per request
+        'MAX_AGE': 7 * 24 * 3600,       # seconds; older samples are rejected
+        'LATE_WINDOW': 600,             # seconds re-aggregated by every rollup run
+        'RAW_RETENTION_DAYS': 14,
+        'MINUTE_RETENTION_DAYS': 90,
+    }
+"""
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+import msgpack
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import DeviceTelemetry, DeviceTelemetryRollup
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'devices_devicetelemetry'
+DEFAULT_PARTITION = 'devices_devicetelemetry_default'
+PARTITION_PREFIX = 'devices_devicetelemetry_p'
+
+DEFAULTS = {
+    'MAX_BATCH': 10000,
+    'MAX_AGE': 7 * 24 * 3600,
+    'LATE_WINDOW': 600,
+    'RAW_RETENTION_DAYS': 14,
+    'MINUTE_RETENTION_DAYS': 90,
+}
+
+# Clock skew tolerated for samples stamped in the future
+MAX_FUTURE = timedelta(minutes=5)
+
+
+def telemetry_setting(name):
+    return getattr(settings, 'DEVICE_TELEMETRY', {}).get(name, DEFAULTS[name])
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+# Parsing
+
+def parse_ndjson(stream):
+    """Yield the objects of an NDJSON byte stream. Raises ValueError on malformed lines."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def parse_msgpack(stream):
+    """Yield the maps of a msgpack stream (a sequence of maps or arrays of maps)."""
+    unpacker = msgpack.Unpacker(stream, raw=False, timestamp=3)
+    try:
+        for item in unpacker:
+            if isinstance(item, list):
+                yield from item
+            else:
+                yield item
+    except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+        raise ValueError(str(e)) from e
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value if timezone.is_aware(value) else value.replace(tzinfo=dt_timezone.utc)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=dt_timezone.utc)
+    raise ValueError("invalid ts")
+
+
+def _percent(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 100:
+        raise ValueError("performance must be 0-100")
+    return round(value)
+
+
+def build_samples(device_id, items, now=None):
+    """
+    Validate raw sample dicts into unsaved DeviceTelemetry rows.
+    Returns (rows, rejected count). Raises BatchTooLarge past MAX_BATCH.
+    """
+    now = now or timezone.now()
+    oldest = now - timedelta(seconds=telemetry_setting('MAX_AGE'))
+    newest = now + MAX_FUTURE
+    max_batch = telemetry_setting('MAX_BATCH')
+    rows = []
+    rejected = 0
+    for count, item in enumerate(items, 1):
+        if count > max_batch:
+            raise BatchTooLarge(f"At most {max_batch} samples per batch")
+        try:
+            recorded_at = _timestamp(item['ts'])
+            if not oldest <= recorded_at <= newest:
+                raise ValueError("ts out of range")
+            pressure = item.get('pressure')
+            if pressure is not None and (isinstance(pressure, bool) or not isinstance(pressure, (int, float))):
+                raise ValueError("invalid pressure")
+            rows.append(DeviceTelemetry(
+                device_id=device_id,
+                recorded_at=recorded_at,
+                engine_performance=_percent(item['engine']),
+                pump_performance=_percent(item['pump']),
+                pressure=pressure,
+            ))
+        except (KeyError, TypeError, ValueError, OverflowError, OSError):
+            rejected += 1
+    return rows, rejected
+
+
+def ingest(device_id, items):
+    """Store a batch of samples for one device. Returns a summary dict."""
+    rows, rejected = build_samples(device_id, items)
+    if rows:
+        # One INSERT ... ON CONFLICT DO NOTHING for the whole batch
+        DeviceTelemetry.objects.bulk_create(rows, batch_size=len(rows), ignore_conflicts=True)
+        start = min(row.recorded_at for row in rows)
+        if start < timezone.now() - timedelta(seconds=telemetry_setting('LATE_WINDOW')):
+            # Older than the periodic rollup reaches: aggregate this range separately
+            end = max(row.recorded_at for row in rows) + timedelta(minutes=1)
+            transaction.on_commit(lambda: _schedule_rollup(start, end))
+    return {'accepted': len(rows), 'rejected': rejected}
+
+
+def _schedule_rollup(start, end):
+    from .tasks import rollup_telemetry
+    rollup_telemetry.delay(start.isoformat(), end.isoformat())
+
+
+# Downsampling
+
+MINUTE_ROLLUP_SQL = """
+INSERT INTO devices_devicetelemetryrollup
+    (device_id, resolution, bucket, samples,
+     engine_avg, engine_min, engine_max, pump_avg, pump_min, pump_max, pressure_avg, pressure_max)
+SELECT device_id, 'minute', date_trunc('minute', recorded_at), count(*),
+       avg(engine_performance), min(engine_performance), max(engine_performance),
+       avg(pump_performance), min(pump_performance), max(pump_performance),
+       avg(pressure), max(pressure)
+FROM devices_devicetelemetry
+WHERE recorded_at >= %(start)s AND recorded_at < %(end)s
+GROUP BY 1, 3
+ON CONFLICT (device_id, resolution, bucket) DO UPDATE SET
+    samples = EXCLUDED.samples,
+    engine_avg = EXCLUDED.engine_avg, engine_min = EXCLUDED.engine_min, engine_max = EXCLUDED.engine_max,
+    pump_avg = EXCLUDED.pump_avg, pump_min = EXCLUDED.pump_min, pump_max = EXCLUDED.pump_max,
+    pressure_avg = EXCLUDED.pressure_avg, pressure_max = EXCLUDED.pressure_max
+"""
+
+# Hours are aggregated from the minute rows, weighting averages by sample count
+HOUR_ROLLUP_SQL = """
+INSERT INTO devices_devicetelemetryrollup
+    (device_id, resolution, bucket, samples,
+     engine_avg, engine_min, engine_max, pump_avg, pump_min, pump_max, pressure_avg, pressure_max)
+SELECT device_id, 'hour', date_trunc('hour', bucket), sum(samples),
+       sum(engine_avg * samples) / sum(samples), min(engine_min), max(engine_max),
+       sum(pump_avg * samples) / sum(samples), min(pump_min), max(pump_max),
+       sum(pressure_avg * samples) / nullif(sum(samples) FILTER (WHERE pressure_avg IS NOT NULL), 0),
+       max(pressure_max)
+FROM devices_devicetelemetryrollup
+WHERE resolution = 'minute' AND bucket >= %(start)s AND bucket < %(end)s
+GROUP BY 1, 3
+ON CONFLICT (device_id, resolution, bucket) DO UPDATE SET
+    samples = EXCLUDED.samples,
+    engine_avg = EXCLUDED.engine_avg, engine_min = EXCLUDED.engine_min, engine_max = EXCLUDED.engine_max,
+    pump_avg = EXCLUDED.pump_avg, pump_min = EXCLUDED.pump_min, pump_max = EXCLUDED.pump_max,
+    pressure_avg = EXCLUDED.pressure_avg, pressure_max = EXCLUDED.pressure_max
+"""
+
+
+def _floor(moment, unit):
+    moment = moment.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+    return moment.replace(minute=0) if unit == 'hour' else moment
+
+
+def rollup(start=None, end=None):
+    """
+    Recompute the minute rollups for the minutes overlapping [start, end) and
+    the hourly rollups for the hours overlapping it. Defaults to the last
+    LATE_WINDOW seconds. Returns the rows written per resolution.
+    """
+    end = end or timezone.now()
+    start = start or end - timedelta(seconds=telemetry_setting('LATE_WINDOW'))
+    minute_start = _floor(start, 'minute')
+    hour_start = _floor(start, 'hour')
+    hour_end = _floor(end, 'hour') + timedelta(hours=1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(MINUTE_ROLLUP_SQL, {'start': minute_start, 'end': end})
+        minutes = cursor.rowcount
+        cursor.execute(HOUR_ROLLUP_SQL, {'start': hour_start, 'end': hour_end})
+        hours = cursor.rowcount
+    return {'minute': minutes, 'hour': hours}
+
+
+# Partitions
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def partition_name(day):
+    return f'{PARTITION_PREFIX}{day:%Y_%m_%d}'
+
+
+def list_partitions():
+    """Return {day (date): table name} for the daily partitions that exist."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname LIKE %s
+            """,
+            [PARENT_TABLE, f'{PARTITION_PREFIX}%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return {
+        date(*map(int, name[len(PARTITION_PREFIX):].split('_'))): name
+        for name in names
+    }
+
+
+def ensure_partitions(days_ahead=3, today=None):
+    """
+    Create daily partitions from today up to `days_ahead` days ahead, moving
+    rows that already landed in the default partition. Returns the names created.
+    """
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    existing = list_partitions()
+    created = []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if day in existing:
+            continue
+        name = partition_name(day)
+        start, end = _bound(day), _bound(day + timedelta(days=1))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+            cursor.execute(
+                f'WITH moved AS ('
+                f'  DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at >= %s AND recorded_at < %s RETURNING *'
+                f') INSERT INTO {name} SELECT * FROM moved',
+                [start, end],
+            )
+            cursor.execute(
+                f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+        created.append(name)
+        logger.info("Created telemetry partition %s", name)
+    return created
+
+
+def expire(today=None):
+    """
+    Drop raw partitions past RAW_RETENTION_DAYS (their days are rolled up
+    first) and delete minute rollups past MINUTE_RETENTION_DAYS.
+    """
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    cutoff = today - timedelta(days=telemetry_setting('RAW_RETENTION_DAYS'))
+    dropped = []
+    for day, name in sorted(list_partitions().items()):
+        if day >= cutoff:
+            continue
+        rollup(_bound(day), _bound(day + timedelta(days=1)))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {name}')
+        dropped.append(name)
+        logger.info("Dropped telemetry partition %s", name)
+
+    minute_cutoff = _bound(today - timedelta(days=telemetry_setting('MINUTE_RETENTION_DAYS')))
+    deleted, _ = DeviceTelemetryRollup.objects.filter(resolution='minute', bucket__lt=minute_cutoff).delete()
+    return {'dropped': dropped, 'minute_rollups_deleted': deleted}
+
+
+def maintain(days_ahead=3):
+    """Create upcoming partitions and expire old data."""
+    created = ensure_partitions(days_ahead)
+    return {'created': created, **expire()}
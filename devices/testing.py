@@ -0,0 +1,37 @@
+# devices/testing.py
+"""Shared test case for the per-endpoint query budget tests (devices/query_budget.py)."""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    QUERY_BUDGET={'RAISE': True, 'HEADERS': False, 'DEFAULT': None},
+)
+class QueryBudgetTestCase(APITestCase):
+    """
+    Requests as an admin with cold caches. Subclasses seed ROWS rows per list
+    (enough to show an N+1) and pin each endpoint's query count with
+    assertQueries; QUERY_BUDGET['RAISE'] also fails any request over its
+    view's declared budget.
+    """
+    ROWS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username='budget', email='budget@example.com', password=None, role='admin',
+        )
+        cls.token = str(RefreshToken.for_user(user).access_token)
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def assertQueries(self, path, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
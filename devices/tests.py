@@ -1,3 +1,310 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import IntegrityError, connection
+from django.db.models.expressions import RawSQL
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import health, metering, registry, session_engine
+from .models import (
+    Device, DeviceConfiguration, DeviceLog, DeviceProgramSetting, DeviceSession,
+    DeviceTelemetryRollup, WashProgram,
+)
+from .registry import OPEN_STATUSES
+from .testing import QueryBudgetTestCase
+
+PAGE = 51
+
+# One year of sessions over a mid-sized fleet: 100k rows, 10% of them in
+# the last 30 days, 40% paid with one of 3,000 cards, 1 in 10 free
+SEED_SESSIONS_SQL = """
+INSERT INTO devices_devicesession
+    (device_id, program_id, client_card, status, started_at, ended_at, resumed_at,
+     total_duration, amount_charged, bonus_time_used)
+SELECT devices[1 + n %% array_length(devices, 1)],
+       programs[1 + n %% array_length(programs, 1)],
+       CASE WHEN n %% 5 < 2 THEN 'card-' || n %% 3000 END,
+       CASE WHEN n %% 40 = 0 THEN 'cancelled' ELSE 'completed' END,
+       now() - n * interval '315 seconds',
+       now() - n * interval '315 seconds' + interval '5 minutes',
+       NULL,
+       300,
+       CASE WHEN n %% 10 = 0 THEN 0 ELSE 5 END,
+       0
+FROM generate_series(1, %(sessions)s) AS n,
+     (SELECT %(devices)s::integer[] AS devices, %(programs)s::integer[] AS programs) AS ids
+"""
+
+
+class SessionQueryPlanTests(TestCase):
+    """
+    The DeviceSession filters used by the command endpoints, listings and
+    reports are answered from an index on a realistically sized, analyzed
+    table, not by a sequential scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        devices = Device.objects.bulk_create(
+            Device(name=f'Bay {n}', device_id=f'plan-{n}') for n in range(100)
+        )
+        programs = WashProgram.objects.bulk_create(WashProgram(name=f'Program {n}') for n in range(10))
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_SESSIONS_SQL, {
+                'sessions': 100000,
+                'devices': [device.pk for device in devices],
+                'programs': [program.pk for program in programs],
+            })
+        # An open session on every fifth device
+        DeviceSession.objects.bulk_create(
+            DeviceSession(device=device, program=programs[0], status='active' if n % 2 else 'paused')
+            for n, device in enumerate(devices[::5])
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE devices_devicesession')
+        cls.device = devices[0]
+        cls.program = programs[0]
+
+    def session_queries(self):
+        end = timezone.now()
+        start = end - timedelta(days=30)
+        sessions = DeviceSession.objects.all()
+        device_sessions = sessions.filter(device=self.device)
+        return [
+            ("open session for device", device_sessions.filter(status__in=OPEN_STATUSES)),
+            ("active session for device", device_sessions.filter(status='active')),
+            ("open sessions (registry rebuild)", sessions.filter(status__in=OPEN_STATUSES)),
+            ("device sessions page", device_sessions.order_by('-started_at', '-id')[:PAGE]),
+            ("device sessions page by status",
+             device_sessions.filter(status='completed').order_by('-started_at', '-id')[:PAGE]),
+            ("fleet sessions page", sessions.order_by('-started_at', '-id')[:PAGE]),
+            ("sessions by program", sessions.filter(program=self.program).order_by('-started_at', '-id')[:PAGE]),
+            ("revenue report", sessions.filter(started_at__gte=start, started_at__lt=end, status='completed')),
+            ("payment report",
+             sessions.filter(started_at__gte=start, started_at__lt=end, status='completed', amount_charged__gt=0)),
+            ("device activity report", sessions.filter(started_at__gte=start, started_at__lt=end)),
+            ("client activity report",
+             sessions.filter(started_at__gte=start, started_at__lt=end, client_card__isnull=False)
+             .exclude(client_card='')),
+        ]
+
+    def test_session_queries_use_an_index(self):
+        for label, queryset in self.session_queries():
+            with self.subTest(label):
+                plan = queryset.explain()
+                self.assertNotIn('Seq Scan on devices_devicesession', plan, f"{label}:\n{plan}")
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SessionEngineTests(TestCase):
+    """
+    The start/stop/pause/resume statements against the real schema. now() is
+    fixed for the test's transaction, so elapsed active time is simulated by
+    moving resumed_at back.
+    """
+
+    def setUp(self):
+        self.device = Device.objects.create(name='Bay', device_id='engine-1', status='offline')
+        self.program = WashProgram.objects.create(name='Program', price_per_second=Decimal('0.25'))
+
+    def run_for(self, seconds):
+        DeviceSession.objects.filter(device=self.device, status='active').update(
+            # The statements bill up to now(), the transaction's start time
+            resumed_at=RawSQL('now() - make_interval(secs => %s)', [seconds])
+        )
+
+    def open_sessions(self):
+        return DeviceSession.objects.filter(device=self.device, status__in=OPEN_STATUSES)
+
+    def test_start(self):
+        session = session_engine.start_session(self.device, self.program.pk, 'card-1')
+        self.assertEqual(session.status, 'active')
+        self.assertEqual(session.client_card, 'card-1')
+        self.assertEqual(session.program.name, 'Program')
+        self.assertIsNotNone(session.resumed_at)
+        self.assertEqual((session.total_duration, session.amount_charged), (0, 0))
+
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.status, 'online')
+        self.assertIsNotNone(self.device.last_seen)
+        self.assertTrue(DeviceLog.objects.filter(device=self.device, message='Started session: Program').exists())
+
+    def test_start_with_unknown_program_is_rejected(self):
+        self.assertIsNone(session_engine.start_session(self.device, 0))
+        self.assertFalse(self.open_sessions().exists())
+
+    def test_double_start_is_rejected(self):
+        first = session_engine.start_session(self.device, self.program.pk)
+        self.assertIsNone(session_engine.start_session(self.device, self.program.pk))
+        session_engine.pause_session(self.device)
+        self.assertIsNone(session_engine.start_session(self.device, self.program.pk))
+        self.assertEqual(list(self.open_sessions().values_list('id', flat=True)), [first.id])
+
+    def test_one_open_session_per_device_constraint(self):
+        session_engine.start_session(self.device, self.program.pk)
+        with self.assertRaises(IntegrityError):
+            DeviceSession.objects.create(device=self.device, program=self.program, status='paused')
+
+    def test_stop_charges_active_time(self):
+        session_engine.start_session(self.device, self.program.pk)
+        self.run_for(100)
+        session = session_engine.stop_session(self.device)
+        self.assertEqual(session.status, 'completed')
+        self.assertIsNotNone(session.ended_at)
+        self.assertIsNone(session.resumed_at)
+        self.assertEqual(session.total_duration, 100)
+        self.assertEqual(session.amount_charged, metering.charge(self.program.price_per_second, 100))
+        self.assertEqual(session.amount_charged, Decimal('25.00'))
+
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.status, 'offline')
+
+    def test_pause_resume_stop_bills_only_active_time(self):
+        session_engine.start_session(self.device, self.program.pk)
+        self.run_for(60)
+        paused = session_engine.pause_session(self.device)
+        self.assertEqual(paused.status, 'paused')
+        self.assertIsNone(paused.resumed_at)
+        self.assertIsNone(paused.ended_at)
+        self.assertEqual((paused.total_duration, paused.amount_charged), (60, Decimal('15.00')))
+
+        resumed = session_engine.resume_session(self.device)
+        self.assertEqual(resumed.status, 'active')
+        self.assertIsNotNone(resumed.resumed_at)
+        self.assertEqual(resumed.total_duration, 60)
+
+        self.run_for(30)
+        stopped = session_engine.stop_session(self.device)
+        self.assertEqual((stopped.total_duration, stopped.amount_charged), (90, Decimal('22.50')))
+        self.assertEqual(stopped.id, paused.id)
+
+    def test_stop_without_open_session_is_rejected(self):
+        self.assertIsNone(session_engine.stop_session(self.device))
+        session_engine.start_session(self.device, self.program.pk)
+        session_engine.stop_session(self.device)
+        self.assertIsNone(session_engine.stop_session(self.device))
+
+    def test_stop_of_paused_session_is_rejected(self):
+        session_engine.start_session(self.device, self.program.pk)
+        session_engine.pause_session(self.device)
+        self.assertIsNone(session_engine.stop_session(self.device))
+        self.assertEqual(self.open_sessions().get().status, 'paused')
+
+    def test_pause_and_resume_preconditions(self):
+        self.assertIsNone(session_engine.pause_session(self.device))
+        self.assertIsNone(session_engine.resume_session(self.device))
+        session_engine.start_session(self.device, self.program.pk)
+        self.assertIsNone(session_engine.resume_session(self.device))
+        session_engine.pause_session(self.device)
+        self.assertIsNone(session_engine.pause_session(self.device))
+
+    def test_registry_follows_transitions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = session_engine.start_session(self.device, self.program.pk)
+        self.assertEqual(registry.get_active_session_id(self.device.pk), session.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            session_engine.pause_session(self.device)
+        self.assertIsNone(registry.get_active_session_id(self.device.pk))
+        self.assertEqual(registry.get_open_session(self.device.pk)['status'], 'paused')
+        with self.captureOnCommitCallbacks(execute=True):
+            session_engine.resume_session(self.device)
+            session_engine.stop_session(self.device)
+        self.assertIsNone(registry.get_open_session(self.device.pk))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ExpireStaleTests(TestCase):
+    """The heartbeat's timeout of devices that have not been seen for STALE_AFTER seconds."""
+
+    def setUp(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        self.idle = Device.objects.create(name='Idle', device_id='idle', status='online', last_seen=long_ago)
+        self.busy = Device.objects.create(name='Busy', device_id='busy', status='online', last_seen=long_ago)
+        self.fresh = Device.objects.create(name='Fresh', device_id='fresh', status='online', last_seen=timezone.now())
+        program = WashProgram.objects.create(name='Program')
+        DeviceSession.objects.create(device=self.busy, program=program, status='active')
+
+    def test_stale_devices_go_offline(self):
+        self.assertEqual(health.expire_stale(stale_after=180), 1)
+        self.idle.refresh_from_db()
+        self.fresh.refresh_from_db()
+        self.assertEqual(self.idle.status, 'offline')
+        self.assertEqual(self.fresh.status, 'online')
+
+    def test_device_with_open_session_stays_online(self):
+        health.expire_stale(stale_after=180)
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.status, 'online')
+
+        DeviceSession.objects.filter(device=self.busy).update(status='paused')
+        health.expire_stale(stale_after=180)
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.status, 'online')
+
+
+class DeviceQueryBudgetTests(QueryBudgetTestCase):
+    """Query counts of the budgeted device read endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        programs = WashProgram.objects.bulk_create(
+            WashProgram(name=f'Program {n}', price_per_second=Decimal('0.10')) for n in range(cls.ROWS)
+        )
+        devices = Device.objects.bulk_create(
+            Device(name=f'Bay {n}', device_id=f'budget-{n}', ip_address='127.0.0.1') for n in range(cls.ROWS)
+        )
+        cls.device = devices[0]
+        configs = DeviceConfiguration.objects.bulk_create(
+            DeviceConfiguration(device=device, price_per_minute=10) for device in devices
+        )
+        cls.config = configs[0]
+        DeviceProgramSetting.objects.bulk_create(
+            DeviceProgramSetting(device_config=config, program=program)
+            for config in configs for program in programs
+        )
+        now = timezone.now()
+        for n, device in enumerate(devices):
+            DeviceLog.objects.create(device=device, log_type='info', message='Fleet log')
+            DeviceLog.objects.create(device=cls.device, log_type='info', message=f'Device log {n}')
+            DeviceSession.objects.create(device=device, program=programs[n], status='completed')
+            DeviceSession.objects.create(device=cls.device, program=programs[n], status='completed')
+            DeviceTelemetryRollup.objects.create(
+                device=cls.device, resolution='hour', bucket=now - timedelta(hours=n), samples=1,
+                engine_avg=50, engine_min=50, engine_max=50, pump_avg=50, pump_min=50, pump_max=50,
+            )
+
+    def test_device_list(self):
+        self.assertQueries('/devices/', 2)
+
+    def test_device_detail(self):
+        self.assertQueries(f'/devices/{self.device.pk}/', 5)
+
+    def test_device_detail_warm_cache(self):
+        self.client.get(f'/devices/{self.device.pk}/')
+        self.assertQueries(f'/devices/{self.device.pk}/', 2)
+
+    def test_device_logs(self):
+        self.assertQueries(f'/devices/{self.device.pk}/logs/', 3)
+
+    def test_device_sessions(self):
+        self.assertQueries(f'/devices/{self.device.pk}/sessions/', 3)
+
+    def test_device_telemetry(self):
+        self.assertQueries(f'/devices/{self.device.pk}/telemetry/?resolution=hour', 3)
+
+    def test_log_list(self):
+        self.assertQueries('/devices/logs/', 2)
+
+    def test_session_list(self):
+        self.assertQueries('/devices/sessions/', 2)
+
+    def test_program_list(self):
+        self.assertQueries('/devices/programs/', 2)
+
+    def test_config_list(self):
+        self.assertQueries('/devices/configs/', 3)
+
+    def test_config_detail(self):
+        self.assertQueries(f'/devices/configs/{self.config.pk}/', 3)
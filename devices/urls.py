@@ -6,7 +6,17 @@ from .views import (
     DeviceConfigurationViewSet,
     DeviceConfigTemplateViewSet,
     DeviceLogViewSet,
-    DeviceSessionViewSet
+    DeviceSessionViewSet,
+    ConfigPushJobViewSet,
+    TelemetryIngestView
+)
+from .async_views import (
+    AsyncStartView,
+    AsyncStopView,
+    AsyncPauseView,
+    AsyncResumeView,
+    AsyncVerifyView,
+    AsyncStatusCheckView
 )
 
 # Primary router for device only
@@ -29,6 +39,9 @@ log_router.register(r'', DeviceLogViewSet, basename='log')
 session_router = DefaultRouter()
 session_router.register(r'', DeviceSessionViewSet, basename='session')
 
+config_push_router = DefaultRouter()
+config_push_router.register(r'', ConfigPushJobViewSet, basename='config-push')
+
 urlpatterns = [
     # Include dedicated paths for each resource
     path('programs/', include(program_router.urls)),
@@ -36,6 +49,8 @@ urlpatterns = [
     path('templates/', include(template_router.urls)),
     path('logs/', include(log_router.urls)),
     path('sessions/', include(session_router.urls)),
+    path('config-pushes/', include(config_push_router.urls)),
+    path('telemetry/', TelemetryIngestView.as_view(), name='telemetry-ingest'),
 
     # Device-specific actions
     path('<int:pk>/start/', DeviceViewSet.as_view({'post': 'start'}), name='device-start'),
@@ -44,6 +59,7 @@ urlpatterns = [
     path('<int:pk>/resume/', DeviceViewSet.as_view({'post': 'resume'}), name='device-resume'),
     path('<int:pk>/logs/', DeviceViewSet.as_view({'get': 'logs'}), name='device-logs'),
     path('<int:pk>/sessions/', DeviceViewSet.as_view({'get': 'sessions'}), name='device-sessions'),
+    path('<int:pk>/telemetry/', DeviceViewSet.as_view({'get': 'telemetry'}), name='device-telemetry'),
 
     # Config template application endpoint
     path('configs/<int:pk>/apply_template/', DeviceConfigurationViewSet.as_view({'post': 'apply_template'}),
@@ -56,6 +72,14 @@ urlpatterns = [
     path('<int:pk>/verify_with_config/', DeviceViewSet.as_view({'post': 'verify_with_config'}), name='device-verify-with-config'),
     path('<int:pk>/update_configuration/', DeviceViewSet.as_view({'post': 'update_configuration'}), name='device-update-configuration'),
 
+    # Async (ASGI) versions of the command actions
+    path('<int:pk>/async/start/', AsyncStartView.as_view(), name='device-async-start'),
+    path('<int:pk>/async/stop/', AsyncStopView.as_view(), name='device-async-stop'),
+    path('<int:pk>/async/pause/', AsyncPauseView.as_view(), name='device-async-pause'),
+    path('<int:pk>/async/resume/', AsyncResumeView.as_view(), name='device-async-resume'),
+    path('<int:pk>/async/verify/', AsyncVerifyView.as_view(), name='device-async-verify'),
+    path('<int:pk>/async/status_check/', AsyncStatusCheckView.as_view(), name='device-async-status-check'),
+
     # Include the base device router (must be last to avoid capturing other URLs)
     path('', include(device_router.urls)),
 ]
\ No newline at end of file
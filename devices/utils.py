@@ -1,17 +1,182 @@
 # devices/utils.py
 
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.local import Local
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import snapshot
+
+# Holds the open BroadcastBatch for the current request/task, if any
+_state = Local()
+
+# Group joined by fleet stream consumers; receives every batch of updates
+FLEET_GROUP = 'device_fleet'
+
+# Fleet stream consumers keep this cache key alive while connected, so batches
+# are only published to FLEET_GROUP while someone listens. A process that saw
+# the key trusts it for FLEET_LISTENERS_RECHECK seconds before asking again.
+FLEET_LISTENERS_KEY = 'device_fleet_listeners'
+FLEET_LISTENERS_TIMEOUT = 60
+FLEET_LISTENERS_RECHECK = 10
+_fleet_listeners_seen = None  # monotonic time this process last saw the key
+
+
+async def amark_fleet_listener():
+    """Keep fleet batches flowing for FLEET_LISTENERS_TIMEOUT seconds."""
+    await cache.aset(FLEET_LISTENERS_KEY, True, FLEET_LISTENERS_TIMEOUT)
+
+
+async def _fleet_listening():
+    global _fleet_listeners_seen
+    now = time.monotonic()
+    if _fleet_listeners_seen is not None and now - _fleet_listeners_seen < FLEET_LISTENERS_RECHECK:
+        return True
+    if await cache.aget(FLEET_LISTENERS_KEY):
+        _fleet_listeners_seen = now
+        return True
+    return False
+
+
+def device_status_message(device):
+    """The standard device_update payload for a device."""
+    return {
+        'id': device.id,
+        'name': device.name,
+        'status': device.status,
+        'is_active': device.is_active,
+        'registration_status': device.registration_status,
+        'last_seen': device.last_seen.isoformat() if device.last_seen else None,
+        'last_updated': device.updated_at.isoformat()
+    }
+
+
+class BroadcastBatch:
+    """Pending device updates, collapsed to the latest state per device."""
+
+    def __init__(self):
+        self.pending = {}
+
+    def add(self, device_id, message):
+        self.pending.setdefault(device_id, {}).update(message)
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+def _current_batch():
+    return getattr(_state, 'batch', None)
+
+
+async def _send_updates(updates):
+    # Keep the connect-time snapshots current with what the sockets are told
+    await snapshot.arecord(updates)
+    channel_layer = get_channel_layer()
+    sends = [
+        channel_layer.group_send(
+            f'device_{device_id}',
+            {
+                'type': 'device_update',
+                'message': message
+            }
+        )
+        for device_id, message in updates.items()
+    ]
+    # One message per batch for the fleet stream (pairs, since the channel
+    # layer's msgpack decoding only accepts string map keys)
+    if await _fleet_listening():
+        sends.append(channel_layer.group_send(
+            FLEET_GROUP,
+            {
+                'type': 'fleet_update',
+                'updates': [[device_id, message] for device_id, message in updates.items()]
+            }
+        ))
+    await asyncio.gather(*sends)
+
+
+def _dispatch(device_id, message):
+    batch = _current_batch()
+    if batch is not None:
+        batch.add(device_id, message)
+    else:
+        async_to_sync(_send_updates)({device_id: message})
+
+
+@contextmanager
+def broadcast_batch():
+    """
+    Buffer device broadcasts made inside the block and send them together on exit.
+    Nested blocks join the outermost batch.
+    """
+    batch = _current_batch()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = _state.batch = BroadcastBatch()
+    try:
+        yield batch
+    finally:
+        del _state.batch
+        updates = batch.take()
+        if updates:
+            async_to_sync(_send_updates)(updates)
+
+
+@asynccontextmanager
+async def abroadcast_batch():
+    """Async version of broadcast_batch."""
+    batch = _current_batch()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = _state.batch = BroadcastBatch()
+    try:
+        yield batch
+    finally:
+        del _state.batch
+        updates = batch.take()
+        if updates:
+            await _send_updates(updates)
+
 
 def broadcast_device_update(device_id, message):
     """
-    Broadcast a device update to all connected WebSocket clients
+    Broadcast a device update to all connected WebSocket clients.
+
+    The update is only released once the current transaction commits (so
+    rolled-back states are never seen), and inside a broadcast_batch it is
+    merged with other updates for the same device and sent with the batch.
     """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f'device_{device_id}',
-        {
-            'type': 'device_update',
-            'message': message
-        }
-    )
\ No newline at end of file
+    transaction.on_commit(lambda: _dispatch(device_id, message))
+
+
+def _defer_until_commit(device_id, message):
+    # Runs on the ORM thread, whose connection holds any open transaction
+    if not connection.in_atomic_block:
+        return False
+    transaction.on_commit(lambda: _dispatch(device_id, message))
+    return True
+
+
+async def abroadcast_device_update(device_id, message):
+    """
+    Async version of broadcast_device_update. Inside a transaction (reached
+    through sync_to_async -> async_to_sync) the update waits for the commit
+    like the sync version; otherwise the channel layer is awaited directly.
+    """
+    if await sync_to_async(_defer_until_commit)(device_id, message):
+        return
+    batch = _current_batch()
+    if batch is not None:
+        batch.add(device_id, message)
+    else:
+        await _send_updates({device_id: message})
@@ -1,12 +1,19 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from rest_framework import viewsets, status, filters
+from django.utils.dateparse import parse_datetime
+from rest_framework import mixins, viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.views import APIView
 from rest_framework.response import Response
-from decimal import Decimal
 from django_filters.rest_framework import DjangoFilterBackend
 from devices.services import DeviceBackendService
-from devices.configuration import serialize_config
+from devices.configuration import DEFAULT_DEVICE_CONFIGURATION
+from devices import config_cache, config_push, control, log_buffer, outbox, session_engine, telemetry
 
 from accounts.permissions import (
     IsOperatorOrReadOnly,
@@ -15,14 +22,23 @@ from accounts.permissions import (
 )
 from .models import (
     Device, WashProgram, DeviceConfiguration, DeviceProgramSetting,
-    DeviceLog, DeviceSession
+    DeviceLog, DeviceSession, ConfigPushJob
 )
 from .serializers import (
     DeviceSerializer, WashProgramSerializer, DeviceConfigurationSerializer,
     DeviceProgramSettingSerializer, DeviceLogSerializer, DeviceSessionSerializer,
-    DeviceDetailSerializer, DeviceConfigTemplateSerializer
+    DeviceDetailSerializer, DeviceConfigTemplateSerializer,
+    ConfigPushJobSerializer, ConfigPushResultSerializer, DeviceTelemetryRollupSerializer
 )
-from .utils import broadcast_device_update
+from .pagination import DeviceLogCursorPagination, DeviceSessionCursorPagination
+from .parsers import MessagePackParser, NDJSONParser
+from .query_budget import query_budget
+from .tasks import push_configuration, sweep_device_health
+from .utils import broadcast_device_update, device_status_message
+
+
+# Upper bound on rollup rows returned by DeviceViewSet.telemetry
+TELEMETRY_MAX_POINTS = 1500
 
 
 class DeviceViewSet(viewsets.ModelViewSet):
@@ -44,6 +60,8 @@ class DeviceViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'is_active', 'registration_status']
     search_fields = ['name', 'device_id', 'location']
     ordering_fields = ['name', 'created_at', 'status', 'registration_status']
+    # Budgets count the user lookup of a JWT request, plus one for session authentication
+    query_budgets = {'list': 3, 'retrieve': 6}
 
     def get_serializer_class(self):
         if self.action in ['retrieve', 'detail']:
@@ -51,14 +69,7 @@ class DeviceViewSet(viewsets.ModelViewSet):
         return DeviceSerializer
 
     def _broadcast(self, device):
-        broadcast_device_update(device.id, {
-            'id': device.id,
-            'name': device.name,
-            'status': device.status,
-            'is_active': device.is_active,
-            'registration_status': device.registration_status,
-            'last_updated': device.updated_at.isoformat()
-        })
+        broadcast_device_update(device.id, device_status_message(device))
 
 
 
@@ -69,40 +80,13 @@ class DeviceViewSet(viewsets.ModelViewSet):
         device = self.get_object()
 
         # Get or create device configuration
-        config, created = DeviceConfiguration.objects.get_or_create(
+        DeviceConfiguration.objects.get_or_create(
             device=device,
-            defaults={
-                'price_per_minute': Decimal('10.00'),
-                'default_timeout': 300,
-                'valve_reset_timeout': 60,
-                'engine_performance': 50,
-                'pump_performance': 50
-            }
+            defaults=DEFAULT_DEVICE_CONFIGURATION
         )
 
-        # Prepare configuration to send with verification
-        config_data = {
-            'price_per_minute': float(config.price_per_minute),
-            'default_timeout': config.default_timeout,
-            'bonus_duration_enabled': config.bonus_duration_enabled,
-            'bonus_duration_amount': config.bonus_duration_amount,
-            'valve_reset_timeout': config.valve_reset_timeout,
-            'engine_performance': config.engine_performance,
-            'pump_performance': config.pump_performance,
-        }
-
-        # Add program settings if they exist
-        program_settings = []
-        for ps in config.deviceprogramsetting_set.all():
-            program_settings.append({
-                'program_id': ps.program.id,
-                'program_name': ps.program.name,
-                'custom_price': float(ps.custom_price) if ps.custom_price else None,
-                'is_enabled': ps.is_enabled
-            })
-        
-        if program_settings:
-            config_data['program_settings'] = program_settings
+        # Configuration to send with verification
+        config_data = config_cache.get(device.pk)['verification']
 
         # Attempt verification with backend
         backend_service = DeviceBackendService()
@@ -121,10 +105,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
             device.save()
 
             # Log successful verification
-            DeviceLog.objects.create(
-                device=device,
-                log_type='info',
-                message=f"Device verified successfully with configuration: {message}"
+            log_buffer.log(
+                device,
+                'info',
+                f"Device verified successfully with configuration: {message}"
             )
 
             # Broadcast the device update
@@ -140,10 +124,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
             device.save()
 
             # Log verification failure
-            DeviceLog.objects.create(
-                device=device,
-                log_type='warning',
-                message=f"Device verification failed: {message}"
+            log_buffer.log(
+                device,
+                'warning',
+                f"Device verification failed: {message}"
             )
 
             # Broadcast the device update
@@ -170,27 +154,17 @@ class DeviceViewSet(viewsets.ModelViewSet):
         client_card = request.data.get('client_card')
         if not program_id:
             return Response({"error": "Program ID is required."}, status=status.HTTP_400_BAD_REQUEST)
-        program = get_object_or_404(WashProgram, pk=program_id)
-
-        if DeviceSession.objects.filter(device=device, status='active').exists():
+        try:
+            program_id = int(program_id)
+        except (TypeError, ValueError):
+            return Response({"error": "Program ID must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The transition statement decides; a rejected one drops the registry entry
+        session = session_engine.start_session(device, program_id, client_card)
+        if session is None:
+            get_object_or_404(WashProgram, pk=program_id)
             return Response({"error": "Active session exists."}, status=status.HTTP_400_BAD_REQUEST)
 
-        session = DeviceSession.objects.create(
-            device=device,
-            program=program,
-            client_card=client_card,
-            status='active'
-        )
-        DeviceLog.objects.create(
-            device=device,
-            log_type='command',
-            message=f"Started session: {program.name}"
-        )
-
-        # Update and broadcast device status
-        device.status = 'online'
-        device.last_seen = timezone.now()
-        device.save()
         self._broadcast(device)
 
         return Response(DeviceSessionSerializer(session).data, status=status.HTTP_201_CREATED)
@@ -213,10 +187,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
 
         for comp, detail in payload["status_report"].items():
             level = "info" if detail["status"] == "OK" else "warning"
-            DeviceLog.objects.create(
-                evice=device,
-                log_type=level,
-                message=f"{comp}: {detail['status']} — {detail.get('details')}"
+            log_buffer.log(
+                device,
+                level,
+                f"{comp}: {detail['status']} — {detail.get('details')}"
             )
         if all(d["status"] == "OK" for d in payload["status_report"].values()):
             device.registration_status = "verified"
@@ -243,43 +217,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
                 "registration_status": device.registration_status
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        active_sessions = DeviceSession.objects.filter(device=device, status='active')
-
-        if not active_sessions.exists():
+        session = session_engine.stop_session(device)
+        if session is None:
             return Response({"error": "No active session."}, status=status.HTTP_404_NOT_FOUND)
 
-        # If multiple active sessions exist, use the most recent one
-        if active_sessions.count() > 1:
-            DeviceLog.objects.create(
-                device=device,
-                log_type='warning',
-                message=f"Multiple active sessions found ({active_sessions.count()}). Using most recent."
-            )
-            session = active_sessions.order_by('-started_at').first()
-        else:
-            session = active_sessions.first()
-
-        session.status = 'completed'
-        session.ended_at = timezone.now()
-        duration = (session.ended_at - session.started_at).total_seconds()
-        session.total_duration = int(duration)
-        if session.program:
-            # Calculate using per-second price
-            session.amount_charged = session.program.price_per_second * Decimal(str(duration))
-        session.save()
-
-        # Cancel any other active sessions if they exist
-        active_sessions.exclude(id=session.id).update(status='cancelled', ended_at=timezone.now())
-
-        DeviceLog.objects.create(
-            device=device,
-            log_type='command',
-            message=f"Stopped session: {session.total_duration}s"
-        )
-
-        # Update and broadcast device status
-        device.status = 'offline'
-        device.save()
         self._broadcast(device)
 
         return Response(DeviceSessionSerializer(session).data)
@@ -296,33 +237,11 @@ class DeviceViewSet(viewsets.ModelViewSet):
                 "registration_status": device.registration_status
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        active_sessions = DeviceSession.objects.filter(device=device, status='active')
-
-        if not active_sessions.exists():
+        session = session_engine.pause_session(device)
+        if session is None:
             return Response({"error": "No active session."}, status=status.HTTP_404_NOT_FOUND)
 
-        # If multiple active sessions exist, use the most recent one
-        if active_sessions.count() > 1:
-            DeviceLog.objects.create(
-                device=device,
-                log_type='warning',
-                message=f"Multiple active sessions found ({active_sessions.count()}). Using most recent."
-            )
-            session = active_sessions.order_by('-started_at').first()
-        else:
-            session = active_sessions.first()
-
-        session.status = 'paused'
-        session.save()
-
-        # Cancel any other active sessions if they exist
-        active_sessions.exclude(id=session.id).update(status='cancelled', ended_at=timezone.now())
-
-        DeviceLog.objects.create(device=device, log_type='command', message="Paused session")
-
         # Broadcast pause (device remains online)
-        device.status = 'online'
-        device.save()
         self._broadcast(device)
 
         return Response(DeviceSessionSerializer(session).data)
@@ -339,66 +258,63 @@ class DeviceViewSet(viewsets.ModelViewSet):
                 "registration_status": device.registration_status
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        paused_sessions = DeviceSession.objects.filter(device=device, status='paused')
-
-        if not paused_sessions.exists():
+        session = session_engine.resume_session(device)
+        if session is None:
             return Response({"error": "No paused session."}, status=status.HTTP_404_NOT_FOUND)
 
-        # If multiple paused sessions exist, use the most recent one
-        if paused_sessions.count() > 1:
-            DeviceLog.objects.create(
-                device=device,
-                log_type='warning',
-                message=f"Multiple paused sessions found ({paused_sessions.count()}). Using most recent."
-            )
-            session = paused_sessions.order_by('-started_at').first()
-        else:
-            session = paused_sessions.first()
-
-        session.status = 'active'
-        session.save()
-
-        # Cancel any other paused sessions if they exist
-        paused_sessions.exclude(id=session.id).update(status='cancelled', ended_at=timezone.now())
-
-        DeviceLog.objects.create(device=device, log_type='command', message="Resumed session")
-
         # Broadcast resume
-        device.status = 'online'
-        device.save()
         self._broadcast(device)
 
         return Response(DeviceSessionSerializer(session).data)
 
+    @query_budget(4)
     @action(detail=True, methods=['get'], permission_classes=[IsViewer])
     def logs(self, request, pk=None):
         """List device logs, with optional filtering."""
         device = self.get_object()
-        logs = device.logs.all()
+        logs = device.logs.all()  # each log's device is the one already loaded
         log_type = request.query_params.get('type')
         if log_type:
             logs = logs.filter(log_type=log_type)
-        page = self.paginate_queryset(logs)
-        if page is not None:
-            serializer = DeviceLogSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = DeviceLogSerializer(logs, many=True)
-        return Response(serializer.data)
+        paginator = DeviceLogCursorPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        serializer = DeviceLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
+    @query_budget(4)
     @action(detail=True, methods=['get'], permission_classes=[IsViewer])
     def sessions(self, request, pk=None):
         """List all sessions for this device."""
         device = self.get_object()
-        sessions = device.sessions.all()
+        sessions = device.sessions.select_related('program')
         status_filter = request.query_params.get('status')
         if status_filter:
             sessions = sessions.filter(status=status_filter)
-        page = self.paginate_queryset(sessions)
-        if page is not None:
-            serializer = DeviceSessionSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = DeviceSessionSerializer(sessions, many=True)
-        return Response(serializer.data)
+        paginator = DeviceSessionCursorPagination()
+        page = paginator.paginate_queryset(sessions, request, view=self)
+        serializer = DeviceSessionSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @query_budget(4)
+    @action(detail=True, methods=['get'], permission_classes=[IsViewer])
+    def telemetry(self, request, pk=None):
+        """Downsampled telemetry: ?resolution=minute|hour&start=&end= (ISO 8601)"""
+        device = self.get_object()
+        resolution = request.query_params.get('resolution', 'minute')
+        if resolution not in ('minute', 'hour'):
+            return Response({"error": "resolution must be 'minute' or 'hour'"}, status=status.HTTP_400_BAD_REQUEST)
+        end = parse_datetime(request.query_params.get('end', '')) or timezone.now()
+        default_span = timedelta(hours=1) if resolution == 'minute' else timedelta(days=1)
+        start = parse_datetime(request.query_params.get('start', '')) or end - default_span
+        rollups = device.telemetry_rollups.filter(
+            resolution=resolution, bucket__gte=start, bucket__lt=end
+        ).order_by('bucket')[:TELEMETRY_MAX_POINTS]
+        return Response({
+            'resolution': resolution,
+            'start': start,
+            'end': end,
+            'points': DeviceTelemetryRollupSerializer(rollups, many=True).data,
+        })
 
     @action(detail=True, methods=['get'], permission_classes=[IsViewer])
     def status_check(self, request, pk=None):
@@ -426,58 +342,49 @@ class DeviceViewSet(viewsets.ModelViewSet):
             'last_seen': device.last_seen
         })
 
+    @action(detail=True, methods=['get'], permission_classes=[IsOperator])
+    def control_token(self, request, pk=None):
+        """Token the device's kiosk uses to open its control channel"""
+        device = self.get_object()
+        return Response({
+            'device_id': device.device_id,
+            'token': control.control_token(device),
+            'connected': control.is_connected(device.pk),
+        })
+
+    @control_token.mapping.post
+    def rotate_control_token(self, request, pk=None):
+        """Issue the kiosk a new token; the old one stops working and its control connection is closed"""
+        device = self.get_object()
+        return Response({
+            'device_id': device.device_id,
+            'token': control.rotate_token(device),
+            'connected': False,
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsOperator])
+    def status_sweep(self, request):
+        """Check every active device with the backend in the background"""
+        task = sweep_device_health.delay()
+        return Response({'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsOperator])
+    def websocket_stats(self, request):
+        """Outbound buffer depth and lag of this process's device websockets, laggiest first."""
+        return Response(outbox.connection_stats())
+
     @action(detail=True, methods=['post'], permission_classes=[IsOperator])
     def verify_with_config(self, request, pk=None):
         """Verify device and send its configuration"""
         device = self.get_object()
         
-        # Get device configuration if it exists
-        try:
-            config = device.configuration
-            # Create configuration data dictionary to send
-            config_data = {
-                'price_per_minute': float(config.price_per_minute),
-                'default_timeout': config.default_timeout,
-                'bonus_duration_enabled': config.bonus_duration_enabled,
-                'bonus_duration_amount': config.bonus_duration_amount,
-                'valve_reset_timeout': config.valve_reset_timeout,
-                'engine_performance': config.engine_performance,
-                'pump_performance': config.pump_performance,
-            }
-            
-            # Add program settings if they exist
-            program_settings = []
-            for ps in config.deviceprogramsetting_set.all():
-                program_settings.append({
-                    'program_id': ps.program.id,
-                    'program_name': ps.program.name,
-                    'custom_price': float(ps.custom_price) if ps.custom_price else None,
-                    'is_enabled': ps.is_enabled
-                })
-            
-            if program_settings:
-                config_data['program_settings'] = program_settings
-                
-        except Exception as e:
-            # If no configuration exists, create default
-            config = DeviceConfiguration.objects.create(
-                device=device,
-                price_per_minute=Decimal('10.00'),
-                default_timeout=300,
-                valve_reset_timeout=60,
-                engine_performance=50,
-                pump_performance=50
-            )
-            config_data = {
-                'price_per_minute': float(config.price_per_minute),
-                'default_timeout': config.default_timeout,
-                'bonus_duration_enabled': config.bonus_duration_enabled,
-                'bonus_duration_amount': config.bonus_duration_amount,
-                'valve_reset_timeout': config.valve_reset_timeout,
-                'engine_performance': config.engine_performance,
-                'pump_performance': config.pump_performance,
-            }
-        
+        # Get or create device configuration
+        DeviceConfiguration.objects.get_or_create(
+            device=device,
+            defaults=DEFAULT_DEVICE_CONFIGURATION
+        )
+        config_data = config_cache.get(device.pk)['verification']
+
         # Attempt verification with backend including configuration
         backend_service = DeviceBackendService()
         success, message = backend_service.verify_device(
@@ -495,10 +402,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
             device.save()
             
             # Log successful verification
-            DeviceLog.objects.create(
-                device=device,
-                log_type='info',
-                message=f"Device verified successfully with configuration: {message}"
+            log_buffer.log(
+                device,
+                'info',
+                f"Device verified successfully with configuration: {message}"
             )
             
             # Broadcast the device update
@@ -514,10 +421,10 @@ class DeviceViewSet(viewsets.ModelViewSet):
             device.save()
             
             # Log verification failure
-            DeviceLog.objects.create(
-                device=device,
-                log_type='warning',
-                message=f"Device verification with configuration failed: {message}"
+            log_buffer.log(
+                device,
+                'warning',
+                f"Device verification with configuration failed: {message}"
             )
             
             # Broadcast the device update
@@ -534,31 +441,66 @@ class DeviceViewSet(viewsets.ModelViewSet):
         if device.registration_status != "verified":
             return Response({"error": "Unverified"}, status=400)
 
-        config = device.configuration
-        payload = serialize_config(config, include_programs=True)
-
-        ok, msg = DeviceBackendService().send_device_configuration(payload)
-        DeviceLog.objects.create(
-            device=device,
-            log_type="info" if ok else "warning",
-            message=f"Config update {'succeeded' if ok else 'failed'}: {msg}"
+        if not hasattr(device, 'configuration'):
+            return Response({"error": "Device has no configuration"}, status=400)
+
+        force = str(request.data.get('force', '')).lower() in ('1', 'true')
+        outcome, msg = config_push.push_device(device, force=force)
+        if outcome == 'skipped':
+            return Response({"status": "unchanged", "message": msg})
+        if outcome == 'queued':
+            return Response({"status": "queued", "command_id": msg}, status=status.HTTP_202_ACCEPTED)
+
+        ok = outcome == 'succeeded'
+        log_buffer.log(
+            device,
+            "info" if ok else "warning",
+            f"Config update {'succeeded' if ok else 'failed'}: {msg}"
         )
         return Response({"status": "success" if ok else "error", "message": msg},
                         status=200 if ok else 400)
 
 
+class TelemetryIngestView(APIView):
+    """
+    Batched telemetry from a device (format in devices/telemetry.py). The
+    device authenticates with its X-Device-Id and X-Device-Token headers
+    (the control channel token).
+    """
+    authentication_classes = []
+    permission_classes = []
+    parser_classes = [NDJSONParser, MessagePackParser]
+
+    def post(self, request):
+        device = Device.objects.filter(
+            device_id=request.headers.get('X-Device-Id', ''), registration_status='verified'
+        ).only('id', 'device_id', 'control_secret').first()
+        if device is None or not control.check_token(device, request.headers.get('X-Device-Token')):
+            raise PermissionDenied("Invalid device credentials")
+        try:
+            summary = telemetry.ingest(device.id, request.data)
+        except telemetry.BatchTooLarge as e:
+            return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return Response(summary, status=status.HTTP_202_ACCEPTED)
+
+
 class WashProgramViewSet(viewsets.ModelViewSet):
     queryset = WashProgram.objects.all()
     serializer_class = WashProgramSerializer
     permission_classes = [IsOperatorOrReadOnly]
+    query_budgets = {'list': 3, 'retrieve': 3}
 
 
 
 
 class DeviceConfigurationViewSet(viewsets.ModelViewSet):
-    queryset = DeviceConfiguration.objects.filter(is_template=False)
+    queryset = DeviceConfiguration.objects.filter(is_template=False).prefetch_related(Prefetch(
+        'deviceprogramsetting_set',
+        queryset=DeviceProgramSetting.objects.select_related('program'),
+    ))
     serializer_class = DeviceConfigurationSerializer
     permission_classes = [IsOperatorOrReadOnly]
+    query_budgets = {'list': 4, 'retrieve': 4}
 
     @action(detail=False, methods=['get'], permission_classes=[IsViewer])
     def templates(self, request):
@@ -586,6 +528,11 @@ class DeviceConfigurationViewSet(viewsets.ModelViewSet):
 
         # Broadcast update if device has a device attribute
         if hasattr(device_config, 'device'):
+            # Delivered over the kiosk's control channel (queued while it is offline)
+            control.send_command(device_config.device.id, 'performance', {
+                'engine_performance': device_config.engine_performance,
+                'pump_performance': device_config.pump_performance,
+            })
             broadcast_device_update(device_config.device.id, {
                 'id': device_config.device.id,
                 'name': device_config.device.name,
@@ -646,18 +593,64 @@ class DeviceConfigTemplateViewSet(viewsets.ModelViewSet):
 
 
 class DeviceLogViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = DeviceLog.objects.all()
+    queryset = DeviceLog.objects.select_related('device')
     serializer_class = DeviceLogSerializer
     permission_classes = [IsViewer]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    query_budgets = {'list': 3, 'retrieve': 3}
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['device', 'log_type']
-    ordering = ['-created_at']
+    # Ordered newest first by the paginator: (-created_at, -id)
+    pagination_class = DeviceLogCursorPagination
+
+    @action(detail=False, methods=['get'])
+    def buffer_stats(self, request):
+        """Queue depth and write/drop counters of this process's log buffer."""
+        return Response(log_buffer.device_log_buffer.stats())
 
 
 class DeviceSessionViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = DeviceSession.objects.all()
+    queryset = DeviceSession.objects.select_related('device', 'program')
     serializer_class = DeviceSessionSerializer
     permission_classes = [IsViewer]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    query_budgets = {'list': 3, 'retrieve': 3}
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['device', 'status', 'program']
-    ordering = ['-started_at']
+    # Ordered newest first by the paginator: (-started_at, -id)
+    pagination_class = DeviceSessionCursorPagination
+
+
+class ConfigPushJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Bulk configuration pushes. POST {"filters": {...}, "parallelism": n} starts
+    a push to every verified device matching the filters; progress streams on
+    ws/devices/config-push/<id>/ and per-device outcomes are under results/.
+    """
+    queryset = ConfigPushJob.objects.all()
+    serializer_class = ConfigPushJobSerializer
+    permission_classes = [IsOperator]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = config_push.create_job(
+            serializer.validated_data.get('filters', {}),
+            parallelism=serializer.validated_data.get('parallelism'),
+            force=serializer.validated_data.get('force', False),
+            user=request.user,
+        )
+        transaction.on_commit(lambda: push_configuration.delay(job.id))
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        """Per-device outcome of the push, optionally filtered by ?status="""
+        job = self.get_object()
+        results = job.results.select_related('device')
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            results = results.filter(status=status_filter)
+        page = self.paginate_queryset(results)
+        if page is not None:
+            return self.get_paginated_response(ConfigPushResultSerializer(page, many=True).data)
+        return Response(ConfigPushResultSerializer(results, many=True).data)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bonustransaction',
+            index=models.Index(fields=['client', '-created_at', '-id'], name='bonustxn_client_created_idx'),
+        ),
+    ]
@@ -41,6 +41,10 @@ class BonusTransaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a client's transactions: (-created_at, -id)
+            models.Index(fields=['client', '-created_at', '-id'], name='bonustxn_client_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.amount} for {self.client.name}"
@@ -1,3 +1,33 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from devices.testing import QueryBudgetTestCase
+
+from .models import BonusTransaction, Client
+
+
+class LoyaltyQueryBudgetTests(QueryBudgetTestCase):
+    """Query counts of the budgeted loyalty read endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        clients = Client.objects.bulk_create(
+            Client(name=f'Client {n}', phone=f'+1000000{n:04}', card_id=f'card-{n}') for n in range(cls.ROWS)
+        )
+        cls.loyalty_client = clients[0]
+        BonusTransaction.objects.bulk_create(
+            BonusTransaction(client=client, transaction_type='accrual', amount=Decimal('1.00'))
+            for client in clients for _ in range(cls.ROWS)
+        )
+
+    def test_client_list(self):
+        self.assertQueries('/loyalty/clients/', 2)
+
+    def test_client_detail(self):
+        self.assertQueries(f'/loyalty/clients/{self.loyalty_client.pk}/', 2)
+
+    def test_client_transactions(self):
+        self.assertQueries(f'/loyalty/clients/{self.loyalty_client.pk}/transactions/', 3)
+
+    def test_transaction_list(self):
+        self.assertQueries('/loyalty/transactions/', 2)
@@ -10,6 +10,7 @@ from accounts.permissions import (
     IsOperator,
     IsViewer,
 )
+from devices.query_budget import query_budget
 from .models import Client, BonusTransaction
 from .serializers import ClientSerializer, BonusTransactionSerializer
 
@@ -27,6 +28,7 @@ class ClientViewSet(viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [IsOperatorOrReadOnly]  # viewers read, operators/admins write :contentReference[oaicite:0]{index=0}
+    query_budgets = {'list': 3, 'retrieve': 3}
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -38,6 +40,7 @@ class ClientViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(card_id__icontains=card_id)
         return queryset
 
+    @query_budget(4)
     @action(detail=True, methods=['get'], permission_classes=[IsViewer])
     def transactions(self, request, pk=None):
         """List all bonus transactions for this client."""
@@ -169,6 +172,7 @@ class BonusTransactionViewSet(viewsets.ModelViewSet):
     queryset = BonusTransaction.objects.all()
     serializer_class = BonusTransactionSerializer
     permission_classes = [IsOperatorOrReadOnly]  # viewers read, operators/admins write :contentReference[oaicite:2]{index=2}
+    query_budgets = {'list': 3, 'retrieve': 3}
 
     def get_queryset(self):
         queryset = super().get_queryset()
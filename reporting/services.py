@@ -9,6 +9,17 @@ from devices.models import Device, DeviceSession, DeviceLog
 from loyalty.models import Client, BonusTransaction
 
 
+def _day_bounds(start_date, end_date):
+    """
+    Aware [start, end) datetimes covering start_date..end_date. Filtering on a
+    plain timestamp range (rather than __date) lets Postgres use the indexes
+    on started_at/created_at.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    return start, end
+
+
 class ReportService:
     @staticmethod
     def generate_daily_revenue_report(parameters):
@@ -20,11 +31,12 @@ class ReportService:
         # Convert string dates to datetime objects
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else timezone.now().date() - timedelta(days=30)
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else timezone.now().date()
+        range_start, range_end = _day_bounds(start_date, end_date)
         
         # Build query
         sessions = DeviceSession.objects.filter(
-            started_at__date__gte=start_date,
-            started_at__date__lte=end_date,
+            started_at__gte=range_start,
+            started_at__lt=range_end,
             status='completed'
         )
         
@@ -86,11 +98,12 @@ class ReportService:
         # Convert string dates to datetime objects
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else timezone.now().date() - timedelta(days=30)
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else timezone.now().date()
+        range_start, range_end = _day_bounds(start_date, end_date)
         
         # Get device sessions
         sessions_query = DeviceSession.objects.filter(
-            started_at__date__gte=start_date,
-            started_at__date__lte=end_date
+            started_at__gte=range_start,
+            started_at__lt=range_end
         )
         
         if device_ids:
@@ -98,8 +111,8 @@ class ReportService:
         
         # Get device logs
         logs_query = DeviceLog.objects.filter(
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
+            created_at__gte=range_start,
+            created_at__lt=range_end
         )
         
         if device_ids:
@@ -168,11 +181,12 @@ class ReportService:
         # Convert string dates to datetime objects
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else timezone.now().date() - timedelta(days=30)
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else timezone.now().date()
+        range_start, range_end = _day_bounds(start_date, end_date)
         
         # Get completed sessions with payments
         sessions = DeviceSession.objects.filter(
-            started_at__date__gte=start_date,
-            started_at__date__lte=end_date,
+            started_at__gte=range_start,
+            started_at__lt=range_end,
             status='completed',
             amount_charged__gt=0
         )
@@ -242,11 +256,12 @@ class ReportService:
         # Convert string dates to datetime objects
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else timezone.now().date() - timedelta(days=30)
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else timezone.now().date()
+        range_start, range_end = _day_bounds(start_date, end_date)
         
         # Get sessions with client cards
         sessions = DeviceSession.objects.filter(
-            started_at__date__gte=start_date,
-            started_at__date__lte=end_date,
+            started_at__gte=range_start,
+            started_at__lt=range_end,
             client_card__isnull=False
         ).exclude(client_card='')
         